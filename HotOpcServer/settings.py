@@ -162,3 +162,10 @@ LOGGING = {
         },
     },
 }
+
+# 独立模拟器进程（python manage.py run_simulators）
+# 启用后Web进程不再自行运行OPC UA服务器，启停等命令通过本地控制端口转发给模拟器进程，
+# Web服务可以使用多个工作进程
+SIMULATOR_RUNNER_ENABLED = os.environ.get('HOTOPC_SIMULATOR_RUNNER', '') == '1'
+SIMULATOR_RUNNER_HOST = '127.0.0.1'
+SIMULATOR_RUNNER_PORT = int(os.environ.get('HOTOPC_SIMULATOR_RUNNER_PORT', 48400))
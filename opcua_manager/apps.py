@@ -9,7 +9,7 @@ logger = logging.getLogger(__name__)
 def handle_shutdown(signum, frame):
     """处理关闭信号"""
     from .models import OpcServer
-    from .opcua_server import OpcUaServer
+    from . import server_registry
     
     logger.info("Received shutdown signal, stopping all OPC UA servers...")
     
@@ -18,7 +18,7 @@ def handle_shutdown(signum, frame):
     for server in running_servers:
         try:
             # 停止服务器实例
-            opcua_server = OpcUaServer.get_instance(server.id)
+            opcua_server = server_registry.get_instance(server.id)
             if opcua_server:
                 opcua_server.stop()
             
@@ -50,6 +50,13 @@ class OpcuaManagerConfig(AppConfig):
     
     def ready(self):
         """应用程序启动时的初始化"""
+        from .runner_control import servers_are_remote
+
+        # 服务器由独立的模拟器进程运行时，Web进程退出不应修改服务器状态
+        if servers_are_remote():
+            logger.info("OPC UA servers are run by the simulator runner process")
+            return
+
         # 只在主进程中注册信号处理
         if sys.argv and sys.argv[0].endswith('manage.py'):
             # 注册信号处理器
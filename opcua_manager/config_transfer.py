@@ -0,0 +1,270 @@
+import io
+import os
+import gzip
+import json
+import zlib
+import logging
+from django.db import transaction
+from django.utils import timezone
+from .models import OpcServer, Node, NodeTemplate, NODE_CONFIG_FIELDS, SERVER_CONFIG_FIELDS
+from .node_changes import apply_live_changes
+from .overload import OVERLOAD_POLICIES
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMAT = 'hotopcserver-config'  # 导出文件格式标识
+EXPORT_VERSION = 1  # 导出文件格式版本
+EXPORT_CHUNK_SIZE = 1000  # 导出时每次输出的行数
+IMPORT_CHUNK_SIZE = 1000  # 导入时每批写入的节点数
+READ_BUFFER_SIZE = 64 * 1024
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def _dumps(record):
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+
+
+def iter_export_lines(servers=None):
+    """逐块生成NDJSON格式的导出内容
+
+    第一行为文件头，之后每个服务器一行，紧跟该服务器的全部节点（每个节点一行）。
+    节点按批从数据库读取，内存占用与节点总数无关。使用节点模板的服务器只导出
+    自身的节点，并记录模板名称。
+    """
+    if servers is None:
+        servers = OpcServer.objects.order_by('id')
+    yield _dumps({
+        'type': 'header',
+        'format': EXPORT_FORMAT,
+        'version': EXPORT_VERSION,
+        'exported_at': timezone.now().isoformat(),
+    }) + '\n'
+
+    for server in servers.values('id', *SERVER_CONFIG_FIELDS, 'template__name'):
+        server_id = server.pop('id')
+        server['template'] = server.pop('template__name')
+        yield _dumps({'type': 'server', **server}) + '\n'
+
+        nodes = Node.objects.filter(server_id=server_id).order_by('id').values(*NODE_CONFIG_FIELDS)
+        lines = []
+        for node in nodes.iterator(chunk_size=2000):
+            lines.append(_dumps({'type': 'node', 'server': server['name'], **node}))
+            if len(lines) >= EXPORT_CHUNK_SIZE:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+
+def gzip_stream(chunks, level=6):
+    """将文本块流式压缩为gzip字节流"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class _PrefixedReader(io.RawIOBase):
+    """在底层流前拼接已读出的字节，探测文件头后可以从头继续读取"""
+
+    def __init__(self, prefix, source):
+        self._prefix = prefix
+        self._source = source
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._prefix:
+            size = min(len(buffer), len(self._prefix))
+            buffer[:size] = self._prefix[:size]
+            self._prefix = self._prefix[size:]
+            return size
+        data = self._source.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def iter_import_records(source):
+    """逐行解析NDJSON导入内容（自动识别gzip压缩），产出 (行号, 记录)"""
+    head = source.read(len(GZIP_MAGIC))
+    stream = io.BufferedReader(_PrefixedReader(head, source), buffer_size=READ_BUFFER_SIZE)
+    if head == GZIP_MAGIC:
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+
+    for line_number, line in enumerate(io.TextIOWrapper(stream, encoding='utf-8'), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"第 {line_number} 行不是有效的JSON: {e}") from e
+        if not isinstance(record, dict):
+            raise ValueError(f"第 {line_number} 行不是有效的记录")
+        yield line_number, record
+
+
+class ConfigImporter:
+    """分批导入服务器和节点配置
+
+    服务器按名称、节点按 (服务器, node_id) 插入或更新。节点每满一批在一个事务中
+    批量写入，只更新实际变化的字段，运行中的服务器同步更新其地址空间。
+    overwrite为False时已存在的服务器和节点保持不变，只添加新的。
+    on_progress(stats) 在每批节点写入后调用。
+    """
+
+    def __init__(self, overwrite=True, on_progress=None, chunk_size=IMPORT_CHUNK_SIZE):
+        self.overwrite = overwrite
+        self.on_progress = on_progress
+        self.chunk_size = chunk_size
+        self._servers = {}  # 服务器名称 -> OpcServer
+        self._pending = []  # 待写入的 (OpcServer, 节点字段)
+        self.stats = {
+            'lines': 0,
+            'servers_created': 0,
+            'servers_updated': 0,
+            'servers_unchanged': 0,
+            'nodes_created': 0,
+            'nodes_updated': 0,
+            'nodes_unchanged': 0,
+        }
+
+    def run(self, records):
+        """导入 (行号, 记录) 序列，返回统计结果"""
+        for line_number, record in records:
+            self.stats['lines'] = line_number
+            record_type = record.get('type')
+            if record_type == 'header':
+                self._check_header(record)
+            elif record_type == 'server':
+                self.import_server(record)
+            elif record_type == 'node':
+                self._queue_node(record, line_number)
+            else:
+                raise ValueError(f"第 {line_number} 行的记录类型无效: {record_type}")
+        self.flush()
+        logger.info(f"Imported server configuration: {self.stats}")
+        return self.stats
+
+    def _check_header(self, record):
+        if record.get('format') != EXPORT_FORMAT:
+            raise ValueError(f"不支持的文件格式: {record.get('format')}")
+        if record.get('version', 0) > EXPORT_VERSION:
+            raise ValueError(f"不支持的文件版本: {record.get('version')}")
+
+    def import_server(self, record):
+        """按名称创建或更新服务器"""
+        fields = {key: record[key] for key in SERVER_CONFIG_FIELDS if key in record}
+        name = fields.get('name')
+        if not name:
+            raise ValueError("服务器记录缺少名称")
+        if fields.get('overload_policy', 'none') not in OVERLOAD_POLICIES:
+            raise ValueError(f"服务器 {name} 的过载策略无效")
+        if record.get('template'):
+            fields['template'] = NodeTemplate.objects.filter(name=record['template']).first()
+            if fields['template'] is None:
+                raise ValueError(f"服务器 {name} 使用的节点模板 {record['template']} 不存在")
+
+        server = OpcServer.objects.filter(name=name).first()
+        if server is None:
+            server = OpcServer.objects.create(**fields)
+            self.stats['servers_created'] += 1
+        else:
+            changed = [key for key, value in fields.items() if getattr(server, key) != value]
+            if self.overwrite and changed:
+                for key in changed:
+                    setattr(server, key, fields[key])
+                server.save(update_fields=changed + ['updated_at'])
+                self.stats['servers_updated'] += 1
+            else:
+                self.stats['servers_unchanged'] += 1
+        self._servers[name] = server
+        return server
+
+    def _get_server(self, name, line_number):
+        server = self._servers.get(name)
+        if server is None:
+            server = OpcServer.objects.filter(name=name).first()
+            if server is None:
+                raise ValueError(f"第 {line_number} 行的节点所属服务器不存在: {name}")
+            self._servers[name] = server
+        return server
+
+    def _queue_node(self, record, line_number):
+        fields = {key: record[key] for key in NODE_CONFIG_FIELDS if key in record}
+        if not fields.get('node_id'):
+            raise ValueError(f"第 {line_number} 行的节点缺少node_id")
+        self._pending.append((self._get_server(record.get('server'), line_number), fields))
+        if len(self._pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """将待写入的节点在一个事务中批量写入"""
+        if not self._pending:
+            return
+        pending_by_server = {}  # 服务器id -> (OpcServer, {node_id: 节点字段})
+        for server, fields in self._pending:
+            pending_by_server.setdefault(server.id, (server, {}))[1][fields['node_id']] = fields
+        self._pending = []
+
+        changes_by_server = []
+        now = timezone.now()
+        with transaction.atomic():
+            for server, nodes in pending_by_server.values():
+                existing = {
+                    node.node_id: node
+                    for node in Node.objects.filter(server=server, node_id__in=list(nodes))
+                }
+                created = []
+                updated = []
+                for node_id, fields in nodes.items():
+                    node = existing.get(node_id)
+                    if node is None:
+                        created.append(Node(server=server, **fields))
+                        continue
+                    changes = {key for key, value in fields.items() if getattr(node, key) != value}
+                    if not self.overwrite or not changes:
+                        self.stats['nodes_unchanged'] += 1
+                        continue
+                    for key in changes:
+                        setattr(node, key, fields[key])
+                    node.updated_at = now
+                    updated.append((node, changes))
+
+                Node.objects.bulk_create(created)
+                if updated:
+                    update_fields = set().union(*(changes for _, changes in updated))
+                    update_fields.add('updated_at')
+                    Node.objects.bulk_update([node for node, _ in updated], sorted(update_fields))
+                self.stats['nodes_created'] += len(created)
+                self.stats['nodes_updated'] += len(updated)
+                changes_by_server.append((server, created, updated))
+
+        # 热更新运行中的服务器
+        for server, created, updated in changes_by_server:
+            if created or updated:
+                apply_live_changes(server.id, added=created, updated=updated)
+
+        if self.on_progress is not None:
+            self.on_progress(dict(self.stats))
+
+
+def import_config_file(path, overwrite=True, job=None):
+    """从文件导入配置（后台任务），按已读取的字节数报告进度，完成后删除文件"""
+    try:
+        total = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            def on_progress(stats):
+                if job is not None:
+                    job.update_progress(f.tell(), total, f"已处理 {stats['lines']} 行")
+                    job.check_cancelled()
+            
+            result = ConfigImporter(overwrite=overwrite, on_progress=on_progress).run(iter_import_records(f))
+        if job is not None:
+            job.update_progress(total, total, f"已处理 {result['lines']} 行")
+        return result
+    finally:
+        os.unlink(path)
@@ -3,6 +3,11 @@ import json
 import shutil
 from pathlib import Path
 from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from .file_utils import atomic_write_json, atomic_write_text, file_lock, file_stamp
+import logging
+
+logger = logging.getLogger(__name__)
 
 class DatabaseManager:
     """配置集管理器类"""
@@ -12,6 +17,9 @@ class DatabaseManager:
         self.base_dir = Path(settings.BASE_DIR) / 'databases'
         self.base_dir.mkdir(exist_ok=True)
         
+        # 节点数据缓存：配置集名称 -> (文件版本标识, 节点列表)
+        self._cache = {}
+        
         # 确保default配置集存在
         self.ensure_default_database()
         
@@ -38,7 +46,7 @@ class DatabaseManager:
             raise ValueError(f"配置集 {db_name} 不存在")
         
         active_file = self.base_dir / 'active.txt'
-        active_file.write_text(db_name)
+        atomic_write_text(active_file, db_name)
         self._active_database = db_name
     
     def get_database_list(self):
@@ -95,6 +103,7 @@ class DatabaseManager:
         
         db_dir = self.base_dir / db_name
         shutil.rmtree(db_dir)
+        self._cache.pop(db_name, None)
         return True
     
     def get_nodes(self, db_name=None):
@@ -106,14 +115,21 @@ class DatabaseManager:
             raise ValueError(f"配置集 {db_name} 不存在")
         
         nodes_file = self.base_dir / db_name / 'nodes.json'
-        if not nodes_file.exists():
+        stamp = file_stamp(nodes_file)
+        if stamp is None:
             return []
         
-        try:
-            with open(nodes_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return []
+        # 文件未变化时直接使用缓存，不再重复解析
+        cached = self._cache.get(db_name)
+        if cached is None or cached[0] != stamp:
+            try:
+                with open(nodes_file, 'r', encoding='utf-8') as f:
+                    nodes = json.load(f)
+            except json.JSONDecodeError as e:
+                logger.error(f"Corrupted nodes file {nodes_file}: {e}")
+                raise ValueError(f"配置集 {db_name} 的节点数据已损坏")
+            cached = self._cache[db_name] = (stamp, nodes)
+        return [dict(node) for node in cached[1]]
     
     def save_nodes(self, nodes, db_name=None):
         """保存节点列表到指定配置集"""
@@ -124,8 +140,21 @@ class DatabaseManager:
             raise ValueError(f"配置集 {db_name} 不存在")
         
         nodes_file = self.base_dir / db_name / 'nodes.json'
-        with open(nodes_file, 'w', encoding='utf-8') as f:
-            json.dump(nodes, f, ensure_ascii=False, indent=2)
+        with file_lock(nodes_file):
+            atomic_write_json(nodes_file, nodes, indent=2)
+            self._cache.pop(db_name, None)
+    
+    def modify_nodes(self, modify, db_name=None):
+        """在文件锁内完成读取-修改-保存，modify接收节点列表并原地修改，返回值原样返回"""
+        if db_name is None:
+            db_name = self._active_database
+        
+        nodes_file = self.base_dir / db_name / 'nodes.json'
+        with file_lock(nodes_file):
+            nodes = self.get_nodes(db_name)
+            result = modify(nodes)
+            self.save_nodes(nodes, db_name)
+            return result
     
     def _is_valid_database_name(self, name):
         """验证配置集名称是否有效"""
@@ -138,5 +167,5 @@ class DatabaseManager:
         """获取当前激活的配置集名称"""
         return self._active_database
 
-# 创建全局数据库管理器实例
-db_manager = DatabaseManager() 
\ No newline at end of file
+# 全局数据库管理器实例，第一次使用时才创建（创建时会访问文件系统）
+db_manager = SimpleLazyObject(DatabaseManager)
\ No newline at end of file
@@ -0,0 +1,56 @@
+import numpy as np
+
+
+def _as_float(value):
+    """数值转换为浮点数，其他值为NaN（NaN与任何值比较都超过死区）"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class DeadbandBank:
+    """服务器全部配置了死区的节点的批量死区判断
+
+    每个节点占一行，保存死区阈值和上次发布的值，每个周期对本周期计算了新值的节点做一次
+    数组比较。比较基准是上次通过死区的值，而不是地址空间中可能被故障注入改动过的值；
+    客户端写入、场景和接口写入的值通过 reset 成为新的基准。节点增删或配置修改后重建，
+    仍在运行的节点沿用原来的基准。
+    """
+
+    def __init__(self, records, previous=None):
+        self._records = [record for record in records if record.params.deadband]
+        self._rows = {record.key: row for row, record in enumerate(self._records)}
+        self.threshold = np.array([record.params.deadband for record in self._records], dtype=np.float64)
+        self.published = np.array([_as_float(record.value) for record in self._records], dtype=np.float64)
+        if previous is not None:
+            for row, record in enumerate(self._records):
+                old = previous._rows.get(record.key)
+                # 重建的节点（新的运行时记录）从自己的初始值开始
+                if old is not None and previous._records[old] is record:
+                    self.published[row] = previous.published[old]
+
+    def reset(self, records):
+        """以节点记录当前的值作为已发布的值，未配置死区的节点被忽略"""
+        rows = self._rows
+        published = self.published
+        for record in records:
+            row = rows.get(record.key)
+            if row is not None:
+                published[row] = _as_float(record.value)
+
+    def select(self, records, values):
+        """判断新值是否超过死区，返回布尔数组，超过死区的值同时记为已发布的值
+
+        非数值的值不做死区判断，全部发布。
+        """
+        rows = np.fromiter((self._rows[record.key] for record in records), dtype=np.intp, count=len(records))
+        try:
+            values = np.array(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            self.published[rows] = np.nan
+            return np.ones(len(rows), dtype=bool)
+        # NaN（没有已发布的值）比较结果为False，按超过死区处理
+        mask = ~(np.abs(values - self.published[rows]) <= self.threshold[rows])
+        self.published[rows[mask]] = values[mask]
+        return mask
@@ -0,0 +1,109 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 故障注入配置项：概率类取值0~1，其余为非负数（毫秒）
+FAULT_RATES = ('bad', 'uncertain', 'freeze', 'drop', 'delay')
+FAULT_DURATIONS = ('delay_ms', 'jitter_ms', 'period_ms')
+
+# random：每次更新独立按概率抽样；periodic：按周期出现，每个周期内前 bad 比例的时间为Bad，
+# 随后 uncertain 比例的时间为Uncertain，最后 freeze 比例的时间冻结值；各节点的相位错开
+FAULT_PATTERNS = ('random', 'periodic')
+
+DEFAULT_DELAY_MS = 1000
+DEFAULT_PERIOD_MS = 10000
+
+STATUS_UNCERTAIN = 0x40000000
+STATUS_BAD = 0x80000000
+
+# 相邻节点键之间的相位差（黄金分割），periodic模式下各节点的故障时段均匀错开
+PHASE_STEP = 0.6180339887498949
+
+
+def parse_fault_config(config):
+    """解析并校验故障注入配置（JSON文本或字典），返回只含已设置项的字典
+
+    例如 {"bad": 0.01, "uncertain": 0.02, "freeze": 0.05, "drop": 0.1, "delay": 0.1,
+    "delay_ms": 500, "jitter_ms": 50, "pattern": "periodic", "period_ms": 10000}
+    """
+    if config in (None, ''):
+        return {}
+    if isinstance(config, str):
+        try:
+            config = json.loads(config)
+        except ValueError as e:
+            raise ValueError(f"故障配置不是有效的JSON: {e}")
+    if not isinstance(config, dict):
+        raise ValueError("故障配置必须是对象")
+    parsed = {}
+    for key, value in config.items():
+        if key in FAULT_RATES:
+            if not isinstance(value, (int, float)) or not 0 <= value <= 1:
+                raise ValueError(f"{key} 必须是0~1之间的概率")
+            parsed[key] = float(value)
+        elif key in FAULT_DURATIONS:
+            if not isinstance(value, (int, float)) or value < 0:
+                raise ValueError(f"{key} 必须是非负数")
+            parsed[key] = float(value)
+        elif key == 'pattern':
+            if value not in FAULT_PATTERNS:
+                raise ValueError(f"未知的故障模式: {value}")
+            parsed[key] = value
+        else:
+            raise ValueError(f"未知的故障配置项: {key}")
+    if parsed.get('bad', 0) + parsed.get('uncertain', 0) > 1:
+        raise ValueError("bad与uncertain之和不能大于1")
+    if parsed.get('period_ms') == 0:
+        raise ValueError("period_ms 必须大于0")
+    return parsed
+
+
+def fault_config_text(config):
+    """把请求中的故障配置规范为保存到数据库的JSON文本，空配置保存为None"""
+    parsed = parse_fault_config(config)
+    return json.dumps(parsed) if parsed else None
+
+
+class FaultProfile:
+    """节点的故障注入参数，配置相同的节点共用同一个对象"""
+    __slots__ = ('bad', 'uncertain', 'freeze', 'drop', 'delay', 'delay_time', 'jitter', 'periodic', 'period')
+
+    def __init__(self, config):
+        self.bad = config.get('bad', 0.0)
+        self.uncertain = config.get('uncertain', 0.0)
+        self.freeze = config.get('freeze', 0.0)
+        self.drop = config.get('drop', 0.0)
+        self.delay = config.get('delay', 0.0)
+        self.delay_time = config.get('delay_ms', DEFAULT_DELAY_MS) / 1000
+        self.jitter = config.get('jitter_ms', 0.0) / 1000
+        self.periodic = config.get('pattern') == 'periodic'
+        self.period = config.get('period_ms', DEFAULT_PERIOD_MS) / 1000
+
+    @property
+    def active(self):
+        return any((self.bad, self.uncertain, self.freeze, self.drop, self.delay, self.jitter))
+
+
+# 配置项 -> FaultProfile 的缓存，None表示配置不产生任何故障
+_profiles = {}
+
+
+def fault_profile(node_text, server_config):
+    """返回节点的故障参数：节点配置的各项覆盖服务器的默认配置，不产生故障时返回None
+
+    node_text为节点的fault_config文本，server_config为 parse_fault_config 解析后的服务器配置。
+    """
+    config = server_config
+    if node_text:
+        try:
+            config = {**server_config, **parse_fault_config(node_text)}
+        except ValueError as e:
+            logger.error(f"Invalid fault config {node_text!r}: {e}")
+    if not config:
+        return None
+    key = tuple(sorted(config.items()))
+    if key not in _profiles:
+        profile = FaultProfile(config)
+        _profiles[key] = profile if profile.active else None
+    return _profiles[key]
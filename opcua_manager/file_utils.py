@@ -0,0 +1,124 @@
+import os
+import json
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class _FileLock:
+    """可重入的文件排他锁（进程内线程锁 + 跨进程文件锁）"""
+
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def acquire(self):
+        self._rlock.acquire()
+        if self._depth == 0:
+            try:
+                self._file = open(self.lock_path, 'a+b')
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+                else:
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._rlock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+                else:
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            finally:
+                self._file.close()
+                self._file = None
+        self._rlock.release()
+
+
+_file_locks = {}  # 锁文件路径 -> _FileLock
+_file_locks_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path):
+    """对文件加排他锁，同一线程可重入
+
+    锁加在同目录下的 <文件名>.lock 上，被保护的文件本身可以被原子替换。
+    """
+    lock_path = os.path.abspath(f"{os.fspath(path)}.lock")
+    with _file_locks_guard:
+        lock = _file_locks.get(lock_path)
+        if lock is None:
+            lock = _file_locks[lock_path] = _FileLock(lock_path)
+    lock.acquire()
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def _fsync_dir(dir_path):
+    """同步目录项，保证重命名落盘"""
+    if fcntl is None:
+        return
+    fd = os.open(dir_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_bytes(path, data):
+    """原子写入文件：写临时文件、fsync后重命名覆盖目标文件"""
+    path = os.fspath(path)
+    dir_path = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix='.tmp', dir=dir_path)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_dir(dir_path)
+
+
+def atomic_write_text(path, text):
+    atomic_write_bytes(path, text.encode('utf-8'))
+
+
+def atomic_write_json(path, data, **kwargs):
+    kwargs.setdefault('ensure_ascii', False)
+    atomic_write_text(path, json.dumps(data, **kwargs))
+
+
+def file_stamp(path):
+    """文件版本标识，用于校验缓存是否失效；文件不存在时返回None"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
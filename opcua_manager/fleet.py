@@ -0,0 +1,131 @@
+import time
+import logging
+from django.db import transaction
+from .models import OpcServer, NodeTemplate, NODE_CONFIG_FIELDS
+from .overload import OVERLOAD_POLICIES
+from .faults import fault_config_text
+from .generators import generator_config_text
+from .node_set_manager import node_set_manager
+from .node_batch import bulk_insert_nodes
+from .port_allocator import port_allocator
+
+logger = logging.getLogger(__name__)
+
+MAX_FLEET_SIZE = 1000  # 单次最多创建的服务器数
+
+
+def _render(pattern, field_name, **values):
+    try:
+        return pattern.format(**values)
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError(f"{field_name}格式无效: {pattern}") from e
+
+
+def _node_rows(set_nodes):
+    """把节点集合中的节点转换为节点配置字典，故障注入和组合信号配置校验后规范为JSON文本"""
+    rows = []
+    for node_data in set_nodes:
+        fields = {field: node_data[field] for field in NODE_CONFIG_FIELDS if field in node_data}
+        try:
+            if 'fault_config' in fields:
+                fields['fault_config'] = fault_config_text(fields['fault_config'])
+            if 'generator_config' in fields:
+                fields['generator_config'] = generator_config_text(fields['generator_config'])
+        except ValueError as e:
+            raise ValueError(f"节点 {node_data.get('node_id')} 的配置无效: {e}") from e
+        rows.append(fields)
+    return rows
+
+
+def _assign_ports(endpoint, count, base_port):
+    """指定base_port时使用连续端口并检查冲突，否则由端口分配器分配"""
+    if base_port is None:
+        return port_allocator.allocate(endpoint, count)
+
+    ports = list(range(base_port, base_port + count))
+    if ports[-1] > 65535:
+        raise ValueError("端口超出范围")
+    reserved = port_allocator.reserved_ports()
+    free = port_allocator.probe_many(endpoint, [port for port in ports if port not in reserved])
+    conflicts = [port for port in ports if not free.get(port, False)]
+    if conflicts:
+        raise ValueError(f"端口已被占用: {', '.join(map(str, conflicts[:10]))}")
+    return ports
+
+
+def provision_fleet(template, count):
+    """按模板批量创建服务器及其节点
+
+    template字段：
+      name_pattern  名称模板，如 "Plant-{index:03d}"
+      uri_pattern   URI模板，可使用 {index} 和 {name}，默认 "urn:{name}"
+      endpoint      终端点，默认 0.0.0.0
+      base_port     起始端口，不指定时自动分配空闲端口
+      start_index   序号起始值，默认1
+      node_set      复制到每个服务器的节点集合名称（可选）
+      node_template 服务器共享的节点模板名称（可选），节点不复制到各服务器
+    以及 allow_anonymous、min_sampling_interval、overload_policy 等服务器设置。
+
+    所有服务器和节点在一个事务中批量写入。
+    """
+    start = time.perf_counter()
+    if not 1 <= count <= MAX_FLEET_SIZE:
+        raise ValueError(f"服务器数量必须在1到{MAX_FLEET_SIZE}之间")
+    name_pattern = template.get('name_pattern')
+    if not name_pattern:
+        raise ValueError("缺少名称模板")
+    overload_policy = template.get('overload_policy', 'none')
+    if overload_policy not in OVERLOAD_POLICIES:
+        raise ValueError("无效的过载策略")
+
+    start_index = int(template.get('start_index', 1))
+    endpoint = template.get('endpoint', '0.0.0.0')
+    uri_pattern = template.get('uri_pattern', 'urn:{name}')
+    base_port = template.get('base_port')
+
+    indexes = range(start_index, start_index + count)
+    names = [_render(name_pattern, '名称模板', index=index) for index in indexes]
+    if len(set(names)) != count:
+        raise ValueError("名称模板生成了重复的名称，请在模板中使用 {index}")
+    existing = list(OpcServer.objects.filter(name__in=names).values_list('name', flat=True)[:10])
+    if existing:
+        raise ValueError(f"服务器名称已存在: {', '.join(existing)}")
+
+    set_nodes = _node_rows(node_set_manager.get_nodes(template['node_set'])) if template.get('node_set') else []
+    node_template = None
+    if template.get('node_template'):
+        node_template = NodeTemplate.objects.filter(name=template['node_template']).first()
+        if node_template is None:
+            raise ValueError(f"节点模板 {template['node_template']} 不存在")
+    ports = _assign_ports(endpoint, count, int(base_port) if base_port is not None else None)
+
+    servers = [
+        OpcServer(
+            name=name,
+            endpoint=endpoint,
+            port=port,
+            uri=_render(uri_pattern, 'URI模板', index=index, name=name),
+            allow_anonymous=template.get('allow_anonymous', True),
+            username=template.get('username', ''),
+            password=template.get('password', ''),
+            min_sampling_interval=template.get('min_sampling_interval', 100),
+            overload_policy=overload_policy,
+            template=node_template,
+        )
+        for index, name, port in zip(indexes, names, ports)
+    ]
+    with transaction.atomic():
+        OpcServer.objects.bulk_create(servers)
+        node_count = bulk_insert_nodes(
+            (server.id, node_data) for server in servers for node_data in set_nodes
+        )
+    port_allocator.release(ports)
+
+    duration_ms = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(f"Provisioned {count} servers with {node_count} nodes in {duration_ms}ms")
+    return {
+        'created': count,
+        'nodes_created': node_count,
+        'servers': [{'id': server.id, 'name': server.name, 'port': server.port} for server in servers],
+        'duration_ms': duration_ms,
+    }
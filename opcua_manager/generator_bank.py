@@ -0,0 +1,127 @@
+import math
+import numpy as np
+from .generators import COMPONENT_PARAMS, STATEFUL_COMPONENTS
+
+TWO_PI = 2 * math.pi
+
+
+def _layout(shape):
+    """各分量的 (类型, 在参数矩阵中的起始列, 在状态矩阵中的列)，无状态分量的状态列为None"""
+    layout = []
+    param_col = state_col = 0
+    for kind in shape:
+        layout.append((kind, param_col, state_col if kind in STATEFUL_COMPONENTS else None))
+        param_col += len(COMPONENT_PARAMS[kind])
+        if kind in STATEFUL_COMPONENTS:
+            state_col += 1
+    return layout
+
+
+def _initial_state(kind, params):
+    """分量状态的初始值：随机游走从0开始，OU过程从均值开始，一阶惯性从initial开始"""
+    if kind == 'ou':
+        return params[0]
+    if kind == 'lag':
+        return params[2]
+    return 0.0
+
+
+class _Group:
+    """组合形状相同的一组节点
+
+    参数按行保存在矩阵中（每行一个节点），有状态分量的状态和上次计算时刻也按行保存，
+    同一周期到期的节点按行号一次计算。
+    """
+
+    def __init__(self, shape, specs, states, now):
+        self.shape = shape
+        count = len(specs)
+        self.params = np.array([spec.params for spec in specs], dtype=np.float64).reshape(count, -1)
+        self.low = np.array([-np.inf if spec.low is None else spec.low for spec in specs])
+        self.high = np.array([np.inf if spec.high is None else spec.high for spec in specs])
+        self.clip = any(spec.low is not None or spec.high is not None for spec in specs)
+        self.last = np.full(count, now)
+        self.layout = _layout(shape)
+        state_columns = sum(1 for _, _, state_col in self.layout if state_col is not None)
+        self.state = np.array(states, dtype=np.float64).reshape(count, state_columns)
+
+    def evaluate(self, rows, now, rng):
+        """计算指定行的节点在now时刻的值，返回一维数组"""
+        count = len(rows)
+        params = self.params[rows]
+        dt = now - self.last[rows]
+        self.last[rows] = now
+        total = np.zeros(count)
+        for kind, col, state_col in self.layout:
+            if kind == 'constant':
+                total += params[:, col]
+            elif kind == 'sine':
+                amplitude, period, offset, phase = params[:, col], params[:, col + 1], params[:, col + 2], params[:, col + 3]
+                total += offset + amplitude * np.sin(TWO_PI * (now / period + phase))
+            elif kind == 'noise':
+                total += params[:, col] * rng.standard_normal(count)
+            elif kind == 'spike':
+                rate, magnitude = params[:, col], params[:, col + 1]
+                total += np.where(rng.random(count) < rate, magnitude, 0.0)
+            else:
+                state = self.state[rows, state_col]
+                if kind == 'walk':
+                    state = state + params[:, col] * np.sqrt(dt) * rng.standard_normal(count)
+                elif kind == 'ou':
+                    mean, theta, sigma = params[:, col], params[:, col + 1], params[:, col + 2]
+                    # 按精确解离散化，周期长短不影响统计特性；theta为0时退化为随机游走
+                    decay = np.exp(-theta * dt)
+                    variance = np.where(theta > 0, (1 - decay * decay) / (2 * np.where(theta > 0, theta, 1.0)), dt)
+                    state = mean + (state - mean) * decay + sigma * np.sqrt(variance) * rng.standard_normal(count)
+                else:  # lag
+                    setpoint, tau = params[:, col], params[:, col + 1]
+                    state = state + (setpoint - state) * (1 - np.exp(-dt / tau))
+                self.state[rows, state_col] = state
+                total += state
+        if self.clip:
+            np.clip(total, self.low[rows], self.high[rows], out=total)
+        return total
+
+
+class GeneratorBank:
+    """服务器全部组合信号节点的批量计算
+
+    节点按组合形状（分量类型序列）分组，每个周期每组只做一次向量化计算。节点增删或配置
+    修改后重建，形状不变的节点沿用原来的内部状态。
+    """
+
+    def __init__(self, records, now, previous=None):
+        self.rng = previous.rng if previous is not None else np.random.default_rng()
+        by_shape = {}
+        for record in records:
+            by_shape.setdefault(record.params.generator.shape, []).append(record)
+        self._rows = {}  # 节点键 -> (组, 行号)
+        for shape, group_records in by_shape.items():
+            states = []
+            for record in group_records:
+                old = previous._rows.get(record.key) if previous is not None else None
+                if old is not None and old[0].shape == shape:
+                    states.append(old[0].state[old[1]])
+                else:
+                    spec = record.params.generator
+                    states.append([_initial_state(kind, spec.params[col:])
+                                   for kind, col, state_col in _layout(shape) if state_col is not None])
+            group = _Group(shape, [record.params.generator for record in group_records], states, now)
+            for row, record in enumerate(group_records):
+                self._rows[record.key] = (group, row)
+
+    def evaluate(self, records, now):
+        """计算到期节点的新值，返回 [(节点记录, 值)]"""
+        batches = {}
+        for record in records:
+            group, row = self._rows[record.key]
+            batch = batches.get(group)
+            if batch is None:
+                batch = batches[group] = ([], [])
+            batch[0].append(row)
+            batch[1].append(record)
+        results = []
+        for group, (rows, group_records) in batches.items():
+            values = group.evaluate(np.array(rows, dtype=np.intp), now, self.rng)
+            results.extend(zip(group_records, values.tolist()))
+        return results
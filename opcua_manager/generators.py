@@ -0,0 +1,117 @@
+import json
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# 组合信号的分量类型及其参数（按顺序保存），各分量的输出相加
+#   constant: 常量 value
+#   sine: offset + amplitude * sin(2π(t/period + phase))，t为Unix时间，phase为周期的比例
+#   noise: 均值为0、标准差为sigma的高斯噪声
+#   walk: 随机游走，每秒的标准差为sigma
+#   ou: Ornstein-Uhlenbeck过程，以速率theta回归到mean，每秒的标准差为sigma
+#   lag: 一阶惯性，从initial以时间常数tau(秒)趋近setpoint
+#   spike: 每次更新以概率rate叠加一个幅度为magnitude的尖峰
+COMPONENT_PARAMS = {
+    'constant': ('value',),
+    'sine': ('amplitude', 'period', 'offset', 'phase'),
+    'noise': ('sigma',),
+    'walk': ('sigma',),
+    'ou': ('mean', 'theta', 'sigma'),
+    'lag': ('setpoint', 'tau', 'initial'),
+    'spike': ('rate', 'magnitude'),
+}
+
+PARAM_DEFAULTS = {
+    'value': 0.0, 'amplitude': 1.0, 'period': 60.0, 'offset': 0.0, 'phase': 0.0, 'sigma': 1.0,
+    'mean': 0.0, 'theta': 1.0, 'setpoint': 0.0, 'tau': 10.0, 'initial': 0.0, 'rate': 0.01, 'magnitude': 10.0,
+}
+
+# 必须大于0的参数和不能为负的参数
+POSITIVE_PARAMS = frozenset(('period', 'tau'))
+NON_NEGATIVE_PARAMS = frozenset(('sigma', 'theta', 'rate'))
+
+# 带内部状态（每个节点一个数）的分量
+STATEFUL_COMPONENTS = frozenset(('walk', 'ou', 'lag'))
+
+# 解析后的生成器：shape为分量类型元组，params为按分量顺序展开的参数，low/high为输出范围（None为不限）
+GeneratorSpec = namedtuple('GeneratorSpec', 'shape params low high')
+
+
+def _parse_component(index, item):
+    if not isinstance(item, dict):
+        raise ValueError(f"第{index + 1}个分量必须是对象")
+    kind = item.get('type')
+    if kind not in COMPONENT_PARAMS:
+        raise ValueError(f"第{index + 1}个分量的类型未知: {kind}")
+    names = COMPONENT_PARAMS[kind]
+    unknown = set(item) - set(names) - {'type'}
+    if unknown:
+        raise ValueError(f"第{index + 1}个分量({kind})不支持参数: {', '.join(sorted(unknown))}")
+    params = []
+    for name in names:
+        value = item.get(name, PARAM_DEFAULTS[name])
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"第{index + 1}个分量({kind})的 {name} 必须是数字")
+        if name in POSITIVE_PARAMS and value <= 0:
+            raise ValueError(f"第{index + 1}个分量({kind})的 {name} 必须大于0")
+        if name in NON_NEGATIVE_PARAMS and value < 0:
+            raise ValueError(f"第{index + 1}个分量({kind})的 {name} 不能为负数")
+        if name == 'rate' and value > 1:
+            raise ValueError(f"第{index + 1}个分量({kind})的 rate 必须是0~1之间的概率")
+        params.append(float(value))
+    return kind, params
+
+
+def parse_generator_config(config):
+    """解析并校验组合信号配置（JSON文本、字典或分量列表），返回 GeneratorSpec
+
+    格式为 {"components": [{"type": "sine", "amplitude": 5, "period": 60, "offset": 50},
+    {"type": "noise", "sigma": 0.3}], "min": 0, "max": 100}，也可以直接给出分量列表。
+    """
+    if isinstance(config, str):
+        try:
+            config = json.loads(config)
+        except ValueError as e:
+            raise ValueError(f"组合信号配置不是有效的JSON: {e}")
+    if isinstance(config, list):
+        config = {'components': config}
+    if not isinstance(config, dict):
+        raise ValueError("组合信号配置必须是对象或分量列表")
+    unknown = set(config) - {'components', 'min', 'max'}
+    if unknown:
+        raise ValueError(f"未知的配置项: {', '.join(sorted(unknown))}")
+    components = config.get('components')
+    if not isinstance(components, list) or not components:
+        raise ValueError("components必须是非空的分量列表")
+    shape = []
+    params = []
+    for index, item in enumerate(components):
+        kind, component_params = _parse_component(index, item)
+        shape.append(kind)
+        params.extend(component_params)
+    low, high = config.get('min'), config.get('max')
+    for name, bound in (('min', low), ('max', high)):
+        if bound is not None and (isinstance(bound, bool) or not isinstance(bound, (int, float))):
+            raise ValueError(f"{name} 必须是数字")
+    if low is not None and high is not None and low > high:
+        raise ValueError("min不能大于max")
+    return GeneratorSpec(tuple(shape), tuple(params),
+                         float(low) if low is not None else None, float(high) if high is not None else None)
+
+
+def generator_config_text(config):
+    """把请求中的组合信号配置校验后规范为保存到数据库的JSON文本，空配置保存为None"""
+    if config in (None, ''):
+        return None
+    parse_generator_config(config)
+    return config if isinstance(config, str) else json.dumps(config)
+
+
+def load_generator(node_config):
+    """加载节点的组合信号配置，配置无效时记录错误并返回None"""
+    try:
+        return parse_generator_config(node_config.generator_config)
+    except (ValueError, TypeError) as e:
+        logger.error(f"Invalid generator config for node {node_config.node_id}: {e}")
+        return None
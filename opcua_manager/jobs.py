@@ -0,0 +1,144 @@
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = 4  # 后台任务线程数，超出的任务排队等待
+JOB_HISTORY = 100  # 保留的已结束任务数
+
+JOB_STATUSES = {
+    'pending': '排队中',
+    'running': '执行中',
+    'succeeded': '已完成',
+    'failed': '失败',
+    'cancelled': '已取消',
+}
+FINISHED_STATUSES = ('succeeded', 'failed', 'cancelled')
+
+
+class JobCancelled(Exception):
+    """任务被取消"""
+
+
+class Job:
+    """后台任务
+
+    任务函数通过 update_progress 报告进度，并在适当的位置调用
+    check_cancelled，在任务被取消时提前结束。
+    """
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'pending'
+        self.progress = 0  # 已完成的工作量
+        self.total = None  # 总工作量，未知时为None
+        self.message = ''
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATUSES
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """请求取消任务，排队中的任务不再执行，执行中的任务在下一个检查点结束"""
+        if self.finished:
+            return False
+        self._cancel_event.set()
+        return True
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def update_progress(self, progress, total=None, message=None):
+        self.progress = progress
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'total': self.total,
+            'message': self.message,
+            'cancel_requested': self.cancel_requested,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+_jobs = OrderedDict()  # 任务id -> Job
+_jobs_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+
+
+def _run_job(job, func, args, kwargs):
+    if job.cancel_requested:
+        job.status = 'cancelled'
+        job.finished_at = time.time()
+        return
+    job.status = 'running'
+    job.started_at = time.time()
+    try:
+        job.result = func(*args, job=job, **kwargs)
+        job.status = 'succeeded'
+    except JobCancelled:
+        logger.info(f"Job {job.kind} {job.id} cancelled")
+        job.status = 'cancelled'
+    except Exception as e:
+        logger.error(f"Job {job.kind} {job.id} failed: {e}")
+        job.error = str(e)
+        job.status = 'failed'
+    finally:
+        job.finished_at = time.time()
+        connections.close_all()
+
+
+def _prune_jobs():
+    """只保留最近的已结束任务"""
+    finished = [job_id for job_id, job in _jobs.items() if job.finished]
+    for job_id in finished[:max(0, len(finished) - JOB_HISTORY)]:
+        del _jobs[job_id]
+
+
+def submit_job(kind, func, *args, **kwargs):
+    """在后台线程池中执行 func(*args, job=job, **kwargs)，立即返回任务对象"""
+    job = Job(kind)
+    with _jobs_lock:
+        _prune_jobs()
+        _jobs[job.id] = job
+    _executor.submit(_run_job, job, func, args, kwargs)
+    return job
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def list_jobs():
+    """按创建时间倒序返回所有任务"""
+    with _jobs_lock:
+        return list(reversed(_jobs.values()))
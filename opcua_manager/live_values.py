@@ -0,0 +1,54 @@
+from . import server_registry
+
+
+def read_live_values(server_id=None, keys=None):
+    """从运行中服务器的内存读取节点当前值，返回列格式的结果，不访问数据库
+
+    指定server_id时读取该服务器的节点（keys为None时为全部变量节点）；否则在所有运行中的
+    服务器中查找keys。模板节点的键（负数）在使用同一模板的服务器间相同，必须指定server_id。
+    """
+    if server_id is not None:
+        instance = server_registry.get_instance(server_id)
+        if instance is None or not instance.running:
+            raise ValueError("服务器未运行")
+        ids, values, timestamps, status, missing = instance.read_values(keys)
+        return {'server_id': server_id, 'ids': ids, 'values': values,
+                'timestamps': timestamps, 'status': status, 'missing': missing}
+
+    if keys is None:
+        raise ValueError("必须指定server_id或节点id")
+    result = {'ids': [], 'values': [], 'timestamps': [], 'status': []}
+    remaining = [key for key in keys if key > 0]
+    for instance in server_registry.get_instances():
+        if not remaining:
+            break
+        if not instance.running:
+            continue
+        ids, values, timestamps, status, remaining = instance.read_values(remaining)
+        result['ids'] += ids
+        result['values'] += values
+        result['timestamps'] += timestamps
+        result['status'] += status
+    result['missing'] = remaining + [key for key in keys if key <= 0]
+    return result
+
+
+def write_live_values(server_id, values, by_node_id=False, hold=None, persist=True):
+    """把一批值写入运行中服务器的地址空间，返回写入结果
+
+    values为 {节点id: 值}；by_node_id为True时键为节点配置中的node_id字符串，否则为节点id。
+    """
+    instance = server_registry.get_instance(server_id)
+    if instance is None or not instance.running:
+        raise ValueError("服务器未运行")
+    if by_node_id:
+        with instance.nodes_lock:
+            keys = {record.params.node_id: key for key, record in instance.nodes.items()}
+        written, key_errors = instance.write_values(
+            {keys[node_id]: value for node_id, value in values.items() if node_id in keys}, hold, persist)
+        node_ids = {key: node_id for node_id, key in keys.items() if key in key_errors}
+        errors = {node_ids[key]: error for key, error in key_errors.items()}
+        errors.update((node_id, '节点不存在或不是变量节点') for node_id in values if node_id not in keys)
+    else:
+        written, errors = instance.write_values({int(key): value for key, value in values.items()}, hold, persist)
+    return {'server_id': server_id, 'written': len(written), 'errors': errors}
@@ -0,0 +1,121 @@
+import gc
+import json
+import time
+import tracemalloc
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+from opcua_manager.models import OpcServer, Node
+from opcua_manager.opcua_server import OpcUaServer
+from opcua_manager.node_runtime import VARIATION_TYPES
+
+
+def _make_config():
+    return OpcServer(id=0, name='benchmark', endpoint='127.0.0.1', port=0,
+                     uri='urn:hotopcserver:benchmark', min_sampling_interval=100)
+
+
+def _load_nodes(instance, count, variation):
+    """逐个创建节点配置并加载，配置对象在加载后即释放，与服务器启动时逐批读取数据库一致"""
+    for i in range(count):
+        instance.add_node(Node(
+            id=i + 1, server=instance.config, name=f'Tag{i:06d}', node_id=f'ns=2;s=Tag{i:06d}',
+            node_type='variable', data_type='double', value='0',
+            variation_type=variation, variation_interval=1000,
+            variation_min=0.0, variation_max=100.0, variation_step=1.0,
+            variation_values='[0, 1, 2, 3]',
+        ))
+
+
+def _memory_category(filename):
+    """按分配位置归类内存"""
+    if '/opcua/' in filename.replace('\\', '/'):
+        return 'address_space'
+    if filename.endswith(('node_runtime.py', 'opcua_server.py')):
+        return 'runtime'
+    return 'other'
+
+
+class Command(BaseCommand):
+    help = '测试节点加载、单节点内存占用和更新周期耗时（不启动网络监听，不写数据库）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', type=int, default=10000, help='节点数')
+        parser.add_argument('--memory-nodes', type=int, default=5000,
+                            help='测量内存时加载的节点数（内存跟踪会显著拖慢加载，单独测量）')
+        parser.add_argument('--ticks', type=int, default=50, help='测量的更新周期数')
+        parser.add_argument('--variation', default='random',
+                            choices=[name for name in VARIATION_TYPES if name != 'none'], help='节点的变化类型')
+        parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+
+    def handle(self, *args, **options):
+        count = options['nodes']
+        if count < 1:
+            raise CommandError('节点数必须大于0')
+        variation = options['variation']
+
+        memory_count = max(1, min(options['memory_nodes'], count))
+
+        # 内存：在单独的实例上跟踪加载过程中新增且加载后仍保留的内存
+        instance = OpcUaServer(_make_config())
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        _load_nodes(instance, memory_count, variation)
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        memory = Counter()
+        for stat in after.compare_to(before, 'filename'):
+            memory[_memory_category(stat.traceback[0].filename)] += stat.size_diff
+        per_tag = {key: round(memory[key] / memory_count, 1) for key in ('address_space', 'runtime', 'other')}
+        per_tag['total'] = round(sum(memory.values()) / memory_count, 1)
+        del instance, before, after
+
+        # 加载速度
+        instance = OpcUaServer(_make_config())
+        load_start = time.perf_counter()
+        _load_nodes(instance, count, variation)
+        load_seconds = time.perf_counter() - load_start
+
+        # 更新周期：每个周期的时间前移一个变化间隔，保证所有节点都到期（只计算和写入地址空间）
+        durations = []
+        updated = 0
+        now = time.time()
+        step = max(instance._update_interval(record.params) for record in instance.nodes.values())
+        for _ in range(options['ticks']):
+            now += step
+            tick_start = time.perf_counter()
+            updated += instance._tick(now)
+            durations.append(time.perf_counter() - tick_start)
+            instance._dirty_nodes.clear()
+        durations.sort()
+        tick_total = sum(durations)
+
+        result = {
+            'nodes': count,
+            'variation': variation,
+            'load_seconds': round(load_seconds, 3),
+            'load_nodes_per_second': round(count / load_seconds),
+            'memory_nodes': memory_count,
+            'bytes_per_tag': per_tag,
+            'ticks': len(durations),
+            'tick_mean_ms': round(tick_total / len(durations) * 1000, 3) if durations else None,
+            'tick_p95_ms': round(durations[int(len(durations) * 0.95) - 1] * 1000, 3) if durations else None,
+            'updates_per_second': round(updated / tick_total) if tick_total else None,
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        self.stdout.write(f"节点数: {count} ({variation})")
+        self.stdout.write(f"加载: {result['load_seconds']}s, {result['load_nodes_per_second']} 节点/秒")
+        self.stdout.write(
+            f"单节点内存（{memory_count} 个节点）: {per_tag['total']} B "
+            f"(地址空间 {per_tag['address_space']} B, 运行时记录 {per_tag['runtime']} B, 其他 {per_tag['other']} B)"
+        )
+        if durations:
+            self.stdout.write(
+                f"更新周期: 平均 {result['tick_mean_ms']}ms, P95 {result['tick_p95_ms']}ms, "
+                f"{result['updates_per_second']} 次更新/秒"
+            )
@@ -0,0 +1,107 @@
+import os
+import sys
+import json
+import statistics
+import subprocess
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# 在新的解释器中加载Django和全部URL配置（即加载所有视图模块），输出耗时、内存和已导入的重型依赖
+CHILD_SCRIPT = '''
+import json, os, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urls_done = time.perf_counter()
+try:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss_kb //= 1024
+except ImportError:
+    rss_kb = None
+print(json.dumps({
+    'setup_ms': (setup_done - start) * 1000,
+    'urls_ms': (urls_done - setup_done) * 1000,
+    'rss_kb': rss_kb,
+    'heavy_modules': [name for name in %r if name in sys.modules],
+}))
+'''
+
+HEAVY_MODULES = ('opcua', 'lxml', 'cryptography', 'numpy')
+
+
+def _run_child(extra_args=()):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'HotOpcServer.settings'))
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, *extra_args, '-c', CHILD_SCRIPT % (HEAVY_MODULES,)],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if completed.returncode != 0:
+        raise CommandError(f'子进程执行失败:\n{completed.stderr}')
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['wall_ms'] = wall_ms
+    return result, completed.stderr
+
+
+def _parse_importtime(stderr, top):
+    """从 -X importtime 的输出中取累计耗时最长的顶层导入"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.startswith('  '):
+            continue  # 被其他模块间接导入
+        entries.append((int(cumulative) / 1000, name.strip()))
+    entries.sort(reverse=True)
+    return [{'module': name, 'cumulative_ms': round(ms, 1)} for ms, name in entries[:top]]
+
+
+class Command(BaseCommand):
+    help = '测试新进程加载Django和全部视图模块的耗时与内存（模拟管理命令和Web工作进程启动）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='测量次数，结果取中位数')
+        parser.add_argument('--top', type=int, default=10, help='列出导入耗时最长的顶层模块数')
+        parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('测量次数必须大于0')
+
+        _run_child()  # 预热，生成字节码缓存
+        runs = [_run_child()[0] for _ in range(options['runs'])]
+        _, importtime = _run_child(['-X', 'importtime'])
+
+        def median(key):
+            return round(statistics.median(run[key] for run in runs), 1)
+
+        rss = [run['rss_kb'] for run in runs if run['rss_kb'] is not None]
+        result = {
+            'runs': len(runs),
+            'wall_ms': median('wall_ms'),
+            'setup_ms': median('setup_ms'),
+            'urls_ms': median('urls_ms'),
+            'rss_mb': round(statistics.median(rss) / 1024, 1) if rss else None,
+            'heavy_modules': runs[-1]['heavy_modules'],
+            'top_imports': _parse_importtime(importtime, options['top']),
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2, ensure_ascii=False))
+            return
+        self.stdout.write(f"进程总耗时: {result['wall_ms']}ms（{result['runs']} 次中位数）")
+        self.stdout.write(f"django.setup: {result['setup_ms']}ms, 加载URL配置: {result['urls_ms']}ms")
+        if result['rss_mb'] is not None:
+            self.stdout.write(f"峰值内存: {result['rss_mb']} MB")
+        self.stdout.write(f"已导入的重型依赖: {', '.join(result['heavy_modules']) or '无'}")
+        self.stdout.write('导入耗时最长的顶层模块:')
+        for entry in result['top_imports']:
+            self.stdout.write(f"  {entry['cumulative_ms']:>8.1f}ms  {entry['module']}")
@@ -0,0 +1,32 @@
+import signal
+from django.core.management.base import BaseCommand, CommandError
+from opcua_manager.runner_control import control_address
+from opcua_manager.simulator_runner import SimulatorRunner, DEFAULT_RECONCILE_INTERVAL
+
+
+class Command(BaseCommand):
+    help = '在独立进程中运行所有OPC UA服务器，通过本地控制端口接收Web进程的启停命令'
+
+    def add_arguments(self, parser):
+        host, port = control_address()
+        parser.add_argument('--host', default=host, help='控制端口监听地址（应只监听本机）')
+        parser.add_argument('--port', type=int, default=port, help='控制端口')
+        parser.add_argument('--reconcile-interval', type=float, default=DEFAULT_RECONCILE_INTERVAL,
+                            help='与数据库中服务器状态对齐的间隔(秒)')
+
+    def handle(self, *args, **options):
+        if options['reconcile_interval'] <= 0:
+            raise CommandError('对齐间隔必须大于0')
+        runner = SimulatorRunner((options['host'], options['port']), options['reconcile_interval'])
+
+        def handle_signal(signum, frame):
+            runner.shutdown()
+
+        # 替换应用启动时注册的处理器：退出时保留服务器的运行状态，下次启动后恢复
+        signal.signal(signal.SIGINT, handle_signal)
+        signal.signal(signal.SIGTERM, handle_signal)
+        self.stdout.write(f"模拟器进程已启动，控制端口 {options['host']}:{options['port']}，按Ctrl+C退出")
+        try:
+            runner.run()
+        except OSError as e:
+            raise CommandError(f'无法监听控制端口: {e}')
@@ -0,0 +1,153 @@
+from bisect import bisect_left
+
+# 直方图桶上界（秒）
+TICK_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+FLUSH_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# 每秒更新节点数的平滑系数
+RATE_SMOOTHING = 0.2
+
+
+class Histogram:
+    """固定桶直方图，桶计数在创建时一次性分配"""
+    __slots__ = ('bounds', 'counts', 'count', 'total')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+
+class ServerMetrics:
+    """服务器运行时指标
+
+    所有计数器只由更新线程写入，读取方只做快照读取，因此无需加锁。
+    """
+    __slots__ = ('tick_duration', 'tick_overruns', 'nodes_updated',
+                 'nodes_per_second', 'last_flush_size', 'flush_duration',
+                 'update_errors', 'client_writes', 'faults_injected', 'deadband_suppressed',
+                 'last_tick_start')
+
+    def __init__(self):
+        self.tick_duration = Histogram(TICK_BUCKETS)
+        self.tick_overruns = 0
+        self.nodes_updated = 0
+        self.nodes_per_second = 0.0
+        self.last_flush_size = 0  # 最近一次写回的节点数
+        self.flush_duration = Histogram(FLUSH_BUCKETS)
+        self.update_errors = 0
+        self.client_writes = 0
+        self.faults_injected = 0
+        self.deadband_suppressed = 0
+        self.last_tick_start = None
+
+    def observe_tick(self, tick_start, duration, updated, period):
+        """记录一次更新周期"""
+        self.tick_duration.observe(duration)
+        if duration > period:
+            self.tick_overruns += 1
+        self.nodes_updated += updated
+        if self.last_tick_start is not None and tick_start > self.last_tick_start:
+            rate = updated / (tick_start - self.last_tick_start)
+            self.nodes_per_second += RATE_SMOOTHING * (rate - self.nodes_per_second)
+        self.last_tick_start = tick_start
+
+    def observe_flush(self, duration, size):
+        """记录一次数据库写回"""
+        self.flush_duration.observe(duration)
+        self.last_flush_size = size
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_float(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class _Family:
+    """同名指标的所有样本"""
+
+    def __init__(self, name, metric_type, help_text):
+        self.name = name
+        self.type = metric_type
+        self.help = help_text
+        self.samples = []
+
+    def add(self, labels, value, suffix=''):
+        self.samples.append((suffix, labels, value))
+
+    def add_histogram(self, labels, histogram):
+        cumulative = 0
+        for bound, count in zip(histogram.bounds + (float('inf'),), histogram.counts):
+            cumulative += count
+            self.add(labels + (('le', _format_float(bound)),), cumulative, '_bucket')
+        self.add(labels, histogram.total, '_sum')
+        self.add(labels, histogram.count, '_count')
+
+    def render(self, lines):
+        lines.append(f'# HELP {self.name} {self.help}')
+        lines.append(f'# TYPE {self.name} {self.type}')
+        for suffix, labels, value in self.samples:
+            label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels)
+            if isinstance(value, float):
+                value = _format_float(value)
+            lines.append(f'{self.name}{suffix}{{{label_text}}} {value}')
+
+
+def render_metrics(instances):
+    """将所有服务器实例的指标渲染为Prometheus文本格式"""
+    families = {
+        'running': _Family('opcua_server_running', 'gauge', '服务器是否正在运行'),
+        'nodes': _Family('opcua_server_nodes', 'gauge', '已加载到地址空间的节点数'),
+        'tick': _Family('opcua_tick_duration_seconds', 'histogram', '更新周期耗时'),
+        'overruns': _Family('opcua_tick_overruns_total', 'counter', '耗时超过更新周期的次数'),
+        'updated': _Family('opcua_nodes_updated_total', 'counter', '累计更新的节点数'),
+        'rate': _Family('opcua_nodes_updated_per_second', 'gauge', '每秒更新的节点数（平滑值）'),
+        'flush_size': _Family('opcua_last_flush_size', 'gauge', '最近一次写回运行时值存储的节点数'),
+        'flush': _Family('opcua_db_flush_duration_seconds', 'histogram', '节点值写回数据库的耗时'),
+        'errors': _Family('opcua_update_errors_total', 'counter', '更新线程中的异常次数'),
+        'client_writes': _Family('opcua_client_writes_total', 'counter', '更新线程处理的客户端写入次数'),
+        'faults': _Family('opcua_faults_injected_total', 'counter', '注入了故障的节点更新次数'),
+        'deadband': _Family('opcua_deadband_suppressed_total', 'counter', '变化未超过死区而未发布的节点更新次数'),
+        'load': _Family('opcua_tick_load', 'gauge', '平滑后的周期耗时与周期长度之比'),
+        'shed': _Family('opcua_nodes_shed_total', 'counter', '过载时被丢弃的节点更新次数'),
+        'skipped': _Family('opcua_ticks_skipped_total', 'counter', '过载时跳过的周期数'),
+        'sessions': _Family('opcua_sessions', 'gauge', '当前连接的客户端会话数'),
+        'monitored': _Family('opcua_monitored_items', 'gauge', '当前的监视项数'),
+    }
+
+    for instance in instances:
+        labels = (('server_id', instance.config.id), ('server', instance.config.name))
+        metrics = instance.metrics
+        families['running'].add(labels, int(instance.running))
+        families['nodes'].add(labels, len(instance.nodes))
+        families['tick'].add_histogram(labels, metrics.tick_duration)
+        families['overruns'].add(labels, metrics.tick_overruns)
+        families['updated'].add(labels, metrics.nodes_updated)
+        families['rate'].add(labels, metrics.nodes_per_second)
+        families['flush_size'].add(labels, metrics.last_flush_size)
+        families['flush'].add_histogram(labels, metrics.flush_duration)
+        families['errors'].add(labels, metrics.update_errors)
+        families['client_writes'].add(labels, metrics.client_writes)
+        families['faults'].add(labels, metrics.faults_injected)
+        families['deadband'].add(labels, metrics.deadband_suppressed)
+        families['load'].add(labels, instance.overload.load)
+        families['shed'].add(labels, instance.overload.shed_total)
+        families['skipped'].add(labels, instance.overload.skipped_ticks)
+        families['sessions'].add(labels, instance.get_session_count())
+        families['monitored'].add(labels, instance.get_monitored_item_count())
+
+    lines = []
+    for family in families.values():
+        family.render(lines)
+    return '\n'.join(lines) + '\n'
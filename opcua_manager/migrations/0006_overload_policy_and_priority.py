@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-19 03:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('opcua_manager', '0005_opcserver_node_delete_opcnode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='node',
+            name='priority',
+            field=models.IntegerField(default=0, verbose_name='优先级'),
+        ),
+        migrations.AddField(
+            model_name='opcserver',
+            name='overload_policy',
+            field=models.CharField(default='none', max_length=20, verbose_name='过载策略'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.3 on 2026-10-19 04:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('opcua_manager', '0006_overload_policy_and_priority'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NodeTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='模板名称')),
+                ('description', models.TextField(blank=True, null=True, verbose_name='描述')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '节点模板',
+                'verbose_name_plural': '节点模板',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='opcserver',
+            name='template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='servers', to='opcua_manager.nodetemplate', verbose_name='节点模板'),
+        ),
+        migrations.CreateModel(
+            name='TemplateNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='节点名称')),
+                ('node_id', models.CharField(max_length=200, verbose_name='节点ID')),
+                ('node_type', models.CharField(max_length=20, verbose_name='节点类型')),
+                ('data_type', models.CharField(max_length=20, verbose_name='数据类型')),
+                ('value', models.CharField(blank=True, max_length=200, null=True, verbose_name='初始值')),
+                ('description', models.TextField(blank=True, null=True, verbose_name='描述')),
+                ('variation_type', models.CharField(default='none', max_length=20, verbose_name='变化类型')),
+                ('variation_interval', models.IntegerField(default=1000, verbose_name='变化间隔(ms)')),
+                ('variation_min', models.FloatField(blank=True, null=True, verbose_name='最小值')),
+                ('variation_max', models.FloatField(blank=True, null=True, verbose_name='最大值')),
+                ('variation_step', models.FloatField(blank=True, null=True, verbose_name='步长')),
+                ('variation_values', models.TextField(blank=True, null=True, verbose_name='离散值集合')),
+                ('decimal_places', models.IntegerField(default=2, verbose_name='小数位数')),
+                ('priority', models.IntegerField(default=0, verbose_name='优先级')),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nodes', to='opcua_manager.nodetemplate', verbose_name='所属模板')),
+            ],
+            options={
+                'verbose_name': '模板节点',
+                'verbose_name_plural': '模板节点',
+                'ordering': ['id'],
+                'unique_together': {('template', 'node_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-19 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('opcua_manager', '0007_node_templates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='node',
+            name='write_hold_time',
+            field=models.IntegerField(default=10000, verbose_name='写入保持时间(ms)'),
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='write_policy',
+            field=models.CharField(default='resume', max_length=20, verbose_name='客户端写入策略'),
+        ),
+        migrations.AddField(
+            model_name='templatenode',
+            name='write_hold_time',
+            field=models.IntegerField(default=10000, verbose_name='写入保持时间(ms)'),
+        ),
+        migrations.AddField(
+            model_name='templatenode',
+            name='write_policy',
+            field=models.CharField(default='resume', max_length=20, verbose_name='客户端写入策略'),
+        ),
+    ]
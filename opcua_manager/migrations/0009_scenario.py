@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-19 05:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('opcua_manager', '0008_node_write_policy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Scenario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='场景名称')),
+                ('description', models.TextField(blank=True, null=True, verbose_name='描述')),
+                ('definition', models.TextField(verbose_name='事件定义(JSON)')),
+                ('loop', models.BooleanField(default=False, verbose_name='循环执行')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('server', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scenarios', to='opcua_manager.opcserver', verbose_name='所属服务器')),
+            ],
+            options={
+                'verbose_name': '场景',
+                'verbose_name_plural': '场景',
+                'ordering': ['name'],
+                'unique_together': {('server', 'name')},
+            },
+        ),
+    ]
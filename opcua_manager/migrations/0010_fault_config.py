@@ -0,0 +1,28 @@
+# Generated by Django 5.1.3 on 2026-10-19 05:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('opcua_manager', '0009_scenario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='node',
+            name='fault_config',
+            field=models.TextField(blank=True, null=True, verbose_name='故障注入配置'),
+        ),
+        migrations.AddField(
+            model_name='opcserver',
+            name='fault_config',
+            field=models.TextField(blank=True, null=True, verbose_name='故障注入默认配置'),
+        ),
+        migrations.AddField(
+            model_name='templatenode',
+            name='fault_config',
+            field=models.TextField(blank=True, null=True, verbose_name='故障注入配置'),
+        ),
+    ]
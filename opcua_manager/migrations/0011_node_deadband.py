@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-19 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('opcua_manager', '0010_fault_config'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='node',
+            name='deadband_absolute',
+            field=models.FloatField(default=0, verbose_name='绝对死区'),
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='deadband_percent',
+            field=models.FloatField(default=0, verbose_name='百分比死区(%)'),
+        ),
+        migrations.AddField(
+            model_name='templatenode',
+            name='deadband_absolute',
+            field=models.FloatField(default=0, verbose_name='绝对死区'),
+        ),
+        migrations.AddField(
+            model_name='templatenode',
+            name='deadband_percent',
+            field=models.FloatField(default=0, verbose_name='百分比死区(%)'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-19 05:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('opcua_manager', '0011_node_deadband'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='node',
+            name='generator_config',
+            field=models.TextField(blank=True, null=True, verbose_name='组合信号配置'),
+        ),
+        migrations.AddField(
+            model_name='templatenode',
+            name='generator_config',
+            field=models.TextField(blank=True, null=True, verbose_name='组合信号配置'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 05:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('opcua_manager', '0012_generator_config'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='node',
+            name='value',
+            field=models.CharField(blank=True, max_length=200, null=True, verbose_name='初始值'),
+        ),
+    ]
@@ -1,5 +1,39 @@
 from django.db import models
 
+# 节点的可配置字段（节点集合、导入导出等使用的字段）
+NODE_CONFIG_FIELDS = (
+    'name', 'node_id', 'node_type', 'data_type', 'value', 'description',
+    'variation_type', 'variation_interval', 'variation_min', 'variation_max',
+    'variation_step', 'variation_values', 'decimal_places', 'priority',
+    'write_policy', 'write_hold_time', 'fault_config', 'deadband_absolute', 'deadband_percent',
+    'generator_config',
+)
+
+# 客户端写入节点值后的处理策略：resume 从写入值继续变化，hold 暂停变化一段时间，
+# override 停止变化直到节点配置被修改
+WRITE_POLICIES = ('resume', 'hold', 'override')
+
+# 服务器的可配置字段（导入导出使用的字段）
+SERVER_CONFIG_FIELDS = (
+    'name', 'endpoint', 'port', 'uri', 'allow_anonymous', 'username', 'password',
+    'min_sampling_interval', 'overload_policy', 'fault_config',
+)
+
+class NodeTemplate(models.Model):
+    """多个服务器共享的节点模板，服务器只保存与模板不同的节点"""
+    name = models.CharField(max_length=100, unique=True, verbose_name='模板名称')
+    description = models.TextField(blank=True, null=True, verbose_name='描述')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+
+    class Meta:
+        verbose_name = '节点模板'
+        verbose_name_plural = verbose_name
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
 class OpcServer(models.Model):
     name = models.CharField(max_length=100, verbose_name='服务器名称')
     endpoint = models.CharField(max_length=200, verbose_name='终端点')
@@ -9,6 +43,10 @@ class OpcServer(models.Model):
     username = models.CharField(max_length=100, blank=True, null=True, verbose_name='用户名')
     password = models.CharField(max_length=100, blank=True, null=True, verbose_name='密码')
     min_sampling_interval = models.IntegerField(default=100, verbose_name='最小采样间隔(ms)')
+    overload_policy = models.CharField(max_length=20, default='none', verbose_name='过载策略')
+    fault_config = models.TextField(blank=True, null=True, verbose_name='故障注入默认配置')
+    template = models.ForeignKey(NodeTemplate, on_delete=models.PROTECT, blank=True, null=True,
+                                 related_name='servers', verbose_name='节点模板')
     is_running = models.BooleanField(default=False, verbose_name='运行状态')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
@@ -21,13 +59,13 @@ class OpcServer(models.Model):
     def __str__(self):
         return f"{self.name} ({self.endpoint}:{self.port})"
 
-class Node(models.Model):
-    server = models.ForeignKey(OpcServer, on_delete=models.CASCADE, related_name='nodes', verbose_name='所属服务器')
+class NodeConfig(models.Model):
+    """Node与TemplateNode共有的节点配置字段"""
     name = models.CharField(max_length=100, verbose_name='节点名称')
     node_id = models.CharField(max_length=200, verbose_name='节点ID')
     node_type = models.CharField(max_length=20, verbose_name='节点类型')
     data_type = models.CharField(max_length=20, verbose_name='数据类型')
-    value = models.CharField(max_length=200, blank=True, null=True, verbose_name='当前值')
+    value = models.CharField(max_length=200, blank=True, null=True, verbose_name='初始值')
     description = models.TextField(blank=True, null=True, verbose_name='描述')
     variation_type = models.CharField(max_length=20, default='none', verbose_name='变化类型')
     variation_interval = models.IntegerField(default=1000, verbose_name='变化间隔(ms)')
@@ -35,7 +73,23 @@ class Node(models.Model):
     variation_max = models.FloatField(blank=True, null=True, verbose_name='最大值')
     variation_step = models.FloatField(blank=True, null=True, verbose_name='步长')
     variation_values = models.TextField(blank=True, null=True, verbose_name='离散值集合')
+    generator_config = models.TextField(blank=True, null=True, verbose_name='组合信号配置')
     decimal_places = models.IntegerField(default=2, verbose_name='小数位数')
+    priority = models.IntegerField(default=0, verbose_name='优先级')
+    write_policy = models.CharField(max_length=20, default='resume', verbose_name='客户端写入策略')
+    write_hold_time = models.IntegerField(default=10000, verbose_name='写入保持时间(ms)')
+    fault_config = models.TextField(blank=True, null=True, verbose_name='故障注入配置')
+    deadband_absolute = models.FloatField(default=0, verbose_name='绝对死区')
+    deadband_percent = models.FloatField(default=0, verbose_name='百分比死区(%)')
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"{self.name} ({self.node_id})"
+
+class Node(NodeConfig):
+    server = models.ForeignKey(OpcServer, on_delete=models.CASCADE, related_name='nodes', verbose_name='所属服务器')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
 
@@ -45,5 +99,41 @@ class Node(models.Model):
         ordering = ['name']
         unique_together = ['server', 'node_id']
 
+    @property
+    def runtime_key(self):
+        """运行时节点表中的键"""
+        return self.id
+
+class TemplateNode(NodeConfig):
+    """模板中的节点；服务器中node_id相同的Node覆盖模板节点"""
+    template = models.ForeignKey(NodeTemplate, on_delete=models.CASCADE, related_name='nodes', verbose_name='所属模板')
+
+    class Meta:
+        verbose_name = '模板节点'
+        verbose_name_plural = verbose_name
+        ordering = ['id']
+        unique_together = ['template', 'node_id']
+
+    @property
+    def runtime_key(self):
+        """运行时节点表中的键，取负值以免与Node的id冲突"""
+        return -self.id
+
+class Scenario(models.Model):
+    """服务器的场景：按时间触发的一组节点值事件，定义格式见 scenario.parse_scenario"""
+    server = models.ForeignKey(OpcServer, on_delete=models.CASCADE, related_name='scenarios', verbose_name='所属服务器')
+    name = models.CharField(max_length=100, verbose_name='场景名称')
+    description = models.TextField(blank=True, null=True, verbose_name='描述')
+    definition = models.TextField(verbose_name='事件定义(JSON)')
+    loop = models.BooleanField(default=False, verbose_name='循环执行')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+
+    class Meta:
+        verbose_name = '场景'
+        verbose_name_plural = verbose_name
+        ordering = ['name']
+        unique_together = ['server', 'name']
+
     def __str__(self):
-        return f"{self.name} ({self.node_id})"
+        return self.name
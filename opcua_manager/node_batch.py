@@ -0,0 +1,102 @@
+import logging
+from django.db import transaction, connection
+from django.utils import timezone
+from .models import OpcServer, Node, NODE_CONFIG_FIELDS
+from .node_changes import apply_live_changes
+
+logger = logging.getLogger(__name__)
+
+BULK_CHUNK_SIZE = 1000  # 批量写入的分块大小
+
+
+def add_nodes(nodes_data, job=None):
+    """批量添加节点（可跨多个服务器）
+
+    所有节点在一个事务中分块写入，任一node_id已存在时整体失败；
+    作为后台任务执行时按块报告进度，取消时事务回滚。
+    写入完成后运行中的服务器同步添加新节点。
+    """
+    server_ids = {int(node_data['server_id']) for node_data in nodes_data}
+    servers = OpcServer.objects.in_bulk(server_ids)
+    if len(servers) != len(server_ids):
+        raise ValueError('服务器不存在')
+
+    new_nodes = []
+    seen = set()
+    for node_data in nodes_data:
+        server = servers[int(node_data['server_id'])]
+        key = (server.id, node_data['node_id'])
+        if key in seen:
+            raise ValueError(f'节点ID {node_data["node_id"]} 重复')
+        seen.add(key)
+        fields = {field: node_data[field] for field in NODE_CONFIG_FIELDS if field in node_data}
+        new_nodes.append(Node(server=server, **fields))
+
+    # 分块查询每个服务器上已存在的node_id
+    for server in servers.values():
+        node_ids = [node_id for server_id, node_id in seen if server_id == server.id]
+        for start in range(0, len(node_ids), BULK_CHUNK_SIZE):
+            chunk = node_ids[start:start + BULK_CHUNK_SIZE]
+            existing = Node.objects.filter(server=server, node_id__in=chunk).values_list('node_id', flat=True).first()
+            if existing is not None:
+                raise ValueError(f'节点ID {existing} 已存在')
+
+    with transaction.atomic():
+        for start in range(0, len(new_nodes), BULK_CHUNK_SIZE):
+            if job is not None:
+                job.check_cancelled()
+                job.update_progress(start, len(new_nodes))
+            Node.objects.bulk_create(new_nodes[start:start + BULK_CHUNK_SIZE])
+    if job is not None:
+        job.update_progress(len(new_nodes), len(new_nodes))
+
+    # 热更新运行中的服务器
+    for server in servers.values():
+        apply_live_changes(server.id, added=[node for node in new_nodes if node.server_id == server.id])
+
+    logger.info(f"Batch added {len(new_nodes)} nodes")
+    return {'created': len(new_nodes), 'message': f'成功创建 {len(new_nodes)} 个节点'}
+
+
+def bulk_insert_nodes(rows):
+    """直接用executemany插入节点行，跳过模型实例化，用于一次创建大量节点
+
+    rows为 (服务器id, 节点配置字典) 的可迭代对象，缺少的字段（以及不允许为空的字段为None时）
+    使用模型默认值。各值与模型保存时相同，经字段的 get_db_prep_save 转换为数据库值。
+    应在事务中调用；不返回新节点的主键。返回插入的行数。
+    """
+    fields = [field for field in Node._meta.concrete_fields if not field.primary_key]
+    now = timezone.now()
+    defaults = {}
+    for field in fields:
+        if field.name in ('created_at', 'updated_at'):
+            defaults[field.name] = field.get_db_prep_save(now, connection)
+        elif field.name != 'server':
+            defaults[field.name] = field.get_db_prep_save(field.get_default(), connection)
+    config_fields = [(i, field) for i, field in enumerate(fields) if field.name in NODE_CONFIG_FIELDS]
+    server_index = [field.name for field in fields].index('server')
+
+    quote = connection.ops.quote_name
+    sql = (f"INSERT INTO {quote(Node._meta.db_table)} ({', '.join(quote(field.column) for field in fields)}) "
+           f"VALUES ({', '.join(['%s'] * len(fields))})")
+    default_row = [defaults.get(field.name) for field in fields]
+
+    inserted = 0
+    batch = []
+    with connection.cursor() as cursor:
+        for server_id, node_data in rows:
+            row = list(default_row)
+            row[server_index] = server_id
+            for i, field in config_fields:
+                value = node_data.get(field.name)
+                if value is not None or (field.null and field.name in node_data):
+                    row[i] = field.get_db_prep_save(value, connection)
+            batch.append(row)
+            if len(batch) >= BULK_CHUNK_SIZE * 10:
+                cursor.executemany(sql, batch)
+                inserted += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+            inserted += len(batch)
+    return inserted
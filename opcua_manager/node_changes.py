@@ -0,0 +1,72 @@
+import logging
+from .models import Node
+from . import server_registry
+from .template_cache import get_template_nodes
+from .runner_control import servers_are_remote, send_command, RunnerUnavailable
+from .value_store import value_store
+
+logger = logging.getLogger(__name__)
+
+
+def apply_live_changes(server_id, added=(), updated=(), removed=()):
+    """把节点配置的修改同步到运行中的服务器，返回是否已同步
+
+    added: 新节点配置列表；updated: [(节点配置, 变更字段集合)]；removed: 节点键列表
+    （Node为id，模板节点为负的TemplateNode id）。修改须已写入数据库：服务器由独立的模拟器
+    进程运行时只发送节点键，由模拟器进程从数据库读取修改后的配置。服务器未运行时返回False，
+    下次启动时从数据库加载；被移除节点在运行时值存储中保存的值在这里删除。
+    """
+    removed = list(removed)
+    applied = _apply(server_id, added, updated, removed)
+    if not applied and removed:
+        value_store.delete_nodes(server_id, removed)
+    return applied
+
+
+def _apply(server_id, added, updated, removed):
+    if servers_are_remote():
+        try:
+            response = send_command(
+                'apply_node_changes', server_id=server_id,
+                added=[node_config.runtime_key for node_config in added],
+                updated=[[node_config.runtime_key, sorted(changed)] for node_config, changed in updated],
+                removed=removed)
+        except RunnerUnavailable as e:
+            # 模拟器进程未运行时，启动服务器时会从数据库加载修改后的节点
+            logger.warning(f"Node changes of server {server_id} not applied: {e}")
+            return False
+        return response['applied']
+
+    instance = server_registry.get_instance(server_id)
+    if instance is None or not instance.running:
+        return False
+    instance.apply_node_changes(added, updated, removed)
+    return True
+
+
+def apply_node_keys(server_id, added=(), updated=(), removed=()):
+    """按节点键从数据库读取配置并同步到本进程中运行的服务器，返回是否已同步
+
+    模拟器进程处理apply_node_changes命令时调用，参数格式与 apply_live_changes 发送的相同。
+    数据库中已不存在的节点被忽略。
+    """
+    instance = server_registry.get_instance(server_id)
+    if instance is None or not instance.running:
+        return False
+    configs = _load_node_configs(instance.config, list(added) + [key for key, _ in updated])
+    instance.apply_node_changes(
+        added=[configs[key] for key in added if key in configs],
+        updated=[(configs[key], set(changed)) for key, changed in updated if key in configs],
+        removed=removed,
+    )
+    return True
+
+
+def _load_node_configs(server_config, keys):
+    """读取节点配置，返回 {节点键: 节点配置}；模板节点从模板缓存读取"""
+    configs = Node.objects.filter(server_id=server_config.id).in_bulk([key for key in keys if key > 0])
+    if server_config.template_id and any(key < 0 for key in keys):
+        template_keys = {key for key in keys if key < 0}
+        configs.update((node.runtime_key, node) for node in get_template_nodes(server_config.template_id)
+                       if node.runtime_key in template_keys)
+    return configs
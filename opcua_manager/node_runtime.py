@@ -0,0 +1,211 @@
+import json
+import logging
+from functools import partial
+from opcua import ua
+from .models import Node, TemplateNode, WRITE_POLICIES
+from .faults import fault_profile
+from .generators import load_generator
+
+logger = logging.getLogger(__name__)
+
+# 变化类型及其编码，运行时记录中只保存编码
+VARIATION_TYPES = ('none', 'random', 'increment', 'decrement', 'sine', 'square', 'triangle', 'sawtooth', 'discrete',
+                   'composite')
+VARIATION_CODES = {name: code for code, name in enumerate(VARIATION_TYPES)}
+(VARIATION_NONE, VARIATION_RANDOM, VARIATION_INCREMENT, VARIATION_DECREMENT, VARIATION_SINE,
+ VARIATION_SQUARE, VARIATION_TRIANGLE, VARIATION_SAWTOOTH, VARIATION_DISCRETE,
+ VARIATION_COMPOSITE) = range(len(VARIATION_TYPES))
+
+# 按时间计算的波形类型，每个周期都需要重新采样
+WAVEFORM_CODES = frozenset((VARIATION_SINE, VARIATION_SQUARE, VARIATION_TRIANGLE, VARIATION_SAWTOOTH))
+
+# 客户端写入策略的编码
+WRITE_RESUME, WRITE_HOLD, WRITE_OVERRIDE = range(len(WRITE_POLICIES))
+WRITE_POLICY_CODES = {name: code for code, name in enumerate(WRITE_POLICIES)}
+
+# 数据类型 -> 变体类型，变量节点按此类型创建，更新的值也按此类型发布
+VARIANT_TYPES = {
+    'boolean': ua.VariantType.Boolean,
+    'datetime': ua.VariantType.DateTime,
+    'double': ua.VariantType.Double,
+    'float': ua.VariantType.Float,
+    'int32': ua.VariantType.Int32,
+    'int64': ua.VariantType.Int64,
+    'string': ua.VariantType.String,
+    'uint32': ua.VariantType.UInt32,
+    'uint64': ua.VariantType.UInt64,
+}
+
+# 地址空间中各变量节点取值相同、创建后不再修改的属性
+SHARED_ATTRIBUTES = frozenset((
+    ua.AttributeIds.NodeClass, ua.AttributeIds.WriteMask, ua.AttributeIds.UserWriteMask,
+    ua.AttributeIds.DataType, ua.AttributeIds.ValueRank, ua.AttributeIds.ArrayDimensions,
+    ua.AttributeIds.AccessLevel, ua.AttributeIds.UserAccessLevel,
+    ua.AttributeIds.MinimumSamplingInterval, ua.AttributeIds.Historizing,
+    ua.AttributeIds.EventNotifier,
+))
+
+
+class NodeParams:
+    """节点的运行参数
+
+    由节点配置换算而来，创建后不再修改：配置变化时整体换成新的参数对象。模板节点的参数
+    在使用该模板的所有服务器间共享同一个对象，见 template_cache.get_template_params。
+    """
+    __slots__ = ('key', 'node_id', 'persist', 'varianttype', 'convert', 'variation', 'variation_interval',
+                 'variation_min', 'variation_max', 'variation_step', 'variation_values', 'update_interval',
+                 'generator', 'priority', 'write_policy', 'write_hold', 'faults', 'deadband')
+
+    def __init__(self, node_config, server_faults=None):
+        """server_faults为服务器的故障注入默认配置"""
+        if node_config.node_type == 'variable':
+            variation = VARIATION_CODES.get(node_config.variation_type, VARIATION_NONE)
+            varianttype = VARIANT_TYPES.get(node_config.data_type)
+        else:
+            variation = VARIATION_NONE
+            varianttype = None
+        variation_values = None
+        if variation == VARIATION_DISCRETE:
+            variation_values = _parse_values(node_config)
+        generator = None  # 组合信号的GeneratorSpec，由GeneratorBank批量计算
+        if variation == VARIATION_COMPOSITE:
+            generator = load_generator(node_config)
+            if generator is None:
+                variation = VARIATION_NONE
+        # 配置的更新间隔(秒)；波形按时间计算，每个周期都需要重新采样
+        update_interval = 0.0 if variation in WAVEFORM_CODES else (node_config.variation_interval or 0) / 1000
+        self._set(
+            key=node_config.runtime_key,
+            node_id=node_config.node_id,
+            persist=isinstance(node_config, Node),  # 是否为服务器自己的节点（模板节点没有Node行）
+            varianttype=varianttype,  # None时按值推断
+            convert=CONVERTERS.get(varianttype),  # 计算出的数值转换为数据类型对应的值，None表示无需转换
+            variation=variation,
+            variation_interval=node_config.variation_interval,
+            variation_min=node_config.variation_min,
+            variation_max=node_config.variation_max,
+            variation_step=node_config.variation_step,
+            variation_values=variation_values,
+            update_interval=update_interval,
+            generator=generator,
+            priority=node_config.priority,
+            write_policy=WRITE_POLICY_CODES.get(node_config.write_policy, WRITE_RESUME),
+            write_hold=(node_config.write_hold_time or 0) / 1000,
+            faults=fault_profile(node_config.fault_config, server_faults or {}),  # 无故障时为None
+            deadband=_deadband(node_config),
+        )
+
+    def _set(self, **values):
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("节点参数创建后不能修改")
+
+    @property
+    def active(self):
+        """是否需要由更新线程周期性更新"""
+        return self.variation != VARIATION_NONE
+
+    def __getstate__(self):
+        # 按槽位顺序保存为元组，序列化快照时比默认的字典格式更紧凑
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        self._set(**dict(zip(self.__slots__, state)))
+
+
+class NodeRecord:
+    """节点在一个服务器中的运行时记录
+
+    只保存各服务器独有的状态：地址空间中的NodeId、当前值、状态码和下次更新时刻，
+    参数通过params引用不可变的NodeParams。加载完成后不再引用Django模型实例。
+    """
+    __slots__ = ('params', 'nodeid', 'value', 'status', 'next_due')
+
+    def __init__(self, params, nodeid, value=None, status=0):
+        self.params = params
+        self.nodeid = nodeid
+        self.value = value  # 当前值，变量节点为按数据类型转换后的值
+        self.status = status  # 当前状态码，更新值时沿用（场景可设为Bad/Uncertain）
+        self.next_due = 0.0
+
+    @property
+    def key(self):
+        """节点键：Node为id，模板节点为负的TemplateNode id"""
+        return self.params.key
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+
+def _to_integer(low, high, value):
+    return min(max(int(round(value)), low), high)
+
+
+# 变体类型 -> 转换函数：变化计算得到的是浮点数，按节点的变体类型转换后再发布，整数取整并限制在类型范围内；
+# 无需转换的类型不在其中
+CONVERTERS = {
+    ua.VariantType.Int32: partial(_to_integer, -2 ** 31, 2 ** 31 - 1),
+    ua.VariantType.Int64: partial(_to_integer, -2 ** 63, 2 ** 63 - 1),
+    ua.VariantType.UInt32: partial(_to_integer, 0, 2 ** 32 - 1),
+    ua.VariantType.UInt64: partial(_to_integer, 0, 2 ** 64 - 1),
+    ua.VariantType.Boolean: bool,
+    ua.VariantType.String: str,
+}
+
+
+def _deadband(node_config):
+    """死区换算为绝对阈值：取绝对死区与百分比死区（相对变化范围max-min）中较大者，0表示不启用"""
+    threshold = node_config.deadband_absolute or 0.0
+    if node_config.deadband_percent and node_config.variation_min is not None and node_config.variation_max is not None:
+        span = abs(node_config.variation_max - node_config.variation_min)
+        threshold = max(threshold, span * node_config.deadband_percent / 100)
+    return threshold
+
+
+def _parse_values(node_config):
+    """离散值集合在加载时解析一次"""
+    if not node_config.variation_values:
+        return None
+    try:
+        values = json.loads(node_config.variation_values)
+    except (ValueError, TypeError) as e:
+        logger.error(f"Invalid discrete values for node {node_config.node_id}: {e}")
+        return None
+    return tuple(values) if isinstance(values, list) and values else None
+
+
+def share_constant_attributes(nodedata, shared):
+    """把节点的常量属性替换为同值的共享DataValue
+
+    地址空间写入属性时整体替换DataValue而不修改原对象，取值相同的属性可以在所有节点间
+    共享同一个对象。shared为 {(属性id, 变体类型, 值): DataValue} 的缓存。
+    """
+    for attr, attval in nodedata.attributes.items():
+        if attr in SHARED_ATTRIBUTES:
+            attval.value = shared_value(attr, attval.value, shared)
+
+
+def shared_value(attr, datavalue, shared):
+    """返回与datavalue取值相同的共享DataValue，值不可哈希时原样返回"""
+    variant = datavalue.Value
+    value = variant.Value
+    try:
+        key = (attr, variant.VariantType, tuple(value) if isinstance(value, list) else value)
+        return shared.setdefault(key, datavalue)
+    except TypeError:
+        return datavalue
+
+
+def lookup_names(keys):
+    """按运行时键查询节点名称（Node为id，模板节点为负的TemplateNode id）"""
+    keys = list(keys)
+    names = dict(Node.objects.filter(id__in=[key for key in keys if key > 0]).values_list('id', 'name'))
+    template_names = TemplateNode.objects.filter(id__in=[-key for key in keys if key < 0]).values_list('id', 'name')
+    names.update((-node_id, name) for node_id, name in template_names)
+    return names
@@ -0,0 +1,116 @@
+import logging
+from django.db import transaction
+from django.utils import timezone
+from .models import Node, NODE_CONFIG_FIELDS
+from .node_changes import apply_live_changes
+
+logger = logging.getLogger(__name__)
+
+# 应用模式
+APPLY_MODES = {
+    'replace': '替换（删除集合中不存在的节点）',
+    'merge': '合并（保留服务器上的其他节点）',
+    'diff': '仅计算差异，不做修改',
+}
+
+BULK_CHUNK_SIZE = 1000  # 批量写入的分块大小
+
+
+def _chunks(items, size=BULK_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def diff_node_set(server, set_nodes):
+    """一次遍历计算节点集合与服务器现有节点的差异
+
+    返回 (新增节点配置列表, [(现有节点, 变更字段字典)], 待删除节点列表, 未变化节点数)
+    """
+    return diff_nodes(Node.objects.filter(server=server), set_nodes)
+
+
+def diff_nodes(existing_nodes, set_nodes):
+    """计算节点配置列表与现有节点对象（Node或TemplateNode）的差异，返回值同diff_node_set"""
+    existing = {node.node_id: node for node in existing_nodes}
+
+    created = []
+    updated = []
+    seen = set()
+    unchanged = 0
+    for node_data in set_nodes:
+        node_id = node_data['node_id']
+        if node_id in seen:
+            continue
+        seen.add(node_id)
+
+        fields = {key: node_data[key] for key in NODE_CONFIG_FIELDS if key in node_data}
+        node = existing.get(node_id)
+        if node is None:
+            created.append(fields)
+            continue
+
+        changes = {key: value for key, value in fields.items() if getattr(node, key) != value}
+        if changes:
+            updated.append((node, changes))
+        else:
+            unchanged += 1
+
+    deleted = [node for node_id, node in existing.items() if node_id not in seen]
+    return created, updated, deleted, unchanged
+
+
+def apply_node_set(server, set_nodes, mode='merge'):
+    """将节点集合应用到服务器
+
+    数据库变更在一个事务中分块批量写入，服务器运行中时同步更新其地址空间。
+    """
+    if mode not in APPLY_MODES:
+        raise ValueError(f"不支持的应用模式: {mode}")
+
+    created, updated, deleted, unchanged = diff_node_set(server, set_nodes)
+    if mode != 'replace':
+        deleted = []
+
+    result = {
+        'mode': mode,
+        'created': len(created),
+        'updated': len(updated),
+        'deleted': len(deleted),
+        'unchanged': unchanged,
+    }
+    if mode == 'diff':
+        result['created_node_ids'] = [fields['node_id'] for fields in created]
+        result['updated_node_ids'] = [node.node_id for node, _ in updated]
+        result['deleted_node_ids'] = [node.node_id for node in deleted]
+        return result
+
+    new_nodes = [Node(server=server, **fields) for fields in created]
+    update_fields = set()
+    now = timezone.now()
+    for node, changes in updated:
+        for key, value in changes.items():
+            setattr(node, key, value)
+        node.updated_at = now
+        update_fields.update(changes)
+    deleted_ids = [node.id for node in deleted]
+
+    with transaction.atomic():
+        for chunk in _chunks(new_nodes):
+            Node.objects.bulk_create(chunk)
+        if updated:
+            update_fields.add('updated_at')
+            for chunk in _chunks([node for node, _ in updated]):
+                Node.objects.bulk_update(chunk, sorted(update_fields))
+        for chunk in _chunks(deleted_ids):
+            Node.objects.filter(id__in=chunk).delete()
+
+    # 热更新运行中的服务器
+    result['hot_applied'] = apply_live_changes(
+        server.id,
+        added=new_nodes,
+        updated=[(node, set(changes)) for node, changes in updated],
+        removed=deleted_ids
+    )
+
+    logger.info(f"Applied node set to server {server.name}: {result}")
+    return result
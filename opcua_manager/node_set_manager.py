@@ -1,8 +1,10 @@
 import os
-import json
 import shutil
 from pathlib import Path
 from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from .node_set_store import NodeSetStore
+from .file_utils import atomic_write_text
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,6 +17,9 @@ class NodeSetManager:
         self.base_dir = Path(settings.BASE_DIR) / 'node_sets'
         self.base_dir.mkdir(exist_ok=True)
         
+        # 节点列表缓存：集合名称 -> (存储版本标识, 节点列表)
+        self._cache = {}
+        
         # 确保default节点集合存在
         self.ensure_default_set()
         
@@ -41,7 +46,7 @@ class NodeSetManager:
             raise ValueError(f"节点集合 {set_name} 不存在")
         
         active_file = self.base_dir / 'active.txt'
-        active_file.write_text(set_name)
+        atomic_write_text(active_file, set_name)
         self._active_set = set_name
     
     def get_set_list(self):
@@ -51,7 +56,7 @@ class NodeSetManager:
             if item.is_dir() and not item.name.startswith('.'):
                 sets.append({
                     'name': item.name,
-                    'node_count': len(self.get_nodes(item.name)),
+                    'node_count': self._get_store(item.name).count(),
                     'is_active': item.name == self._active_set
                 })
         return sorted(sets, key=lambda x: x['name'])
@@ -102,6 +107,7 @@ class NodeSetManager:
         
         set_dir = self.base_dir / set_name
         shutil.rmtree(set_dir)
+        self._cache.pop(set_name, None)
         return True
     
     def get_nodes(self, set_name=None):
@@ -112,15 +118,22 @@ class NodeSetManager:
         if not self.set_exists(set_name):
             raise ValueError(f"节点集合 {set_name} 不存在")
         
-        nodes_file = self.base_dir / set_name / 'nodes.json'
-        if not nodes_file.exists():
-            return []
+        # 存储未变化时直接使用缓存，不再重复读取
+        store = self._get_store(set_name)
+        version = store.version()
+        cached = self._cache.get(set_name)
+        if cached is None or version is None or cached[0] != version:
+            cached = (version, store.all())
+            if version is not None:
+                self._cache[set_name] = cached
+        return [dict(node) for node in cached[1]]
+    
+    def iter_nodes(self, set_name):
+        """逐个读取节点集合中的节点（用于导出等大批量场景）"""
+        if not self.set_exists(set_name):
+            raise ValueError(f"节点集合 {set_name} 不存在")
         
-        try:
-            with open(nodes_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return []
+        return self._get_store(set_name).iter_all()
     
     def save_nodes(self, nodes, set_name=None):
         """保存节点列表到指定节点集合"""
@@ -130,46 +143,27 @@ class NodeSetManager:
         if not self.set_exists(set_name):
             raise ValueError(f"节点集合 {set_name} 不存在")
         
-        nodes_file = self.base_dir / set_name / 'nodes.json'
-        with open(nodes_file, 'w', encoding='utf-8') as f:
-            json.dump(nodes, f, ensure_ascii=False, indent=2)
+        self._get_store(set_name).replace(nodes)
+        self._cache.pop(set_name, None)
     
     def add_nodes_to_set(self, set_name, nodes):
         """添加节点到指定集合"""
         if not self.set_exists(set_name):
             raise ValueError(f"节点集合 {set_name} 不存在")
         
-        existing_nodes = self.get_nodes(set_name)
-        existing_node_ids = {node['node_id'] for node in existing_nodes}
-        
-        # 过滤掉已存在的节点
-        new_nodes = [node for node in nodes if node['node_id'] not in existing_node_ids]
-        if not new_nodes:
-            return 0
-        
-        # 为新节点分配ID
-        max_id = max((node['id'] for node in existing_nodes), default=0)
-        for i, node in enumerate(new_nodes, 1):
-            node['id'] = max_id + i
-        
-        # 合并并保存节点
-        existing_nodes.extend(new_nodes)
-        self.save_nodes(existing_nodes, set_name)
-        return len(new_nodes)
+        # 已存在的节点会被过滤，新节点从当前最大ID开始分配ID
+        added = self._get_store(set_name).add(nodes)
+        self._cache.pop(set_name, None)
+        return added
     
     def remove_nodes_from_set(self, set_name, node_ids):
         """从指定集合中移除节点"""
         if not self.set_exists(set_name):
             raise ValueError(f"节点集合 {set_name} 不存在")
         
-        nodes = self.get_nodes(set_name)
-        original_count = len(nodes)
-        nodes = [node for node in nodes if node['id'] not in node_ids]
-        
-        if len(nodes) < original_count:
-            self.save_nodes(nodes, set_name)
-            return original_count - len(nodes)
-        return 0
+        removed = self._get_store(set_name).remove(node_ids)
+        self._cache.pop(set_name, None)
+        return removed
     
     def create_set_from_nodes(self, set_name, node_ids, source_set=None):
         """从选定的节点创建新的节点集合"""
@@ -179,8 +173,7 @@ class NodeSetManager:
         if not self.set_exists(source_set):
             raise ValueError(f"源节点集合 {source_set} 不存在")
         
-        source_nodes = self.get_nodes(source_set)
-        selected_nodes = [node.copy() for node in source_nodes if node['id'] in node_ids]
+        selected_nodes = self._get_store(source_set).get_many(node_ids)
         
         if not selected_nodes:
             raise ValueError("未选择任何节点")
@@ -193,6 +186,10 @@ class NodeSetManager:
         self.create_set(set_name, selected_nodes)
         return len(selected_nodes)
     
+    def _get_store(self, set_name):
+        """获取节点集合的存储"""
+        return NodeSetStore(self.base_dir / set_name)
+    
     def _is_valid_set_name(self, name):
         """验证节点集合名称是否有效"""
         import re
@@ -204,5 +201,5 @@ class NodeSetManager:
         """获取当前激活的节点集合名称"""
         return self._active_set
 
-# 创建全局节点集合管理器实例
-node_set_manager = NodeSetManager() 
\ No newline at end of file
+# 全局节点集合管理器实例，第一次使用时才创建（创建时会访问文件系统）
+node_set_manager = SimpleLazyObject(NodeSetManager)
\ No newline at end of file
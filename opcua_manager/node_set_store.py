@@ -0,0 +1,196 @@
+import os
+import json
+import sqlite3
+import logging
+from contextlib import closing
+from .file_utils import file_lock, file_stamp
+
+logger = logging.getLogger(__name__)
+
+STORE_FILE = 'nodes.sqlite3'  # 节点集合存储文件
+LEGACY_FILE = 'nodes.json'  # 旧版JSON存储文件
+MIGRATED_SUFFIX = '.migrated'  # 迁移完成后旧文件的后缀
+SQL_CHUNK_SIZE = 500  # 单条SQL语句中的最大参数个数
+CHANGE_COUNTER_OFFSET = 24  # SQLite文件头中"文件修改计数器"的偏移量
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    id INTEGER PRIMARY KEY,
+    node_id TEXT NOT NULL UNIQUE,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('node_count', 0), ('max_id', 0);
+"""
+
+
+def _chunks(items, size=SQL_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _encode(node):
+    """节点数据紧凑编码（id单独存储）"""
+    data = {key: value for key, value in node.items() if key != 'id'}
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def _decode(node_pk, data):
+    node = {'id': node_pk}
+    node.update(json.loads(data))
+    return node
+
+
+class NodeSetStore:
+    """单个节点集合的SQLite存储
+
+    节点按id索引、node_id唯一索引，节点数和最大id缓存在meta表中，
+    增删操作只涉及变更的节点。首次打开时自动从旧版nodes.json迁移。
+    写操作使用 BEGIN IMMEDIATE 事务，多个线程或进程并发修改时按顺序执行。
+    """
+
+    def __init__(self, set_dir):
+        self.set_dir = set_dir
+        self.path = set_dir / STORE_FILE
+
+    def open(self):
+        """打开存储，首次打开时建表并从旧版JSON文件迁移"""
+        if not self.path.exists():
+            with file_lock(self.path):
+                if not self.path.exists():
+                    self._create()
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _create(self):
+        """在临时文件中建表并迁移旧数据，完成后原子替换为正式存储文件"""
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        if tmp_path.exists():
+            tmp_path.unlink()
+        with closing(sqlite3.connect(tmp_path)) as conn:
+            conn.executescript(SCHEMA)
+            legacy_file = self.set_dir / LEGACY_FILE
+            migrated = None
+            if legacy_file.exists():
+                migrated = self._migrate_legacy(conn, legacy_file)
+        os.replace(tmp_path, self.path)
+        if migrated is not None:
+            legacy_file.rename(legacy_file.with_name(legacy_file.name + MIGRATED_SUFFIX))
+            logger.info(f"Migrated {migrated} nodes from {legacy_file}")
+
+    def _migrate_legacy(self, conn, legacy_file):
+        """从旧版nodes.json迁移节点数据，返回迁移的节点数"""
+        with open(legacy_file, 'r', encoding='utf-8') as f:
+            nodes = json.load(f)
+        with conn:
+            self._insert(conn, nodes)
+            self._refresh_meta(conn)
+        return len(nodes)
+
+    def version(self):
+        """存储的版本标识（文件标识 + SQLite修改计数器），存储文件不存在时返回None"""
+        stamp = file_stamp(self.path)
+        if stamp is None:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(CHANGE_COUNTER_OFFSET)
+            return stamp + (f.read(4),)
+
+    def _insert(self, conn, nodes):
+        """插入节点，node_id重复的节点被忽略，返回实际插入数"""
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO nodes (id, node_id, data) VALUES (?, ?, ?)",
+            ((node.get('id'), node['node_id'], _encode(node)) for node in nodes)
+        )
+        return conn.total_changes - before
+
+    def _refresh_meta(self, conn):
+        """重新统计节点数和最大id"""
+        conn.execute("UPDATE meta SET value = (SELECT COUNT(*) FROM nodes) WHERE key = 'node_count'")
+        conn.execute("UPDATE meta SET value = (SELECT COALESCE(MAX(id), 0) FROM nodes) WHERE key = 'max_id'")
+
+    def _get_meta(self, conn):
+        return dict(conn.execute("SELECT key, value FROM meta"))
+
+    def count(self):
+        """节点数（读取缓存的元数据）"""
+        with closing(self.open()) as conn:
+            return self._get_meta(conn)['node_count']
+
+    def all(self):
+        """按id顺序读取所有节点"""
+        with closing(self.open()) as conn:
+            return [_decode(pk, data) for pk, data in conn.execute("SELECT id, data FROM nodes ORDER BY id")]
+
+    def iter_all(self):
+        """按id顺序逐个读取节点，不在内存中保留整个集合"""
+        with closing(self.open()) as conn:
+            for pk, data in conn.execute("SELECT id, data FROM nodes ORDER BY id"):
+                yield _decode(pk, data)
+
+    def get_many(self, node_pks):
+        """按id读取节点"""
+        node_pks = list(node_pks)
+        result = []
+        with closing(self.open()) as conn:
+            for chunk in _chunks(node_pks):
+                placeholders = ','.join('?' * len(chunk))
+                result.extend(
+                    _decode(pk, data) for pk, data in conn.execute(
+                        f"SELECT id, data FROM nodes WHERE id IN ({placeholders})", chunk)
+                )
+        return sorted(result, key=lambda node: node['id'])
+
+    def replace(self, nodes):
+        """用给定节点列表替换集合内容"""
+        with closing(self.open()) as conn:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("DELETE FROM nodes")
+                self._insert(conn, nodes)
+                self._refresh_meta(conn)
+
+    def add(self, nodes):
+        """追加节点，跳过已存在的node_id，新节点的id从当前最大id递增分配"""
+        with closing(self.open()) as conn:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                existing = set()
+                node_ids = [node['node_id'] for node in nodes]
+                for chunk in _chunks(node_ids):
+                    placeholders = ','.join('?' * len(chunk))
+                    existing.update(row[0] for row in conn.execute(
+                        f"SELECT node_id FROM nodes WHERE node_id IN ({placeholders})", chunk))
+
+                new_nodes = []
+                for node in nodes:
+                    if node['node_id'] not in existing:
+                        existing.add(node['node_id'])
+                        new_nodes.append(node)
+                if not new_nodes:
+                    return 0
+
+                meta = self._get_meta(conn)
+                for i, node in enumerate(new_nodes, 1):
+                    node['id'] = meta['max_id'] + i
+                added = self._insert(conn, new_nodes)
+                conn.execute("UPDATE meta SET value = value + ? WHERE key = 'node_count'", (added,))
+                conn.execute("UPDATE meta SET value = ? WHERE key = 'max_id'", (meta['max_id'] + len(new_nodes),))
+                return added
+
+    def remove(self, node_pks):
+        """按id删除节点，返回删除数"""
+        node_pks = list(node_pks)
+        with closing(self.open()) as conn:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                removed = 0
+                for chunk in _chunks(node_pks):
+                    placeholders = ','.join('?' * len(chunk))
+                    removed += conn.execute(f"DELETE FROM nodes WHERE id IN ({placeholders})", chunk).rowcount
+                if removed:
+                    conn.execute("UPDATE meta SET value = value - ? WHERE key = 'node_count'", (removed,))
+                return removed
@@ -0,0 +1,189 @@
+import logging
+from django.db import transaction
+from .models import OpcServer, NodeTemplate, TemplateNode, Node, NODE_CONFIG_FIELDS
+from .node_changes import apply_live_changes
+from .value_store import value_store
+from .node_set_apply import diff_nodes, APPLY_MODES, BULK_CHUNK_SIZE
+from .node_batch import bulk_insert_nodes
+from . import template_cache
+
+logger = logging.getLogger(__name__)
+
+# 判断服务器节点与模板节点是否相同时比较的字段（当前值是运行状态，不参与比较）
+COMPARE_FIELDS = tuple(field for field in NODE_CONFIG_FIELDS if field != 'value')
+
+
+def _chunks(items, size=BULK_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def create_template(name, description=None, nodes=()):
+    """创建模板，nodes为节点配置字典列表"""
+    if NodeTemplate.objects.filter(name=name).exists():
+        raise ValueError(f"模板 {name} 已存在")
+    with transaction.atomic():
+        template = NodeTemplate.objects.create(name=name, description=description)
+        seen = set()
+        template_nodes = []
+        for node_data in nodes:
+            if node_data['node_id'] in seen:
+                continue
+            seen.add(node_data['node_id'])
+            fields = {key: node_data[key] for key in NODE_CONFIG_FIELDS if key in node_data}
+            template_nodes.append(TemplateNode(template=template, **fields))
+        for chunk in _chunks(template_nodes):
+            TemplateNode.objects.bulk_create(chunk)
+    logger.info(f"Created node template {name} with {len(template_nodes)} nodes")
+    return template
+
+
+def delete_template(template):
+    if template.servers.exists():
+        raise ValueError(f"模板 {template.name} 正在被服务器使用")
+    template_id = template.id
+    template.delete()
+    template_cache.invalidate(template_id)
+
+
+def update_template_nodes(template, set_nodes, mode='merge'):
+    """按节点配置列表更新模板节点（模式同节点集合应用）
+
+    直接修改模板缓存中的模板节点对象，运行中的服务器同步更新各自的运行时记录和地址空间，
+    被服务器自身节点覆盖的模板节点不受影响。
+    """
+    if mode not in APPLY_MODES:
+        raise ValueError(f"不支持的应用模式: {mode}")
+
+    shared_nodes = template_cache.get_template_nodes(template.id)
+    created, updated, deleted, unchanged = diff_nodes(shared_nodes, set_nodes)
+    if mode != 'replace':
+        deleted = []
+    result = {
+        'mode': mode,
+        'created': len(created),
+        'updated': len(updated),
+        'deleted': len(deleted),
+        'unchanged': unchanged,
+    }
+    if mode == 'diff':
+        return result
+
+    new_nodes = [TemplateNode(template=template, **fields) for fields in created]
+    update_fields = set()
+    try:
+        with transaction.atomic():
+            for node, changes in updated:
+                for key, value in changes.items():
+                    setattr(node, key, value)
+                update_fields.update(changes)
+            for chunk in _chunks(new_nodes):
+                TemplateNode.objects.bulk_create(chunk)
+            if updated:
+                for chunk in _chunks([node for node, _ in updated]):
+                    TemplateNode.objects.bulk_update(chunk, sorted(update_fields))
+            for chunk in _chunks([node.id for node in deleted]):
+                TemplateNode.objects.filter(id__in=chunk).delete()
+            template.save(update_fields=['updated_at'])
+    except Exception:
+        # 缓存中的模板节点对象可能已被修改，丢弃缓存以便重新加载
+        template_cache.invalidate(template.id)
+        raise
+
+    deleted_ids = {node.id for node in deleted}
+    template_cache.set_template_nodes(
+        template.id, template.updated_at,
+        [node for node in shared_nodes if node.id not in deleted_ids] + new_nodes,
+        changed=deleted_ids.union(node.id for node, _ in updated)
+    )
+
+    # 运行中的服务器同步更新，被服务器自身节点覆盖的模板节点由服务器实例跳过；
+    # 未运行的服务器删除已删除模板节点保存的值
+    hot_applied = 0
+    removed = [node.runtime_key for node in deleted]
+    for server_id, is_running in OpcServer.objects.filter(template=template).values_list('id', 'is_running'):
+        if is_running:
+            hot_applied += apply_live_changes(
+                server_id,
+                added=new_nodes,
+                updated=[(node, set(changes)) for node, changes in updated],
+                removed=removed
+            )
+        elif removed:
+            value_store.delete_nodes(server_id, removed)
+    result['hot_applied'] = hot_applied
+
+    logger.info(f"Updated node template {template.name}: {result}")
+    return result
+
+
+def attach_template(server, template, prune=True):
+    """为服务器设置模板
+
+    prune为True时删除服务器中与模板节点完全相同的节点，只保留覆盖模板的节点。
+    服务器运行中时不能修改模板。
+    """
+    if server.is_running:
+        raise ValueError("请先停止服务器")
+    template_nodes = {node.node_id: node for node in template_cache.get_template_nodes(template.id)}
+
+    pruned = []
+    if prune:
+        for node in Node.objects.filter(server=server, node_id__in=list(template_nodes)).iterator(chunk_size=2000):
+            template_node = template_nodes[node.node_id]
+            if all(getattr(node, field) == getattr(template_node, field) for field in COMPARE_FIELDS):
+                pruned.append(node.id)
+
+    with transaction.atomic():
+        for chunk in _chunks(pruned):
+            Node.objects.filter(id__in=chunk).delete()
+        server.template = template
+        server.save(update_fields=['template', 'updated_at'])
+    value_store.delete_nodes(server.id, pruned)
+
+    logger.info(f"Attached template {template.name} to server {server.name}, pruned {len(pruned)} nodes")
+    return {
+        'template': template.name,
+        'pruned': len(pruned),
+        'overrides': Node.objects.filter(server=server, node_id__in=list(template_nodes)).count(),
+    }
+
+
+def detach_template(server, materialize=True):
+    """取消服务器的模板
+
+    materialize为True时把未被覆盖的模板节点复制为服务器自己的节点，服务器的节点保持不变。
+    """
+    if server.is_running:
+        raise ValueError("请先停止服务器")
+    if server.template_id is None:
+        return {'materialized': 0}
+
+    materialized = 0
+    template_nodes = template_cache.get_template_nodes(server.template_id)
+    with transaction.atomic():
+        if materialize:
+            own_node_ids = set(Node.objects.filter(server=server).values_list('node_id', flat=True))
+            materialized = bulk_insert_nodes(
+                (server.id, {field: getattr(node, field) for field in NODE_CONFIG_FIELDS})
+                for node in template_nodes
+                if node.node_id not in own_node_ids
+            )
+        server.template = None
+        server.save(update_fields=['template', 'updated_at'])
+    # 模板节点保存的值按模板节点键保存，取消模板后不再使用
+    value_store.delete_nodes(server.id, [node.runtime_key for node in template_nodes])
+    return {'materialized': materialized}
+
+
+def iter_effective_nodes(server):
+    """逐个产出服务器实际生效的节点配置字典：自身节点，以及未被覆盖的模板节点"""
+    own_node_ids = set()
+    nodes = Node.objects.filter(server=server).order_by('id').values(*NODE_CONFIG_FIELDS)
+    for node in nodes.iterator(chunk_size=2000):
+        own_node_ids.add(node['node_id'])
+        yield node
+    if server.template_id:
+        for template_node in template_cache.get_template_nodes(server.template_id):
+            if template_node.node_id not in own_node_ids:
+                yield {field: getattr(template_node, field) for field in NODE_CONFIG_FIELDS}
@@ -0,0 +1,214 @@
+import re
+import logging
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape, quoteattr
+from django.db import transaction
+from .models import Node
+
+logger = logging.getLogger(__name__)
+
+UA_NS = 'http://opcfoundation.org/UA/2011/03/UANodeSet.xsd'
+UA_TYPES_NS = 'http://opcfoundation.org/UA/2008/02/Types.xsd'
+IMPORT_CHUNK_SIZE = 1000  # 导入时每批写入的节点数
+EXPORT_CHUNK_SIZE = 500  # 导出时每次输出的节点数
+
+# NodeSet2数据类型 -> 节点数据类型
+DATA_TYPES = {
+    'Boolean': 'boolean',
+    'SByte': 'int32', 'Byte': 'uint32', 'Int16': 'int32', 'UInt16': 'uint32',
+    'Int32': 'int32', 'UInt32': 'uint32', 'Int64': 'int64', 'UInt64': 'uint64',
+    'Float': 'float', 'Double': 'double',
+    'String': 'string', 'LocalizedText': 'string', 'DateTime': 'datetime',
+}
+
+# 标准数据类型别名 -> NodeId
+STANDARD_ALIASES = {
+    'Boolean': 'i=1', 'SByte': 'i=2', 'Byte': 'i=3', 'Int16': 'i=4', 'UInt16': 'i=5',
+    'Int32': 'i=6', 'UInt32': 'i=7', 'Int64': 'i=8', 'UInt64': 'i=9', 'Float': 'i=10',
+    'Double': 'i=11', 'String': 'i=12', 'DateTime': 'i=13', 'LocalizedText': 'i=21',
+    'Organizes': 'i=35', 'HasTypeDefinition': 'i=40',
+}
+_ALIAS_BY_NODE_ID = {node_id: alias for alias, node_id in STANDARD_ALIASES.items()}
+
+# 节点数据类型 -> 导出时使用的NodeSet2数据类型
+EXPORT_DATA_TYPES = {
+    'boolean': 'Boolean', 'int32': 'Int32', 'int64': 'Int64', 'uint32': 'UInt32',
+    'uint64': 'UInt64', 'float': 'Float', 'double': 'Double', 'string': 'String',
+    'datetime': 'DateTime',
+}
+
+OBJECTS_FOLDER = 'i=85'
+BASE_DATA_VARIABLE_TYPE = 'i=63'
+BASE_OBJECT_TYPE = 'i=58'
+
+_NODE_ID_PATTERN = re.compile(r'^(ns=\d+;)?[isgb]=')
+EXPORT_STRING_PREFIX = 'ns=1;s='  # 导出时非标准格式的节点ID使用的前缀（文件中的第一个命名空间）
+
+
+def _tag(name):
+    return f'{{{UA_NS}}}{name}'
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _strip_namespace_index(browse_name):
+    """去掉BrowseName的命名空间前缀（如 "1:Temperature"）"""
+    prefix, sep, name = browse_name.partition(':')
+    return name if sep and prefix.isdigit() else browse_name
+
+
+def _import_node_id(node_id):
+    """导入时使用的节点ID，去掉导出时添加的前缀，导出后再导入的节点ID保持不变"""
+    if node_id.startswith(EXPORT_STRING_PREFIX):
+        name = node_id[len(EXPORT_STRING_PREFIX):]
+        if name and not _NODE_ID_PATTERN.match(name):
+            return name
+    return node_id
+
+
+def _parse_node(elem, aliases):
+    """将UAVariable/UAObject元素转换为节点配置字典"""
+    node_type = 'variable' if _local_name(elem.tag) == 'UAVariable' else 'object'
+    browse_name = _strip_namespace_index(elem.get('BrowseName', ''))
+    display_name = elem.findtext(_tag('DisplayName'))
+    description = elem.findtext(_tag('Description'))
+
+    node = {
+        'node_id': _import_node_id(elem.get('NodeId')),
+        'name': (display_name or browse_name)[:100],
+        'node_type': node_type,
+        'data_type': 'string',
+        'description': description or None,
+    }
+
+    if node_type == 'variable':
+        data_type = elem.get('DataType', 'BaseDataType')
+        data_type = _ALIAS_BY_NODE_ID.get(aliases.get(data_type, data_type), data_type)
+        node['data_type'] = DATA_TYPES.get(data_type, 'string')
+
+        value_elem = elem.find(_tag('Value'))
+        if value_elem is not None and len(value_elem):
+            scalar = value_elem[0]
+            if not _local_name(scalar.tag).startswith('ListOf'):
+                text = scalar.findtext(f'{{{UA_TYPES_NS}}}Text') if len(scalar) else scalar.text
+                if text is not None:
+                    node['value'] = text.strip()[:200]
+    return node
+
+
+def iter_nodeset2(source):
+    """以增量方式解析NodeSet2 XML，逐个产出节点配置字典
+
+    解析完的元素会立即释放，内存占用与文件大小无关。
+    """
+    from lxml import etree  # 只在导入NodeSet2时才需要
+
+    aliases = {}
+    context = etree.iterparse(
+        source, events=('end',),
+        tag=(_tag('Alias'), _tag('UAVariable'), _tag('UAObject')),
+        huge_tree=True, resolve_entities=False, no_network=True
+    )
+    for _, elem in context:
+        if _local_name(elem.tag) == 'Alias':
+            aliases[elem.get('Alias')] = (elem.text or '').strip()
+        elif elem.get('NodeId'):
+            yield _parse_node(elem, aliases)
+
+        # 释放已处理的元素及其之前的兄弟节点
+        elem.clear()
+        parent = elem.getparent()
+        if parent is not None:
+            while elem.getprevious() is not None:
+                del parent[0]
+
+
+def iter_chunks(nodes, size=IMPORT_CHUNK_SIZE):
+    """将节点迭代器按固定大小分批"""
+    chunk = []
+    for node in nodes:
+        chunk.append(node)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_nodes_to_server(server, nodes, on_chunk=None):
+    """将节点配置分批写入服务器，node_id已存在的节点被跳过
+
+    每批在独立事务中批量写入，服务器运行中时同步添加到地址空间。
+    on_chunk(created_nodes) 在每批写入后调用。
+    """
+    created = skipped = 0
+    for chunk in iter_chunks(nodes):
+        node_ids = [fields['node_id'] for fields in chunk]
+        existing = set(Node.objects.filter(server=server, node_id__in=node_ids).values_list('node_id', flat=True))
+        new_nodes = []
+        for fields in chunk:
+            if fields['node_id'] in existing:
+                skipped += 1
+                continue
+            existing.add(fields['node_id'])
+            new_nodes.append(Node(server=server, **fields))
+        with transaction.atomic():
+            Node.objects.bulk_create(new_nodes)
+        created += len(new_nodes)
+        if on_chunk is not None and new_nodes:
+            on_chunk(new_nodes)
+    logger.info(f"Imported NodeSet2 nodes to server {server.name}: created={created}, skipped={skipped}")
+    return {'created': created, 'skipped': skipped}
+
+
+def _export_node_id(node_id):
+    """导出时使用的NodeId，非标准格式的节点ID转为字符串标识符"""
+    if _NODE_ID_PATTERN.match(node_id):
+        return node_id
+    return f'{EXPORT_STRING_PREFIX}{node_id}'
+
+
+def _render_node(node):
+    node_type = node.get('node_type')
+    node_id = quoteattr(_export_node_id(node['node_id']))
+    browse_name = quoteattr(f"1:{node.get('name') or node['node_id']}")
+    lines = []
+    if node_type == 'object':
+        lines.append(f'  <UAObject NodeId={node_id} BrowseName={browse_name} ParentNodeId="{OBJECTS_FOLDER}">')
+        type_definition = BASE_OBJECT_TYPE
+    else:
+        data_type = EXPORT_DATA_TYPES.get(node.get('data_type'), 'String')
+        lines.append(f'  <UAVariable NodeId={node_id} BrowseName={browse_name} '
+                     f'ParentNodeId="{OBJECTS_FOLDER}" DataType="{data_type}" AccessLevel="3" UserAccessLevel="3">')
+        type_definition = BASE_DATA_VARIABLE_TYPE
+    lines.append(f"    <DisplayName>{escape(node.get('name') or node['node_id'])}</DisplayName>")
+    if node.get('description'):
+        lines.append(f"    <Description>{escape(node['description'])}</Description>")
+    lines.append('    <References>')
+    lines.append(f'      <Reference ReferenceType="HasTypeDefinition">{type_definition}</Reference>')
+    lines.append(f'      <Reference ReferenceType="Organizes" IsForward="false">{OBJECTS_FOLDER}</Reference>')
+    lines.append('    </References>')
+    if node_type == 'object':
+        lines.append('  </UAObject>')
+    else:
+        value = node.get('value')
+        if value not in (None, ''):
+            lines.append(f'    <Value><uax:{data_type}>{escape(str(value))}</uax:{data_type}></Value>')
+        lines.append('  </UAVariable>')
+    return '\n'.join(lines) + '\n'
+
+
+def export_nodeset2(nodes, namespace_uri):
+    """以流式方式生成NodeSet2 XML文本片段，nodes为节点配置字典的迭代器"""
+    last_modified = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    yield ('<?xml version="1.0" encoding="utf-8"?>\n'
+           f'<UANodeSet xmlns="{UA_NS}" xmlns:uax="{UA_TYPES_NS}" LastModified="{last_modified}">\n'
+           f'  <NamespaceUris>\n    <Uri>{escape(namespace_uri)}</Uri>\n  </NamespaceUris>\n'
+           '  <Aliases>\n')
+    yield ''.join(f'    <Alias Alias="{alias}">{node_id}</Alias>\n' for alias, node_id in STANDARD_ALIASES.items())
+    yield '  </Aliases>\n'
+    for chunk in iter_chunks(nodes, EXPORT_CHUNK_SIZE):
+        yield ''.join(_render_node(node) for node in chunk)
+    yield '</UANodeSet>\n'
@@ -1,103 +1,379 @@
 from opcua import Server, ua
+from opcua.server.internal_server import InternalSession
 import threading
+import weakref
+import heapq
+import itertools
+from collections import deque
 import time
 import random
 import math
-from datetime import datetime
+import numpy as np
+from datetime import datetime, timedelta
 import logging
 from django.conf import settings
 from django.db.models import Min
 from .models import Node, OpcServer
-import json
+from .metrics import ServerMetrics
+from .profiler import profile_thread
+from .overload import OverloadController, next_due
+from .template_cache import get_template_nodes, get_template_params
+from .snapshot import load_snapshot, save_snapshot
+from .scenario import ScenarioRun, Ramp, Targets, parse_scenario, match_selector
+from .faults import parse_fault_config, STATUS_BAD, STATUS_UNCERTAIN, PHASE_STEP
+from .generator_bank import GeneratorBank
+from .deadband_bank import DeadbandBank
+from . import server_registry
+from .value_store import value_store, STATUS_GOOD
+from .node_runtime import (
+    NodeParams, NodeRecord, share_constant_attributes, lookup_names, WRITE_HOLD, WRITE_OVERRIDE,
+    VARIATION_NONE, VARIATION_RANDOM, VARIATION_INCREMENT, VARIATION_DECREMENT, VARIATION_SINE,
+    VARIATION_SQUARE, VARIATION_TRIANGLE, VARIATION_SAWTOOTH, VARIATION_DISCRETE, VARIATION_COMPOSITE,
+)
 
 logger = logging.getLogger(__name__)
 
+# 修改后需要重建地址空间节点的字段
+STRUCTURAL_FIELDS = {'name', 'node_type', 'data_type'}
+
+# 所有服务器共享的常量属性值，见 share_constant_attributes
+_shared_attribute_values = {}
+
+VALUE_ATTRIBUTE = ua.AttributeIds.Value
+UNIX_EPOCH = datetime(1970, 1, 1)  # 地址空间中的时间戳为不带时区的UTC时间
+
+# 状态码 -> StatusCode对象，地址空间只替换不修改状态码对象，同一状态码共用一个对象
+_status_codes = {}
+
+
+def _status_code(code):
+    status = _status_codes.get(code)
+    if status is None:
+        status = _status_codes[code] = ua.StatusCode(code)
+    return status
+
+
+def _install_fast_parent_reference(iserver):
+    """新建节点时跳过父节点引用的唯一性检查
+
+    opcua在添加节点时会逐条比对父节点已有的全部引用，同一文件夹下添加N个节点的
+    总耗时为O(N²)。新建节点的NodeId在添加前已确认不存在，父节点中不可能已有指向它的
+    引用，因此可以直接追加。
+    """
+    def add_ref_from_parent(nodedata, item, parentdata):
+        desc = ua.ReferenceDescription()
+        desc.ReferenceTypeId = item.ReferenceTypeId
+        desc.NodeId = nodedata.nodeid
+        desc.NodeClass = item.NodeClass
+        desc.BrowseName = item.BrowseName
+        desc.DisplayName = item.NodeAttributes.DisplayName
+        desc.TypeDefinition = item.TypeDefinition
+        desc.IsForward = True
+        parentdata.references.append(desc)
+
+    iserver.node_mgt_service._add_ref_from_parent = add_ref_from_parent
+
+
+class TrackedSession(InternalSession):
+    """记录客户端会话的内部会话类
+
+    客户端对节点值的写入成功后，把 (NodeId, DataValue) 追加到服务器的写入队列，
+    由更新线程在下一个周期开始时统一处理。
+    """
+
+    def __init__(self, internal_server, *args, **kwargs):
+        super().__init__(internal_server, *args, **kwargs)
+        sessions = getattr(internal_server, 'client_sessions', None)
+        if sessions is not None:
+            sessions.add(self)
+
+    def close_session(self, delete_subs=True):
+        sessions = getattr(self.iserver, 'client_sessions', None)
+        if sessions is not None:
+            sessions.discard(self)
+        return super().close_session(delete_subs)
+
+    def write(self, params):
+        results = super().write(params)
+        queue = getattr(self.iserver, 'client_writes', None)
+        if queue is not None:
+            for writevalue, result in zip(params.NodesToWrite, results):
+                if writevalue.AttributeId == VALUE_ATTRIBUTE and result.is_good():
+                    queue.append((writevalue.NodeId, writevalue.Value))  # deque.append是原子操作，无需加锁
+        return results
+
+
+def _coerce_value(value, varianttype):
+    """把外部传入的值（JSON或字符串）转换为节点数据类型对应的Python值"""
+    if varianttype in (ua.VariantType.Double, ua.VariantType.Float):
+        return float(value)
+    if varianttype in (ua.VariantType.Int16, ua.VariantType.Int32, ua.VariantType.Int64,
+                       ua.VariantType.UInt16, ua.VariantType.UInt32, ua.VariantType.UInt64,
+                       ua.VariantType.Byte, ua.VariantType.SByte):
+        if isinstance(value, float) and not value.is_integer():
+            raise ValueError(f"{value} 不是整数")
+        return int(value)
+    if varianttype == ua.VariantType.Boolean:
+        if isinstance(value, str):
+            return value.lower() in ('true', '1', 'yes', 'on')
+        return bool(value)
+    if varianttype == ua.VariantType.DateTime:
+        return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    if varianttype == ua.VariantType.String:
+        return str(value)
+    return value
+
+
+def _typed_value(value, params):
+    """按节点的变体类型转换保存的值或配置的初始值，数值可能不是整数或超出整数类型的范围"""
+    if params.convert is not None and isinstance(value, (int, float)):
+        return params.convert(value)
+    return value
+
+
+def _is_number(value):
+    """值能否转换为浮点数"""
+    try:
+        float(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
 class OpcUaServer:
-    _instances = {}  # 存储所有服务器实例
-    _lock = threading.Lock()  # 线程锁
+    MIN_TICK_INTERVAL = 0.01  # 最短更新周期(秒)
 
     @classmethod
     def get_instance(cls, server_id):
         """获取服务器实例"""
-        return cls._instances.get(server_id)
+        return server_registry.get_instance(server_id)
+
+    @classmethod
+    def get_instances(cls):
+        """获取所有服务器实例"""
+        return server_registry.get_instances()
 
     @classmethod
     def create_instance(cls, server_config):
         """创建新的服务器实例"""
-        with cls._lock:
-            if server_config.id in cls._instances:
-                return cls._instances[server_config.id]
-            
-            instance = cls(server_config)
-            cls._instances[server_config.id] = instance
+        instance = server_registry.get_instance(server_config.id)
+        if instance is not None:
             return instance
 
+        # 构造实例（加载标准地址空间）较慢，不持有注册表锁，多个服务器可以同时创建
+        return server_registry.register(server_config.id, cls(server_config))
+
     @classmethod
     def remove_instance(cls, server_id):
         """移除服务器实例"""
-        with cls._lock:
-            if server_id in cls._instances:
-                instance = cls._instances[server_id]
-                instance.stop()
-                del cls._instances[server_id]
+        instance = server_registry.unregister(server_id)
+        if instance is not None:
+            instance.stop()
 
     def __init__(self, server_config):
         """初始化OPC UA服务器"""
         self.config = server_config
         self.server = Server()
         self.running = False
-        self.nodes = {}  # 存储节点对象
+        self.nodes = {}  # 节点键 -> NodeRecord
+        self.nodes_lock = threading.RLock()  # 保护nodes，更新线程每个周期持有
         self.update_thread = None
         self.stop_event = threading.Event()
+        self.metrics = ServerMetrics()
+        self._dirty_nodes = []  # 待写入运行时值存储的节点记录
+        self._due_nodes = []  # 本周期待更新的节点
+        self._client_writes = deque()  # 客户端写入队列，会话线程追加，更新线程取出
+        self._nodeid_index = None  # NodeId -> NodeRecord，处理客户端写入时按需建立
+        self.scenarios = {}  # 场景id -> ScenarioRun，由更新线程推进
+        self._generated = []  # 本周期到期的组合信号节点，由GeneratorBank批量计算
+        self._generators = None  # GeneratorBank，节点变化后按需重建
+        self._generators_stale = True
+        self._deadbands = None  # DeadbandBank，节点变化后按需重建
+        self._deadbands_stale = True
+        self._banded = []  # 本周期计算了新值、配置了死区的 (节点记录, 新值)
+        self._faulty = []  # 本周期更新的、配置了故障注入的 (节点记录, 新值)
+        self._delayed = []  # 延迟发布的值：(发布时刻, 序号, NodeId, DataValue) 的最小堆
+        self._delay_seq = itertools.count()
+        self._rng = np.random.default_rng()  # 故障注入的随机数
+        try:
+            self.fault_defaults = parse_fault_config(server_config.fault_config)
+        except ValueError as e:
+            logger.error(f"Invalid fault config of server {server_config.name}: {e}")
+            self.fault_defaults = {}
+        # 更新周期取服务器的最小采样间隔
+        self.tick_interval = max((server_config.min_sampling_interval or 100) / 1000, self.MIN_TICK_INTERVAL)
+        self.overload = OverloadController(server_config.overload_policy, self.tick_interval)
+        self._profile_lock = threading.Lock()  # 同一时间只允许一个采样任务
+
+        # 记录客户端会话
+        self.server.iserver.client_sessions = weakref.WeakSet()
+        self.server.iserver.client_writes = self._client_writes
+        self.server.iserver.session_cls = TrackedSession
+        _install_fast_parent_reference(self.server.iserver)
 
         # 配置服务器
         endpoint = f"opc.tcp://{server_config.endpoint}:{server_config.port}"
         self.server.set_endpoint(endpoint)
         self.server.set_server_name(server_config.name)
-        self.server.set_security_policy([])  # 暂时不设置安全策略
+        self.server.set_security_policy([ua.SecurityPolicyType.NoSecurity])  # 暂时不设置安全策略
 
         # 设置服务器URI
         uri = server_config.uri
-        idx = self.server.register_namespace(uri)
+        self.idx = self.server.register_namespace(uri)
 
         # 创建根节点
-        self.root = self.server.nodes.objects.add_folder(idx, server_config.name)
+        self.root = self.server.nodes.objects.add_folder(self.idx, server_config.name)
 
-    def add_node(self, node_config):
-        """添加节点"""
+    def add_node(self, node_config, stored=None):
+        """添加节点
+
+        地址空间中创建节点后只保留紧凑的运行时记录，不再引用节点配置对象。
+        stored为运行时值存储中保存的 (值, 源时间戳, 状态码)，有则以其代替配置的初始值。
+        """
         try:
-            idx = self.server.get_namespace_index(self.config.uri)
-            
+            params = self._node_params(node_config)
             if node_config.node_type == 'variable':
-                node = self.root.add_variable(idx, node_config.name, self._get_initial_value(node_config))
+                if stored is None:
+                    value, status = _typed_value(self._get_initial_value(node_config), params), STATUS_GOOD
+                    node = self.root.add_variable(self.idx, node_config.name, value, params.varianttype)
+                else:
+                    value, status = _typed_value(stored[0], params), stored[2]
+                    node = self.root.add_variable(self.idx, node_config.name, value, params.varianttype)
+                    self._write_value(node.nodeid, value, datetime.utcfromtimestamp(stored[1]), params.varianttype,
+                                      status)
                 node.set_writable()
             elif node_config.node_type == 'object':
-                node = self.root.add_object(idx, node_config.name)
+                node = self.root.add_object(self.idx, node_config.name)
             else:
                 logger.error(f"Unsupported node type: {node_config.node_type}")
                 return None
 
-            self.nodes[node_config.id] = {
-                'node': node,
-                'config': node_config
-            }
+            nodedata = self.server.iserver.aspace._nodes.get(node.nodeid)
+            if nodedata is not None:
+                share_constant_attributes(nodedata, _shared_attribute_values)
+            if node_config.node_type == 'variable':
+                # 按数据类型转换后的值，而不是配置中的文本
+                record = NodeRecord(params, node.nodeid, value, status)
+            else:
+                record = NodeRecord(params, node.nodeid, node_config.value)
+            with self.nodes_lock:
+                self.nodes[record.key] = record
+                self._nodeid_index = None
+                self._generators_stale = True
+                self._deadbands_stale = True
             return node
 
         except Exception as e:
             logger.error(f"Error adding node: {e}")
             return None
 
+    def _node_params(self, node_config):
+        """节点的运行参数，模板节点使用与其他服务器共享的参数对象"""
+        if isinstance(node_config, Node):
+            return NodeParams(node_config, self.fault_defaults)
+        return get_template_params(node_config, self.fault_defaults)
+
     def remove_node(self, node_id):
         """移除节点"""
-        if node_id in self.nodes:
+        return self.remove_nodes([node_id]) > 0
+
+    def remove_nodes(self, node_ids):
+        """批量移除节点，返回移除数"""
+        with self.nodes_lock:
+            records = [self.nodes.pop(node_id) for node_id in node_ids if node_id in self.nodes]
+            if not records:
+                return 0
+            self._nodeid_index = None
+            self._generators_stale = True
+            self._deadbands_stale = True
             try:
-                node_info = self.nodes[node_id]
-                node_info['node'].delete()
-                del self.nodes[node_id]
-                return True
+                self._delete_address_space_nodes({record.nodeid for record in records})
             except Exception as e:
                 logger.error(f"Error removing node: {e}")
-        return False
+            return len(records)
+
+    def _delete_address_space_nodes(self, nodeids):
+        """从地址空间删除节点
+
+        opcua的Node.delete()每删除一个节点都要扫描整个地址空间的引用，
+        这里把所有待删除节点合并为一次扫描。
+        """
+        iserver = self.server.iserver
+        aspace = iserver.aspace
+        with aspace._lock:
+            for nodedata in aspace._nodes.values():
+                references = nodedata.references
+                if any(ref.NodeId in nodeids for ref in references):
+                    nodedata.references = [ref for ref in references if ref.NodeId not in nodeids]
+            for nodeid in nodeids:
+                nodedata = aspace._nodes.get(nodeid)
+                if nodedata is not None:
+                    iserver.node_mgt_service._delete_node_callbacks(nodedata)
+                    del aspace._nodes[nodeid]
+
+    def apply_node_changes(self, added=(), updated=(), removed=()):
+        """批量更新地址空间中的节点
+
+        added: 新节点配置列表；updated: [(节点配置, 变更字段集合)]；removed: 节点键列表
+        （Node为id，模板节点为负的TemplateNode id）
+        修改前先处理队列中已有的客户端写入，修改之前的写入不会在之后覆盖修改的值。
+        被服务器自身节点覆盖的模板节点不受影响，新增的服务器节点替换node_id相同的模板节点。
+        """
+        added, updated, removed = list(added), list(updated), list(removed)
+        value_rows = []  # 客户端写入的值和配置中修改了值的节点，同步写入运行时值存储
+        with self.nodes_lock:
+            if self.config.template_id:
+                added, updated, overriding = self._resolve_overrides(added, updated)
+                removed.extend(overriding)
+            if self._client_writes:
+                written = []
+                now = time.time()
+                self._apply_client_writes(now, written)
+                value_rows.extend((record.key, record.value, now, record.status) for record in written)
+            rebuilt = []
+            for node_config, changed in updated:
+                record = self.nodes.get(node_config.runtime_key)
+                if record is None or changed & STRUCTURAL_FIELDS:
+                    rebuilt.append(node_config)
+                    continue
+                record.params = self._node_params(node_config)
+                record.next_due = 0.0  # 解除客户端写入造成的暂停
+                self._generators_stale = True
+                self._deadbands_stale = True
+                if 'value' in changed and node_config.node_type == 'variable':
+                    record.value = _typed_value(self._get_initial_value(node_config), record.params)
+                    record.status = STATUS_GOOD
+                    self._write_value(record.nodeid, record.value, datetime.utcnow(), record.params.varianttype)
+                    self._reset_deadbands([record])
+                    value_rows.append((record.key, record.value, time.time(), STATUS_GOOD))
+
+            # 重建的节点按新配置取初始值，不沿用已保存的值
+            removed_keys = removed + [node_config.runtime_key for node_config in rebuilt]
+            self.remove_nodes(removed_keys)
+            for node_config in list(added) + rebuilt:
+                self.add_node(node_config)
+
+        if removed_keys:
+            value_store.delete_nodes(self.config.id, removed_keys)
+            removed_keys = set(removed_keys)
+            value_rows = [row for row in value_rows if row[0] not in removed_keys]
+        value_store.write(self.config.id, value_rows)
+
+    def _resolve_overrides(self, added, updated):
+        """按服务器自身节点覆盖模板节点的规则过滤修改，需持有nodes_lock
+
+        返回过滤后的 (added, updated) 和被新增的服务器节点覆盖、需要移除的模板节点键。
+        """
+        own = {record.params.node_id for record in self.nodes.values() if record.params.persist}
+        own.update(node_config.node_id for node_config in added if isinstance(node_config, Node))
+        added = [node_config for node_config in added
+                 if isinstance(node_config, Node) or node_config.node_id not in own]
+        updated = [(node_config, changed) for node_config, changed in updated
+                   if isinstance(node_config, Node) or node_config.node_id not in own]
+        overriding = {node_config.node_id for node_config in added if isinstance(node_config, Node)}
+        overridden = [key for key, record in self.nodes.items()
+                      if not record.params.persist and record.params.node_id in overriding]
+        return added, updated, overridden
 
     def start(self):
         """启动服务器"""
@@ -108,9 +384,12 @@ class OpcUaServer:
                 self.running = True
                 self.stop_event.clear()
                 
-                # 加载所有节点
-                for node in self.config.nodes.all():
-                    self.add_node(node)
+                # 优先从上次停止时保存的快照恢复节点和运行状态
+                if load_snapshot(self, _shared_attribute_values) is None:
+                    self._load_nodes()
+                self._nodeid_index = None
+                self._generators_stale = True
+                self._deadbands_stale = True
                 
                 # 启动更新线程
                 self.update_thread = threading.Thread(target=self._update_values)
@@ -125,8 +404,24 @@ class OpcUaServer:
                 return False
         return True
 
+    def _load_nodes(self):
+        """从数据库加载所有节点：服务器自己的节点，以及未被覆盖的模板节点
+
+        逐批读取模型实例，转换为运行时记录后即释放。节点值优先取运行时值存储中
+        上次运行保存的值。
+        """
+        stored = value_store.read_server(self.config.id)
+        own_node_ids = set()
+        for node in self.config.nodes.all().iterator(chunk_size=2000):
+            own_node_ids.add(node.node_id)
+            self.add_node(node, stored.get(node.id))
+        if self.config.template_id:
+            for template_node in get_template_nodes(self.config.template_id):
+                if template_node.node_id not in own_node_ids:
+                    self.add_node(template_node, stored.get(template_node.runtime_key))
+
     def stop(self):
-        """停止服务器"""
+        """停止服务器，保存快照供下次启动时快速恢复"""
         if self.running:
             try:
                 self.stop_event.set()
@@ -135,88 +430,591 @@ class OpcUaServer:
                 self.server.stop()
                 self.running = False
                 logger.info(f"Server {self.config.name} stopped")
+                try:
+                    save_snapshot(self)
+                except Exception as e:
+                    logger.error(f"Error saving snapshot of server {self.config.name}: {e}")
                 return True
             except Exception as e:
                 logger.error(f"Error stopping server: {e}")
                 return False
         return True
 
+    def get_session_count(self):
+        """获取当前客户端会话数"""
+        return len(self.server.iserver.client_sessions)
+
+    def get_monitored_item_count(self):
+        """获取当前监视项数"""
+        subscriptions = list(self.server.iserver.subscription_service.subscriptions.values())
+        return sum(len(sub.monitored_item_srv._monitored_items) for sub in subscriptions)
+
+    def profile(self, duration, interval=None):
+        """对更新线程进行采样分析，返回折叠栈格式的结果"""
+        if not self.running:
+            raise ValueError("服务器未运行")
+        if not self._profile_lock.acquire(blocking=False):
+            raise ValueError("已有采样任务正在进行")
+        try:
+            kwargs = {'stop_event': self.stop_event}
+            if interval is not None:
+                kwargs['interval'] = interval
+            sampler = profile_thread(self.update_thread, duration, **kwargs)
+            return sampler.collapsed()
+        finally:
+            self._profile_lock.release()
+
+    def read_values(self, keys=None):
+        """从地址空间读取节点的当前值，不访问数据库
+
+        返回 (节点键, 值, 源时间戳(Unix秒), 状态码) 四个等长列表和不存在的节点键列表。
+        keys为None时返回全部变量节点。
+        """
+        nodes = self.server.iserver.aspace._nodes
+        # 不获取nodes_lock，读取不必等待正在进行的更新周期：节点表的get和copy在GIL下是原子操作，
+        # 地址空间中的DataValue只整体替换、不修改，读到的值、时间戳和状态码属于同一次写入
+        records = self.nodes
+        if keys is None:
+            records = records.copy().items()
+            report_missing = False
+        else:
+            records = [(key, records.get(key)) for key in keys]
+            report_missing = True
+        ids, values, timestamps, status, missing = [], [], [], [], []
+        for key, record in records:
+            nodedata = nodes.get(record.nodeid) if record is not None else None
+            attval = nodedata.attributes.get(VALUE_ATTRIBUTE) if nodedata is not None else None
+            if attval is None:
+                if report_missing:
+                    missing.append(key)
+                continue
+            datavalue = attval.value
+            ids.append(key)
+            values.append(datavalue.Value.Value)
+            source_timestamp = datavalue.SourceTimestamp
+            timestamps.append((source_timestamp - UNIX_EPOCH).total_seconds() if source_timestamp else None)
+            status.append(datavalue.StatusCode.value)
+        return ids, values, timestamps, status, missing
+
+    def write_values(self, values, hold=None, persist=True):
+        """把 {节点键: 值} 作为一个批次写入地址空间，所有节点使用同一个源时间戳
+
+        值按节点当前的数据类型转换。批次在持有nodes_lock时写入，不会与更新周期交错。
+        hold为秒数时，写入的节点在这段时间内暂停自动变化（波形按时间计算，恢复后回到原来的相位）。
+        persist为True时写入的值在一个事务中保存到运行时值存储。返回 (写入的节点键列表, {节点键: 错误})。
+        """
+        now = time.time()
+        timestamp = datetime.utcfromtimestamp(now)
+        nodes = self.server.iserver.aspace._nodes
+        written = []
+        errors = {}
+        with self.nodes_lock:
+            prepared = []
+            for key, value in values.items():
+                record = self.nodes.get(key)
+                nodedata = nodes.get(record.nodeid) if record is not None else None
+                attval = nodedata.attributes.get(VALUE_ATTRIBUTE) if nodedata is not None else None
+                if attval is None:
+                    errors[key] = '节点不存在或不是变量节点'
+                    continue
+                varianttype = attval.value.Value.VariantType
+                try:
+                    prepared.append((record, _coerce_value(value, varianttype), varianttype))
+                except (ValueError, TypeError) as e:
+                    errors[key] = f'值无效: {e}'
+
+            for record, value, varianttype in prepared:
+                self._write_value(record.nodeid, value, timestamp, varianttype)
+                record.value = value
+                record.status = STATUS_GOOD
+                if hold:
+                    record.next_due = max(record.next_due, now + hold)
+                written.append(record)
+            self._reset_deadbands(written)
+
+        if persist and written:
+            value_store.write(self.config.id, [(record.key, record.value, now, record.status) for record in written])
+        return [record.key for record in written], errors
+
+    def start_scenario(self, scenario_config):
+        """启动（或重新启动）场景，返回场景运行信息
+
+        场景时间从调用时开始计算，选择器在此时解析为节点记录，之后新增的节点不受影响。
+        """
+        events = parse_scenario(scenario_config.definition)
+        nodes = self.server.iserver.aspace._nodes
+        with self.nodes_lock:
+            by_node_id = {record.params.node_id: record for record in self.nodes.values()}
+
+            def resolve(selector):
+                records = tuple(by_node_id[node_id] for node_id in match_selector(selector, by_node_id))
+                groups = {}
+                for record in records:
+                    nodedata = nodes.get(record.nodeid)
+                    if nodedata is not None and VALUE_ATTRIBUTE in nodedata.attributes:
+                        groups.setdefault(record.params.varianttype, []).append(record)
+                return Targets(records, tuple((varianttype, tuple(group)) for varianttype, group in groups.items()))
+
+            now = time.time()
+            run = ScenarioRun(scenario_config.id, scenario_config.name, events, scenario_config.loop, now, resolve)
+            self.scenarios[scenario_config.id] = run
+        logger.info(f"Scenario {scenario_config.name} started on server {self.config.name} "
+                    f"with {len(events)} events and {run.target_count} target nodes")
+        return run.info(now)
+
+    def stop_scenario(self, scenario_id):
+        """停止场景，已生效的值和状态保持不变，返回场景是否在运行"""
+        with self.nodes_lock:
+            return self.scenarios.pop(scenario_id, None) is not None
+
+    def get_scenarios(self):
+        """获取运行中场景的信息"""
+        now = time.time()
+        with self.nodes_lock:
+            return [run.info(now) for run in self.scenarios.values()]
+
+    def get_overload_report(self):
+        """获取过载处理报告"""
+        # 运行时记录不保存节点名称，只查询报告中列出的节点
+        names = lookup_names(key for key, _ in self.overload.shed_counts.most_common(50))
+        return self.overload.report(names)
+
+    def _update_interval(self, params):
+        """获取节点的更新间隔(秒)，不短于更新周期"""
+        return max(params.update_interval, self.tick_interval)
+
+    def _write_value(self, nodeid, value, timestamp, varianttype=None, status=STATUS_GOOD):
+        """直接写入地址空间中的节点值
+
+        与Node.set_value相同，但跳过内部会话的写请求封装和权限检查。
+        """
+        datavalue = ua.DataValue(ua.Variant(value, varianttype), _status_code(status))
+        datavalue.SourceTimestamp = timestamp
+        self.server.iserver.aspace.set_attribute_value(nodeid, ua.AttributeIds.Value, datavalue)
+
+    def _collect_due(self, now, due):
+        """收集本周期到期的节点"""
+        # 提前半个周期视为到期，避免调度抖动导致漏掉一个周期
+        horizon = now + self.tick_interval / 2
+        for record in self.nodes.values():
+            if record.params.variation != VARIATION_NONE and record.next_due <= horizon:
+                due.append(record)
+
+    def _tick(self, now):
+        """执行一个更新周期：计算到期节点的新值并写入地址空间，返回更新的节点数
+
+        未超过死区、没有发布的新值不计入更新的节点数。
+
+        更新了值的节点记录加入 self._dirty_nodes，由 _flush_values 写入运行时值存储。
+        """
+        overload = self.overload
+        dirty = self._dirty_nodes
+        due = self._due_nodes
+        timestamp = datetime.utcnow()  # 同一周期更新的节点使用相同的时间戳
+        with self.nodes_lock:
+            if self._client_writes:
+                self._apply_client_writes(now, dirty)
+            if self.scenarios:
+                self._run_scenarios(now, timestamp, dirty)
+            if self._delayed:
+                self._publish_delayed(now)
+            self._collect_due(now, due)
+            for record in overload.select(due, lambda record: record.params.priority):
+                record.next_due = next_due(record.next_due, self._update_interval(record.params), now)
+                overload.record_shed(record.key)
+
+            stretch = overload.stretch_factor
+            tick_interval = self.tick_interval
+            generated = self._generated
+            banded = self._banded
+            faulty = self._faulty
+            updated = 0
+            for record in due:
+                params = record.params
+                record.next_due = next_due(record.next_due, max(params.update_interval, tick_interval) * stretch, now)
+                if params.variation == VARIATION_COMPOSITE:
+                    generated.append(record)  # 按组合形状分组后批量计算
+                    continue
+
+                new_value = self._calculate_next_value(params, record.value)
+                if new_value is not None:
+                    if params.convert is not None:
+                        new_value = params.convert(new_value)
+                    if params.deadband:
+                        banded.append((record, new_value))  # 周期末尾统一按死区过滤
+                        continue
+                    updated += 1
+                    if params.faults is not None:
+                        faulty.append((record, new_value))  # 周期末尾统一注入故障后发布
+                        continue
+                    self._write_value(record.nodeid, new_value, timestamp, params.varianttype, record.status)
+                    record.value = new_value
+                    dirty.append(record)
+            due.clear()
+            if generated:
+                updated += self._evaluate_generators(generated, now, timestamp, dirty)
+            if banded:
+                updated += self._commit_outside_deadband(banded, timestamp, dirty)
+            if faulty:
+                self._publish_faulty(faulty, now, timestamp, dirty)
+        return updated
+
+    def _apply_client_writes(self, now, dirty):
+        """处理上个周期以来客户端写入的值，按节点的写入策略调整变化计划
+
+        只取出进入本方法时队列中已有的条目，同一节点的多次写入只保留最后一次，
+        写入频率再高，每个周期的处理量也不超过节点数。写入的值已由会话线程写入地址空间，
+        这里只更新运行时记录，并加入dirty随本周期的其他更新一起写入运行时值存储。
+        """
+        queue = self._client_writes
+        received = len(queue)
+        latest = {}
+        for _ in range(received):
+            nodeid, datavalue = queue.popleft()
+            latest[nodeid] = datavalue
+
+        index = self._nodeid_index
+        if index is None:
+            index = self._nodeid_index = {record.nodeid: record for record in self.nodes.values()}
+        aspace_nodes = self.server.iserver.aspace._nodes
+        written = []
+        for nodeid, datavalue in latest.items():
+            record = index.get(nodeid)
+            if record is None:
+                continue
+            nodedata = aspace_nodes.get(nodeid)
+            if nodedata is None:
+                continue
+            if nodedata.attributes[VALUE_ATTRIBUTE].value is not datavalue:
+                # 写入后同一周期内节点又被更新：resume时以更新后的值为准，hold和override时恢复写入值
+                if record.params.write_policy not in (WRITE_HOLD, WRITE_OVERRIDE):
+                    continue
+                self.server.iserver.aspace.set_attribute_value(nodeid, VALUE_ATTRIBUTE, datavalue)
+            record.value = datavalue.Value.Value
+            record.status = datavalue.StatusCode.value
+            if record.params.write_policy == WRITE_HOLD:
+                record.next_due = max(record.next_due, now + record.params.write_hold)
+            elif record.params.write_policy == WRITE_OVERRIDE:
+                record.next_due = math.inf
+            dirty.append(record)
+            written.append(record)
+        self._reset_deadbands(written)
+        self.metrics.client_writes += received
+
+    def _run_scenarios(self, now, timestamp, dirty):
+        """触发场景中到期的事件并推进进行中的线性变化，受影响的节点加入dirty"""
+        for scenario_id, run in list(self.scenarios.items()):
+            for when, index, event, targets, override in run.pop_due(now):
+                action, value = override or (event.action, event.value)
+                try:
+                    self._apply_scenario_action(run, index, event, action, value, targets, when, timestamp, dirty)
+                except Exception as e:
+                    logger.error(f"Error applying scenario {run.name} event {index + 1}: {e}")
+            if run.ramps:
+                self._advance_ramps(run, now, timestamp, dirty)
+            if run.finished:
+                del self.scenarios[scenario_id]
+                logger.info(f"Scenario {run.name} finished on server {self.config.name}")
+
+    def _apply_scenario_action(self, run, index, event, action, value, targets, when, timestamp, dirty):
+        """对事件选中的全部节点执行一个动作，设置值和线性变化按变体类型分组批量执行"""
+        if action == 'hold':
+            until = when + event.duration if event.duration else math.inf
+            for record in targets.records:
+                record.next_due = max(record.next_due, until)
+        elif action == 'resume':
+            for record in targets.records:
+                if record.next_due > when:
+                    record.next_due = 0.0
+        elif action == 'ramp':
+            end = when + event.duration
+            groups = []
+            for varianttype, records in targets.groups:
+                try:
+                    start_values = np.array([record.value for record in records], dtype=np.float64)
+                except (TypeError, ValueError):
+                    # 值不是数值的节点不参与线性变化
+                    records = tuple(record for record in records if _is_number(record.value))
+                    start_values = np.array([record.value for record in records], dtype=np.float64)
+                if records:
+                    groups.append((varianttype, records, start_values))
+                for record in records:
+                    record.next_due = max(record.next_due, end)  # 变化期间暂停自动变化
+            run.ramps.append(Ramp(when, end, groups, value))
+        elif action == 'set':
+            for varianttype, records in targets.groups:
+                self._write_batch(records, itertools.repeat(_coerce_value(value, varianttype)), timestamp,
+                                  varianttype, dirty)
+        elif action == 'status':
+            status = _status_code(value)
+            nodes = self.server.iserver.aspace._nodes
+            aspace = self.server.iserver.aspace
+            for record in targets.records:
+                attval = nodes[record.nodeid].attributes.get(VALUE_ATTRIBUTE) if record.nodeid in nodes else None
+                if attval is None:
+                    continue
+                # 保留当前值，只更换状态码
+                aspace.set_attribute_value(record.nodeid, VALUE_ATTRIBUTE,
+                                           ua.DataValue(attval.value.Value, status, sourceTimestamp=timestamp))
+                record.status = value
+                dirty.append(record)
+            if event.duration and value != STATUS_GOOD:
+                run.push(when + event.duration, index, ('status', STATUS_GOOD))  # 到期后恢复Good
+
+    def _advance_ramps(self, run, now, timestamp, dirty):
+        """按当前时刻写入进行中的线性变化的值，结束的变化写入目标值后移除"""
+        for ramp in list(run.ramps):
+            for varianttype, records, values in ramp.values(now):
+                self._write_batch(records, values, timestamp, varianttype, dirty)
+            if now >= ramp.end:
+                run.ramps.remove(ramp)
+
+    def _write_batch(self, records, values, timestamp, varianttype, dirty):
+        """把一组变体类型相同的节点的新值写入地址空间，各节点沿用自己的状态码
+
+        values与records一一对应，所有节点相同时可传入itertools.repeat(值)。已从地址空间删除的节点被跳过。
+        """
+        set_attribute_value = self.server.iserver.aspace.set_attribute_value
+        written = []
+        for record, value in zip(records, values):
+            datavalue = ua.DataValue(ua.Variant(value, varianttype), _status_code(record.status))
+            datavalue.SourceTimestamp = timestamp
+            if set_attribute_value(record.nodeid, VALUE_ATTRIBUTE, datavalue).is_good():
+                record.value = value
+                written.append(record)
+        dirty.extend(written)
+        self._reset_deadbands(written)
+
+    def _evaluate_generators(self, generated, now, timestamp, dirty):
+        """批量计算到期的组合信号节点，新值按与其他节点相同的流程（死区、故障注入）发布
+
+        返回发布的节点数，交给死区过滤的节点由 _commit_outside_deadband 计数。
+        """
+        published = 0
+        try:
+            if self._generators_stale:
+                composite = [record for record in self.nodes.values() if record.params.generator is not None]
+                self._generators = GeneratorBank(composite, now, self._generators)
+                self._generators_stale = False
+            banded = self._banded
+            faulty = self._faulty
+            for record, value in self._generators.evaluate(generated, now):
+                params = record.params
+                if params.convert is not None:
+                    value = params.convert(value)
+                if params.deadband:
+                    banded.append((record, value))
+                    continue
+                published += 1
+                if params.faults is not None:
+                    faulty.append((record, value))
+                else:
+                    self._write_value(record.nodeid, value, timestamp, params.varianttype, record.status)
+                    record.value = value
+                    dirty.append(record)
+        finally:
+            generated.clear()
+        return published
+
+    def _commit_outside_deadband(self, banded, timestamp, dirty):
+        """只发布与上次发布的值相差超过死区的新值，返回发布的节点数
+
+        本周期的新值用DeadbandBank一次数组比较得到需要发布的行。未超过死区的新值只保存在
+        运行时记录中（递增等变化从该值继续），不写入地址空间，不通知订阅者，也不写入运行时
+        值存储。超过死区的值按正常流程发布（包括故障注入）。
+        """
+        try:
+            if self._deadbands_stale:
+                self._deadbands = DeadbandBank(self.nodes.values(), self._deadbands)
+                self._deadbands_stale = False
+            records = [record for record, _ in banded]
+            values = [value for _, value in banded]
+            mask = self._deadbands.select(records, values)
+            faulty = self._faulty
+            for record, value in banded:
+                record.value = value
+            for row in np.flatnonzero(mask).tolist():
+                record, value = banded[row]
+                if record.params.faults is not None:
+                    faulty.append((record, value))
+                else:
+                    self._write_value(record.nodeid, value, timestamp, record.params.varianttype, record.status)
+                    dirty.append(record)
+            published = int(np.count_nonzero(mask))
+            self.metrics.deadband_suppressed += len(banded) - published
+            return published
+        finally:
+            banded.clear()
+
+    def _reset_deadbands(self, records):
+        """以节点当前的值作为死区判断的基准，用于不经过死区过滤写入的值"""
+        if self._deadbands is not None and records:
+            self._deadbands.reset(records)
+
+    def _publish_faulty(self, faulty, now, timestamp, dirty):
+        """按节点的故障配置发布本周期的新值
+
+        依次决定：状态码（Bad/Uncertain，否则沿用节点状态）、是否冻结为旧值、源时间戳抖动，
+        然后延迟发布、不通知订阅者直接写入（丢弃通知）或正常写入。注入的状态码只影响发布的值，
+        运行时值存储中保存节点自身的状态。本周期全部节点的随机数和故障判断在一次数组运算中完成，
+        逐个节点只构造并写入DataValue。
+        """
+        aspace = self.server.iserver.aspace
+        nodes = aspace._nodes
+        count = len(faulty)
+        injected = 0
+        try:
+            # 配置相同的节点共用FaultProfile，按对象编号后从参数表中取出各节点的参数
+            profiles = {}
+            index = np.fromiter((profiles.setdefault(record.params.faults, len(profiles)) for record, _ in faulty),
+                                np.intp, count)
+            table = np.array([(faults.bad, faults.uncertain, faults.freeze, faults.drop, faults.delay, faults.jitter,
+                               faults.periodic, faults.period) for faults in profiles], dtype=np.float64)
+            bad, uncertain, freeze, drop, delay, jitter, periodic, period = table[index].T
+            periodic = periodic != 0
+
+            samples = self._rng.random((4, count))
+            keys = np.fromiter((record.key for record, _ in faulty), np.float64, count)
+            # 周期模式下为周期内的位置，各节点按节点键错开相位
+            position = np.where(periodic, (now / period + keys * PHASE_STEP) % 1.0, samples[0])
+            frozen = np.where(periodic, position >= 1.0 - freeze, samples[1] < freeze)
+            status = np.select([position < bad, position < bad + uncertain], [STATUS_BAD, STATUS_UNCERTAIN], -1)
+            offsets = self._rng.uniform(-1.0, 1.0, count) * jitter
+            delayed = samples[2] < delay
+            dropped = ~delayed & (samples[3] < drop)
+
+            for (record, value), injected_status, is_frozen, offset, is_delayed, is_dropped in zip(
+                    faulty, status.tolist(), frozen.tolist(), offsets.tolist(), delayed.tolist(), dropped.tolist()):
+                published_status = record.status if injected_status < 0 else injected_status
+                if is_frozen:
+                    value = record.value
+                source_timestamp = timestamp + timedelta(seconds=offset) if offset else timestamp
+
+                record.value = value
+                dirty.append(record)
+                datavalue = ua.DataValue(ua.Variant(value, record.params.varianttype), _status_code(published_status),
+                                         sourceTimestamp=source_timestamp)
+                if is_delayed:
+                    heapq.heappush(self._delayed, (now + record.params.faults.delay_time, next(self._delay_seq),
+                                                   record.nodeid, datavalue))
+                    injected += 1
+                elif is_dropped:
+                    # 直接替换属性值，不调用数据变化回调，订阅该节点的客户端收不到这次变化
+                    nodedata = nodes.get(record.nodeid)
+                    if nodedata is not None:
+                        with aspace._lock:
+                            nodedata.attributes[VALUE_ATTRIBUTE].value = datavalue
+                    injected += 1
+                else:
+                    aspace.set_attribute_value(record.nodeid, VALUE_ATTRIBUTE, datavalue)
+                    if is_frozen or published_status != record.status or offset:
+                        injected += 1
+        finally:
+            faulty.clear()
+            self.metrics.faults_injected += injected
+
+    def _publish_delayed(self, now):
+        """发布到期的延迟值，源时间戳保持原来的时刻"""
+        delayed = self._delayed
+        aspace = self.server.iserver.aspace
+        while delayed and delayed[0][0] <= now:
+            _, _, nodeid, datavalue = heapq.heappop(delayed)
+            aspace.set_attribute_value(nodeid, VALUE_ATTRIBUTE, datavalue)
+
     def _update_values(self):
         """更新节点值的后台线程"""
+        metrics = self.metrics
+        overload = self.overload
+        dirty = self._dirty_nodes
+        due = self._due_nodes
+        period = self.tick_interval
+        scheduled = time.monotonic()
         while not self.stop_event.is_set():
             try:
-                for node_id, node_info in self.nodes.items():
-                    node = node_info['node']
-                    config = node_info['config']
-                    
-                    if config.node_type == 'variable' and config.variation_type != 'none':
-                        new_value = self._calculate_next_value(config)
-                        if new_value is not None:
-                            node.set_value(new_value)
-                            config.value = str(new_value)
-                            config.save()
-
-                time.sleep(0.1)  # 短暂休眠以减少CPU使用
+                tick_start = time.perf_counter()
+                now = time.time()
+                updated = self._tick(now)
+                if dirty:
+                    self._flush_values(dirty, now)
+                duration = time.perf_counter() - tick_start
+                metrics.observe_tick(tick_start, duration, updated, period)
+                overload.observe_tick(duration, updated)
+
+                scheduled = overload.next_tick(scheduled, time.monotonic())
+                self.stop_event.wait(max(0.0, scheduled - time.monotonic()))
             except Exception as e:
+                due.clear()
+                dirty.clear()
+                metrics.update_errors += 1
                 logger.error(f"Error updating values: {e}")
                 time.sleep(1)  # 发生错误时等待较长时间
+                scheduled = time.monotonic()
+
+    def _flush_values(self, dirty, timestamp):
+        """将本周期更新的节点值在一个事务中写入运行时值存储，timestamp为本周期的Unix时间"""
+        flush_start = time.perf_counter()
+        size = len(dirty)
+        try:
+            value_store.write(self.config.id, [(record.key, record.value, timestamp, record.status) for record in dirty])
+        finally:
+            dirty.clear()
+            self.metrics.observe_flush(time.perf_counter() - flush_start, size)
 
-    def _calculate_next_value(self, node_config):
-        """计算节点的下一个值"""
+    def _calculate_next_value(self, params, value):
+        """根据节点的变化参数和当前值计算节点的下一个值"""
         try:
-            current_value = float(node_config.value) if node_config.value else 0
+            current_value = float(value) if value else 0
+            variation = params.variation
             
-            if node_config.variation_type == 'random':
-                if node_config.variation_min is not None and node_config.variation_max is not None:
-                    return random.uniform(node_config.variation_min, node_config.variation_max)
+            if variation == VARIATION_RANDOM:
+                if params.variation_min is not None and params.variation_max is not None:
+                    return random.uniform(params.variation_min, params.variation_max)
             
-            elif node_config.variation_type == 'increment':
-                next_value = current_value + (node_config.variation_step or 1)
-                if node_config.variation_max is not None and next_value > node_config.variation_max:
-                    next_value = node_config.variation_min if node_config.variation_min is not None else 0
+            elif variation == VARIATION_INCREMENT:
+                next_value = current_value + (params.variation_step or 1)
+                if params.variation_max is not None and next_value > params.variation_max:
+                    next_value = params.variation_min if params.variation_min is not None else 0
                 return next_value
             
-            elif node_config.variation_type == 'decrement':
-                next_value = current_value - (node_config.variation_step or 1)
-                if node_config.variation_min is not None and next_value < node_config.variation_min:
-                    next_value = node_config.variation_max if node_config.variation_max is not None else 0
+            elif variation == VARIATION_DECREMENT:
+                next_value = current_value - (params.variation_step or 1)
+                if params.variation_min is not None and next_value < params.variation_min:
+                    next_value = params.variation_max if params.variation_max is not None else 0
                 return next_value
             
-            elif node_config.variation_type == 'sine':
-                time_factor = time.time() * 2 * math.pi / (node_config.variation_interval / 1000)
-                amplitude = (node_config.variation_max - node_config.variation_min) / 2
-                offset = (node_config.variation_max + node_config.variation_min) / 2
+            elif variation == VARIATION_SINE:
+                time_factor = time.time() * 2 * math.pi / (params.variation_interval / 1000)
+                amplitude = (params.variation_max - params.variation_min) / 2
+                offset = (params.variation_max + params.variation_min) / 2
                 return offset + amplitude * math.sin(time_factor)
             
-            elif node_config.variation_type == 'square':
-                time_factor = time.time() * 2 * math.pi / (node_config.variation_interval / 1000)
-                return node_config.variation_max if math.sin(time_factor) >= 0 else node_config.variation_min
+            elif variation == VARIATION_SQUARE:
+                time_factor = time.time() * 2 * math.pi / (params.variation_interval / 1000)
+                return params.variation_max if math.sin(time_factor) >= 0 else params.variation_min
             
-            elif node_config.variation_type == 'triangle':
-                time_factor = time.time() * 2 * math.pi / (node_config.variation_interval / 1000)
-                amplitude = node_config.variation_max - node_config.variation_min
-                period = node_config.variation_interval / 1000
+            elif variation == VARIATION_TRIANGLE:
+                amplitude = params.variation_max - params.variation_min
+                period = params.variation_interval / 1000
                 t = (time.time() % period) / period
                 if t < 0.5:
-                    return node_config.variation_min + 2 * amplitude * t
+                    return params.variation_min + 2 * amplitude * t
                 else:
-                    return node_config.variation_max - 2 * amplitude * (t - 0.5)
+                    return params.variation_max - 2 * amplitude * (t - 0.5)
             
-            elif node_config.variation_type == 'sawtooth':
-                time_factor = time.time() / (node_config.variation_interval / 1000)
-                amplitude = node_config.variation_max - node_config.variation_min
-                return node_config.variation_min + amplitude * (time_factor % 1)
+            elif variation == VARIATION_SAWTOOTH:
+                time_factor = time.time() / (params.variation_interval / 1000)
+                amplitude = params.variation_max - params.variation_min
+                return params.variation_min + amplitude * (time_factor % 1)
             
-            elif node_config.variation_type == 'discrete':
-                if node_config.variation_values:
-                    values = json.loads(node_config.variation_values)
-                    if values:
-                        try:
-                            current_index = values.index(current_value)
-                            next_index = (current_index + 1) % len(values)
-                            return values[next_index]
-                        except ValueError:
-                            return values[0]
+            elif variation == VARIATION_DISCRETE:
+                values = params.variation_values
+                if values:
+                    try:
+                        current_index = values.index(current_value)
+                        next_index = (current_index + 1) % len(values)
+                        return values[next_index]
+                    except ValueError:
+                        return values[0]
             
             return current_value
             
@@ -0,0 +1,101 @@
+import math
+from collections import Counter
+
+# 过载策略
+OVERLOAD_POLICIES = {
+    'none': '不处理（整体延后）',
+    'shed': '丢弃低优先级节点',
+    'stretch': '按比例拉长变化间隔',
+    'skip': '跳过落后的周期',
+}
+
+LOAD_SMOOTHING = 0.3  # 负载平滑系数
+SHED_HEADROOM = 0.9  # 丢弃节点时为周期预留的余量
+
+
+class OverloadController:
+    """更新周期过载控制
+
+    根据最近的周期耗时估算负载，并按服务器配置的策略决定本周期更新哪些节点、
+    节点变化间隔是否拉长以及下一周期何时开始。
+    """
+
+    def __init__(self, policy, period):
+        self.policy = policy if policy in OVERLOAD_POLICIES else 'none'
+        self.period = period
+        self.load = 0.0  # 平滑后的周期耗时/周期长度
+        self.node_cost = 0.0  # 平滑后的单节点更新耗时(秒)
+        self.shed_total = 0
+        self.shed_counts = Counter()  # 节点键 -> 被丢弃次数
+        self.last_shed = 0
+        self.skipped_ticks = 0
+        self.late_ticks = 0
+
+    @property
+    def stretch_factor(self):
+        """stretch策略下节点变化间隔的放大倍数"""
+        if self.policy == 'stretch' and self.load > 1.0:
+            return self.load
+        return 1.0
+
+    def select(self, due, priority):
+        """shed策略下按优先级裁剪本周期的待更新节点，返回被丢弃的节点"""
+        self.last_shed = 0
+        if self.policy != 'shed' or self.node_cost <= 0:
+            return ()
+        capacity = max(1, int(self.period * SHED_HEADROOM / self.node_cost))
+        if len(due) <= capacity:
+            return ()
+        due.sort(key=priority, reverse=True)
+        shed = due[capacity:]
+        del due[capacity:]
+        self.last_shed = len(shed)
+        self.shed_total += len(shed)
+        return shed
+
+    def record_shed(self, key):
+        self.shed_counts[key] += 1
+
+    def observe_tick(self, duration, updated):
+        """记录本周期的耗时"""
+        self.load += LOAD_SMOOTHING * (duration / self.period - self.load)
+        if updated:
+            self.node_cost += LOAD_SMOOTHING * (duration / updated - self.node_cost)
+
+    def next_tick(self, scheduled, now):
+        """计算下一周期的开始时间"""
+        scheduled += self.period
+        if now <= scheduled:
+            return scheduled
+        self.late_ticks += 1
+        if self.policy == 'skip':
+            # 保持在原有周期网格上，跳过已经落后的周期
+            missed = math.ceil((now - scheduled) / self.period)
+            self.skipped_ticks += missed
+            return scheduled + missed * self.period
+        return now
+
+    def report(self, names, limit=50):
+        """生成过载报告"""
+        return {
+            'policy': self.policy,
+            'period_ms': round(self.period * 1000, 3),
+            'load': round(self.load, 3),
+            'stretch_factor': round(self.stretch_factor, 3),
+            'late_ticks': self.late_ticks,
+            'skipped_ticks': self.skipped_ticks,
+            'shed_total': self.shed_total,
+            'last_shed': self.last_shed,
+            'shed_nodes': [
+                {'id': key, 'name': names.get(key), 'count': count}
+                for key, count in self.shed_counts.most_common(limit)
+            ],
+        }
+
+
+def next_due(previous, interval, now):
+    """计算节点的下一次更新时间，落后时按间隔对齐以保持相位"""
+    due = previous + interval
+    if due <= now:
+        due += math.ceil((now - due) / interval) * interval
+    return due
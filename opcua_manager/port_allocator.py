@@ -0,0 +1,107 @@
+import os
+import time
+import errno
+import socket
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .models import OpcServer
+from . import server_registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_START_PORT = 4840  # OPC UA默认端口
+MAX_PORT = 65535
+PROBE_WORKERS = 32  # 并发探测的线程数
+RESERVATION_TTL = 60  # 分配出的端口保留时间(秒)，等待调用方创建服务器
+
+
+def probe_port(endpoint, port):
+    """通过在本机绑定端口检查端口是否空闲
+
+    与服务器监听时一样设置SO_REUSEADDR，处于TIME_WAIT的端口视为空闲。
+    终端点不是本机地址时在所有地址上绑定。
+    """
+    for host in (endpoint, ''):
+        try:
+            infos = socket.getaddrinfo(host or None, port, socket.AF_UNSPEC, socket.SOCK_STREAM, 0, socket.AI_PASSIVE)
+        except socket.gaierror:
+            continue
+        family, socktype, proto, _, address = infos[0]
+        sock = socket.socket(family, socktype, proto)
+        try:
+            if os.name != 'nt':
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(address)
+            return True
+        except OSError as e:
+            if e.errno == errno.EADDRNOTAVAIL or getattr(e, 'winerror', None) == 10049:  # 非本机地址
+                continue
+            return False
+        finally:
+            sock.close()
+    return False
+
+
+class PortAllocator:
+    """端口分配器
+
+    已被服务器配置、运行中的实例以及近期分配出的端口视为已占用，
+    其余候选端口通过并发绑定探测，一次可以分配多个端口。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()  # 保护_reservations
+        self._allocate_lock = threading.Lock()  # 同一时间只进行一次分配，避免重复分配
+        self._reservations = {}  # 端口 -> 保留到期时间
+        self._executor = ThreadPoolExecutor(max_workers=PROBE_WORKERS, thread_name_prefix='port-probe')
+
+    def reserved_ports(self):
+        """已被占用的端口：服务器配置、运行中的实例和未过期的分配"""
+        ports = set(OpcServer.objects.values_list('port', flat=True))
+        ports.update(instance.config.port for instance in server_registry.get_instances())
+        now = time.monotonic()
+        with self._lock:
+            for port, expires in list(self._reservations.items()):
+                if expires <= now:
+                    del self._reservations[port]
+            ports.update(self._reservations)
+        return ports
+
+    def probe_many(self, endpoint, ports):
+        """并发探测多个端口，返回 {端口: 是否空闲}"""
+        ports = list(ports)
+        return dict(zip(ports, self._executor.map(lambda port: probe_port(endpoint, port), ports)))
+
+    def allocate(self, endpoint, count=1, start_port=DEFAULT_START_PORT, end_port=MAX_PORT):
+        """从start_port开始分配count个空闲端口，按端口号升序返回"""
+        if count < 1:
+            raise ValueError("分配数量必须大于0")
+        with self._allocate_lock:
+            reserved = self.reserved_ports()
+            candidates = (port for port in range(start_port, end_port + 1) if port not in reserved)
+            batch_size = max(count * 2, PROBE_WORKERS)
+
+            allocated = []
+            while len(allocated) < count:
+                batch = [port for _, port in zip(range(batch_size), candidates)]
+                if not batch:
+                    raise ValueError(f"端口范围 {start_port}-{end_port} 内没有足够的空闲端口")
+                free = self.probe_many(endpoint, batch)
+                allocated.extend(port for port in batch if free[port])
+            allocated = allocated[:count]
+
+            expires = time.monotonic() + RESERVATION_TTL
+            with self._lock:
+                self._reservations.update((port, expires) for port in allocated)
+        logger.debug(f"Allocated ports {allocated} on {endpoint}")
+        return allocated
+
+    def release(self, ports):
+        """释放未使用的分配"""
+        with self._lock:
+            for port in ports:
+                self._reservations.pop(port, None)
+
+
+port_allocator = PortAllocator()
@@ -0,0 +1,58 @@
+import json
+import socket
+import logging
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CONTROL_TIMEOUT = 30  # 控制命令的默认超时(秒)
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024  # 单条请求或响应的最大长度
+
+_local_runner = False  # 当前进程是否为模拟器进程
+
+
+class RunnerUnavailable(Exception):
+    """模拟器进程未运行或控制端口无法连接"""
+
+
+def runner_enabled():
+    return getattr(settings, 'SIMULATOR_RUNNER_ENABLED', False)
+
+
+def control_address():
+    return (getattr(settings, 'SIMULATOR_RUNNER_HOST', '127.0.0.1'),
+            getattr(settings, 'SIMULATOR_RUNNER_PORT', 48400))
+
+
+def mark_local_runner():
+    """由模拟器进程在启动时调用，此后本进程直接管理服务器实例"""
+    global _local_runner
+    _local_runner = True
+
+
+def servers_are_remote():
+    """服务器是否由独立的模拟器进程运行，而不是当前进程"""
+    return runner_enabled() and not _local_runner
+
+
+def send_command(command, timeout=CONTROL_TIMEOUT, **params):
+    """向模拟器进程发送命令并返回响应
+
+    协议为每个连接一条请求、一条响应，均为单行JSON。请求为 {"command": 命令, ...参数}，
+    响应为 {"success": true, ...} 或 {"success": false, "error": 错误信息}。
+    命令执行失败时抛出RuntimeError，无法连接时抛出RunnerUnavailable。
+    """
+    request = json.dumps({'command': command, **params}, ensure_ascii=False).encode('utf-8') + b'\n'
+    try:
+        with socket.create_connection(control_address(), timeout=timeout) as sock:
+            sock.sendall(request)
+            with sock.makefile('rb') as f:
+                line = f.readline(MAX_MESSAGE_SIZE)
+    except OSError as e:
+        raise RunnerUnavailable(f"无法连接模拟器进程: {e}") from e
+    if not line:
+        raise RunnerUnavailable("模拟器进程未返回结果")
+    response = json.loads(line)
+    if not response.get('success'):
+        raise RuntimeError(response.get('error') or f"模拟器进程执行命令 {command} 失败")
+    return response
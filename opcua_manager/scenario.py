@@ -0,0 +1,245 @@
+import json
+import heapq
+from fnmatch import fnmatchcase
+from collections import namedtuple
+import numpy as np
+from . import server_registry
+from .models import Scenario
+from .node_runtime import CONVERTERS
+
+# 场景动作
+SCENARIO_ACTIONS = {
+    'set': '设置为固定值',
+    'ramp': '在一段时间内线性变化到目标值',
+    'status': '设置状态码',
+    'hold': '暂停自动变化',
+    'resume': '恢复自动变化',
+}
+
+# 场景中可以设置的OPC UA状态码（按严重程度取各类的基本值）
+STATUS_CODES = {
+    'Good': 0,
+    'Uncertain': 0x40000000,
+    'Bad': 0x80000000,
+}
+
+# 解析后的事件：at为相对场景开始的秒数，selector为 (node_id列表, 通配符模式)
+ScenarioEvent = namedtuple('ScenarioEvent', 'at selector action value duration')
+
+
+def _parse_selector(select):
+    if not isinstance(select, dict):
+        raise ValueError("select必须是对象")
+    node_ids = select.get('node_ids')
+    pattern = select.get('pattern')
+    if node_ids is None and pattern is None:
+        raise ValueError("select需要node_ids或pattern")
+    if node_ids is not None and (not isinstance(node_ids, list) or not all(isinstance(i, str) for i in node_ids)):
+        raise ValueError("node_ids必须是字符串列表")
+    if pattern is not None and not isinstance(pattern, str):
+        raise ValueError("pattern必须是字符串")
+    return tuple(node_ids or ()), pattern
+
+
+def _parse_event(index, item):
+    try:
+        if not isinstance(item, dict):
+            raise ValueError("事件必须是对象")
+        at = float(item.get('at', 0))
+        if at < 0:
+            raise ValueError("at不能为负数")
+        action = item.get('action')
+        if action not in SCENARIO_ACTIONS:
+            raise ValueError(f"未知动作: {action}")
+        duration = item.get('duration')
+        duration = float(duration) if duration is not None else None
+        if duration is not None and duration < 0:
+            raise ValueError("duration不能为负数")
+        value = None
+        if action == 'set':
+            if 'value' not in item:
+                raise ValueError("set动作需要value")
+            value = item['value']
+        elif action == 'ramp':
+            value = float(item['target'])
+            if not duration:
+                raise ValueError("ramp动作需要大于0的duration")
+        elif action == 'status':
+            if item.get('status') not in STATUS_CODES:
+                raise ValueError(f"未知状态: {item.get('status')}")
+            value = STATUS_CODES[item['status']]
+        return ScenarioEvent(at, _parse_selector(item.get('select')), action, value, duration)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"第{index + 1}个事件无效: {e}")
+
+
+def parse_scenario(definition):
+    """解析场景定义（JSON文本或事件列表），返回按时间排序的事件元组
+
+    每个事件为 {"at": 秒, "select": {"node_ids": [...]} 或 {"pattern": "Line2.*"},
+    "action": 动作, ...}，动作参数：set 需要value；ramp 需要target和duration；
+    status 需要status（Good/Uncertain/Bad），可选duration，到期后恢复Good；
+    hold 可选duration，不指定时一直暂停到resume。
+    """
+    if isinstance(definition, str):
+        try:
+            definition = json.loads(definition)
+        except ValueError as e:
+            raise ValueError(f"场景定义不是有效的JSON: {e}")
+    if not isinstance(definition, list):
+        raise ValueError("场景定义必须是事件列表")
+    events = [_parse_event(index, item) for index, item in enumerate(definition)]
+    events.sort(key=lambda event: event.at)
+    return tuple(events)
+
+
+def scenario_length(events):
+    """场景的总时长（秒）：最后一个事件及其持续时间结束的时刻"""
+    return max((event.at + (event.duration or 0) for event in events), default=0.0)
+
+
+class Targets:
+    """事件选中的节点
+
+    records为全部节点记录；groups为按变体类型分组的变量节点 ((变体类型, 节点记录元组), ...)，
+    设置值和线性变化按组批量写入，每组只转换一次值。
+    """
+    __slots__ = ('records', 'groups')
+
+    def __init__(self, records, groups):
+        self.records = records
+        self.groups = groups
+
+    def __iter__(self):
+        return iter(self.records)
+
+
+class Ramp:
+    """进行中的线性变化，目标节点和起始值在开始时确定
+
+    groups为 [(变体类型, 节点记录元组, 起始值数组)]，每个周期每组用一次数组运算计算当前值。
+    """
+    __slots__ = ('start', 'end', 'groups', 'target')
+
+    def __init__(self, start, end, groups, target):
+        self.start = start
+        self.end = end
+        self.groups = groups
+        self.target = target
+
+    def values(self, now):
+        """返回当前时刻各组节点的值：[(变体类型, 节点记录元组, 值列表)]，值已按变体类型转换"""
+        fraction = min(1.0, (now - self.start) / (self.end - self.start))
+        result = []
+        for varianttype, records, start_values in self.groups:
+            values = (start_values + (self.target - start_values) * fraction).tolist()
+            convert = CONVERTERS.get(varianttype)
+            result.append((varianttype, records, list(map(convert, values)) if convert is not None else values))
+        return result
+
+
+class ScenarioRun:
+    """运行中的场景
+
+    事件按触发时刻（time.time()）放入优先队列，更新线程每个周期取出到期的事件。
+    选择器在启动时解析为Targets，之后每次触发直接按组写入；节点增删后
+    需要重新启动场景才会生效。
+    """
+
+    def __init__(self, scenario_id, name, events, loop, start, resolve):
+        self.scenario_id = scenario_id
+        self.name = name
+        self.events = events
+        self.loop = loop
+        self.length = scenario_length(events)
+        self.started_at = start
+        self.cycles = 0
+        self.ramps = []
+        self._seq = 0
+        self._queue = []
+        # 相同的选择器只解析一次
+        resolved = {}
+        for event in events:
+            if event.selector not in resolved:
+                resolved[event.selector] = resolve(event.selector)
+        self._targets = [resolved[event.selector] for event in events]
+        self.target_count = len(set().union(*resolved.values()))
+        self._schedule(start)
+
+    def _schedule(self, start):
+        self.cycle_start = start
+        for index, event in enumerate(self.events):
+            self.push(start + event.at, index)
+
+    def push(self, due, index, override=None):
+        """加入一个事件；override为 (动作, 值) 时替代原事件的动作，用于到期后的恢复操作"""
+        self._seq += 1
+        heapq.heappush(self._queue, (due, self._seq, index, override))
+
+    def pop_due(self, now):
+        """按时间顺序取出到期的事件，返回 [(触发时刻, 事件序号, 事件, 目标节点(Targets), 替代动作)]"""
+        queue = self._queue
+        due = []
+        while queue and queue[0][0] <= now:
+            when, _, index, override = heapq.heappop(queue)
+            due.append((when, index, self.events[index], self._targets[index], override))
+        if not queue and not self.ramps and self.loop and self.length > 0:
+            next_start = self.cycle_start + self.length
+            if next_start <= now:
+                self.cycles += 1
+                self._schedule(next_start)
+        return due
+
+    @property
+    def finished(self):
+        return not self._queue and not self.ramps and not self.loop
+
+    @property
+    def pending(self):
+        return len(self._queue)
+
+    def info(self, now):
+        return {
+            'scenario_id': self.scenario_id,
+            'name': self.name,
+            'elapsed': round(now - self.cycle_start, 3),
+            'length': self.length,
+            'cycles': self.cycles,
+            'pending_events': self.pending,
+            'active_ramps': len(self.ramps),
+            'targets': self.target_count,
+        }
+
+
+def match_selector(selector, node_ids):
+    """返回与选择器匹配的node_id集合"""
+    exact, pattern = selector
+    matched = {node_id for node_id in exact if node_id in node_ids}
+    if pattern is not None:
+        matched.update(node_id for node_id in node_ids if fnmatchcase(node_id, pattern))
+    return matched
+
+
+def _running_instance(server_id):
+    instance = server_registry.get_instance(server_id)
+    if instance is None or not instance.running:
+        raise ValueError("服务器未运行")
+    return instance
+
+
+def start_server_scenario(scenario_id):
+    """在运行中的服务器上启动场景，返回场景运行信息"""
+    scenario = Scenario.objects.get(id=scenario_id)
+    return _running_instance(scenario.server_id).start_scenario(scenario)
+
+
+def stop_server_scenario(server_id, scenario_id):
+    """停止服务器上的场景，返回场景是否在运行；服务器未运行时返回False"""
+    instance = server_registry.get_instance(server_id)
+    return instance is not None and instance.stop_scenario(scenario_id)
+
+
+def running_scenarios(server_id):
+    """获取服务器上运行中场景的信息，服务器未运行时返回空列表"""
+    instance = server_registry.get_instance(server_id)
+    return instance.get_scenarios() if instance is not None else []
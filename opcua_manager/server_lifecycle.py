@@ -0,0 +1,143 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connections
+from django.utils import timezone
+from .models import OpcServer
+from . import server_registry
+from .jobs import JobCancelled
+from .runner_control import servers_are_remote, send_command
+
+logger = logging.getLogger(__name__)
+
+LIFECYCLE_WORKERS = 8  # 批量启停的最大并发数
+RUNNER_TIMEOUT = 3600  # 由模拟器进程执行批量启停时等待结果的最长时间(秒)
+
+
+def _start_one(server):
+    # opcua在第一次启动服务器时才导入
+    from .opcua_server import OpcUaServer
+
+    opcua_server = server_registry.get_instance(server.id)
+    if opcua_server and opcua_server.running:
+        return 'already_running', None
+    opcua_server = OpcUaServer.create_instance(server)
+    if opcua_server.start():
+        return 'started', None
+    # 移除启动失败的实例，下次启动时重新创建
+    OpcUaServer.remove_instance(server.id)
+    return 'failed', '服务器启动失败'
+
+
+def _stop_one(server):
+    opcua_server = server_registry.get_instance(server.id)
+    if not opcua_server or not opcua_server.running:
+        return 'not_running', None
+    if not opcua_server.stop():
+        return 'failed', '服务器停止失败'
+    # 移除已停止的实例，下次启动时按最新配置重新创建
+    server_registry.unregister(server.id)
+    return 'stopped', None
+
+
+def _run_one(action, server, job=None):
+    start = time.perf_counter()
+    try:
+        if job is not None and job.cancel_requested:
+            status, error = 'cancelled', None
+        else:
+            status, error = action(server)
+    except Exception as e:
+        logger.error(f"Error in batch operation on server {server.name}: {e}")
+        status, error = 'failed', str(e)
+    finally:
+        connections.close_all()
+    return {
+        'id': server.id,
+        'name': server.name,
+        'status': status,
+        'error': error,
+        'duration_ms': round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+def _run_batch(action, server_ids, max_workers, job=None):
+    start = time.perf_counter()
+    server_ids = [int(server_id) for server_id in server_ids]
+    servers = list(OpcServer.objects.filter(id__in=server_ids))
+    missing = set(server_ids) - {server.id for server in servers}
+    workers = max(1, min(max_workers or LIFECYCLE_WORKERS, LIFECYCLE_WORKERS, len(servers) or 1))
+
+    done = 0
+    done_lock = threading.Lock()
+
+    def run(server):
+        nonlocal done
+        result = _run_one(action, server, job)
+        if job is not None:
+            with done_lock:
+                done += 1
+                job.update_progress(done, len(servers), f"{server.name}: {result['status']}")
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='lifecycle') as executor:
+        results = list(executor.map(run, servers))
+    results.extend(
+        {'id': server_id, 'name': None, 'status': 'failed', 'error': '服务器不存在', 'duration_ms': 0}
+        for server_id in missing
+    )
+    return results, round((time.perf_counter() - start) * 1000, 1)
+
+
+def _summarize(results, duration_ms, done_status, message):
+    done = [result for result in results if result['status'] == done_status]
+    errors = [f"服务器 {result['name'] or result['id']}: {result['error']}" for result in results if result['status'] == 'failed']
+    return {
+        'message': message.format(len(done)),
+        'errors': errors,
+        'results': results,
+        'duration_ms': duration_ms,
+    }
+
+
+def _finish(summary, job):
+    """作为后台任务执行时记录结果
+
+    取消只在各服务器开始执行前检查，已经执行的操作照常报告结果；只有全部服务器
+    都因取消而未执行时，任务才标记为已取消。
+    """
+    if job is not None:
+        job.result = summary
+        results = summary['results']
+        if results and all(result['status'] == 'cancelled' for result in results):
+            raise JobCancelled()
+    return summary
+
+
+def _run_remote(command, server_ids, max_workers):
+    """由模拟器进程执行启停，数据库状态也由模拟器进程更新"""
+    server_ids = [int(server_id) for server_id in server_ids]
+    return send_command(command, timeout=RUNNER_TIMEOUT, server_ids=server_ids, max_workers=max_workers)['result']
+
+
+def start_servers(server_ids, max_workers=None, job=None):
+    """并行启动多个服务器，返回每个服务器的结果和耗时"""
+    if servers_are_remote():
+        return _finish(_run_remote('start', server_ids, max_workers), job)
+    results, duration_ms = _run_batch(_start_one, server_ids, max_workers, job)
+    running_ids = [result['id'] for result in results if result['status'] in ('started', 'already_running')]
+    OpcServer.objects.filter(id__in=running_ids).update(is_running=True, updated_at=timezone.now())
+    logger.info(f"Batch started {len(running_ids)} servers in {duration_ms}ms")
+    return _finish(_summarize(results, duration_ms, 'started', '成功启动 {} 个服务器'), job)
+
+
+def stop_servers(server_ids, max_workers=None, job=None):
+    """并行停止多个服务器，返回每个服务器的结果和耗时"""
+    if servers_are_remote():
+        return _finish(_run_remote('stop', server_ids, max_workers), job)
+    results, duration_ms = _run_batch(_stop_one, server_ids, max_workers, job)
+    stopped_ids = [result['id'] for result in results if result['status'] in ('stopped', 'not_running')]
+    OpcServer.objects.filter(id__in=stopped_ids).update(is_running=False, updated_at=timezone.now())
+    logger.info(f"Batch stopped {len(stopped_ids)} servers in {duration_ms}ms")
+    return _finish(_summarize(results, duration_ms, 'stopped', '成功停止 {} 个服务器'), job)
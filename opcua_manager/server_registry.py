@@ -0,0 +1,29 @@
+import threading
+
+# 当前进程中的服务器实例，按服务器id索引
+# 单独存放，查询实例的模块不必导入opcua（只有创建实例时才需要）
+_instances = {}
+_lock = threading.Lock()
+
+
+def get_instance(server_id):
+    """获取服务器实例"""
+    return _instances.get(server_id)
+
+
+def get_instances():
+    """获取所有服务器实例"""
+    with _lock:
+        return list(_instances.values())
+
+
+def register(server_id, instance):
+    """注册实例，已有同id的实例时返回已有的实例"""
+    with _lock:
+        return _instances.setdefault(server_id, instance)
+
+
+def unregister(server_id):
+    """移除并返回实例，不存在时返回None"""
+    with _lock:
+        return _instances.pop(server_id, None)
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import logging
+import threading
+import socketserver
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connections
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import OpcServer
+from .opcua_server import OpcUaServer
+from .metrics import render_metrics
+from .live_values import read_live_values, write_live_values
+from .node_changes import apply_node_keys
+from .snapshot import discard_snapshot
+from .scenario import start_server_scenario, stop_server_scenario, running_scenarios
+from .server_lifecycle import start_servers, stop_servers, LIFECYCLE_WORKERS
+from .runner_control import MAX_MESSAGE_SIZE, control_address, mark_local_runner
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RECONCILE_INTERVAL = 5.0  # 与数据库状态对齐的间隔(秒)
+
+
+class _ControlHandler(socketserver.StreamRequestHandler):
+    """处理一条控制命令"""
+
+    def handle(self):
+        line = self.rfile.readline(MAX_MESSAGE_SIZE + 1)
+        if not line:
+            return
+        try:
+            if len(line) > MAX_MESSAGE_SIZE:
+                raise ValueError("命令过长")
+            response = {'success': True, **self.server.runner.dispatch(json.loads(line))}
+        except Exception as e:
+            logger.error(f"Error handling control command: {e}")
+            response = {'success': False, 'error': str(e)}
+        finally:
+            connections.close_all()
+        self.wfile.write(json.dumps(response, ensure_ascii=False, cls=DjangoJSONEncoder).encode('utf-8') + b'\n')
+
+
+class _ControlServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class SimulatorRunner:
+    """在独立进程中运行全部OPC UA服务器
+
+    数据库中的OpcServer.is_running表示服务器应处于的状态：模拟器进程定期启动应运行
+    而未运行的服务器，停止已被标记为停止或已删除的服务器，启动失败的服务器标记为停止。
+    Web进程通过本地控制端口发送启停等命令，命令在本进程中立即执行。
+    退出时停止所有服务器（保存快照），但保留is_running，下次启动时恢复运行。
+    """
+
+    def __init__(self, address=None, reconcile_interval=DEFAULT_RECONCILE_INTERVAL):
+        self.address = address or control_address()
+        self.reconcile_interval = reconcile_interval
+        self.started_at = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()  # 对齐与启停命令互斥执行
+        self._commands = {
+            'ping': self._ping,
+            'status': self._status,
+            'start': self._start,
+            'stop': self._stop,
+            'reconcile': lambda request: {'result': self.reconcile()},
+            'metrics': lambda request: {'text': render_metrics(OpcUaServer.get_instances())},
+            'overload': self._overload,
+            'profile': self._profile,
+            'values': lambda request: read_live_values(request.get('server_id'), request.get('ids')),
+            'write_values': lambda request: write_live_values(
+                request['server_id'], request['values'], request.get('by_node_id', False),
+                request.get('hold'), request.get('persist', True)),
+            'apply_node_changes': lambda request: {'applied': apply_node_keys(
+                int(request['server_id']), request.get('added', ()), request.get('updated', ()),
+                request.get('removed', ()))},
+            'scenarios': lambda request: {'scenarios': running_scenarios(int(request['server_id']))},
+            'start_scenario': lambda request: {'scenario': start_server_scenario(int(request['scenario_id']))},
+            'stop_scenario': lambda request: {
+                'stopped': stop_server_scenario(int(request['server_id']), int(request['scenario_id']))},
+        }
+
+    def run(self):
+        """启动控制端口并循环对齐服务器状态，直到调用shutdown"""
+        mark_local_runner()
+        control = _ControlServer(self.address, _ControlHandler)
+        control.runner = self
+        control_thread = threading.Thread(target=control.serve_forever, name='runner-control', daemon=True)
+        control_thread.start()
+        self.started_at = time.time()
+        logger.info(f"Simulator runner {os.getpid()} listening on {self.address[0]}:{self.address[1]}")
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    self.reconcile()
+                except Exception as e:
+                    logger.error(f"Error reconciling servers: {e}")
+                self._stop_event.wait(self.reconcile_interval)
+        finally:
+            control.shutdown()
+            control.server_close()
+            self._stop_all()
+            logger.info("Simulator runner stopped")
+
+    def shutdown(self):
+        self._stop_event.set()
+
+    def reconcile(self):
+        """按数据库中的is_running启动或停止服务器，返回各类操作的服务器数"""
+        with self._lock:
+            desired = set(OpcServer.objects.filter(is_running=True).values_list('id', flat=True))
+            instances = {instance.config.id: instance for instance in OpcUaServer.get_instances()}
+            running = {server_id for server_id, instance in instances.items() if instance.running}
+
+            # 已删除的服务器没有数据库记录，直接停止实例，并删除停止时保存的快照
+            to_stop = [instances[server_id] for server_id in set(instances) - desired]
+            if to_stop:
+                self._stop_instances(to_stop)
+                stop_ids = {instance.config.id for instance in to_stop}
+                for server_id in stop_ids - set(OpcServer.objects.filter(id__in=stop_ids).values_list('id', flat=True)):
+                    discard_snapshot(server_id)
+
+            started = failed = 0
+            to_start = desired - running
+            if to_start:
+                results = start_servers(to_start)['results']
+                failed_ids = [result['id'] for result in results if result['status'] == 'failed']
+                if failed_ids:
+                    OpcServer.objects.filter(id__in=failed_ids).update(is_running=False)
+                    logger.error(f"Failed to start servers {failed_ids}, marked as stopped")
+                started = sum(1 for result in results if result['status'] == 'started')
+                failed = len(failed_ids)
+            if to_stop or to_start:
+                logger.info(f"Reconciled servers: {started} started, {failed} failed, {len(to_stop)} stopped")
+            return {'started': started, 'failed': failed, 'stopped': len(to_stop)}
+
+    def dispatch(self, request):
+        if not isinstance(request, dict):
+            raise ValueError("命令格式无效")
+        handler = self._commands.get(request.get('command'))
+        if handler is None:
+            raise ValueError(f"未知命令: {request.get('command')}")
+        return handler(request)
+
+    def _stop_instances(self, instances):
+        def stop(instance):
+            instance.stop()
+            OpcUaServer.remove_instance(instance.config.id)
+
+        with ThreadPoolExecutor(max_workers=LIFECYCLE_WORKERS, thread_name_prefix='lifecycle') as executor:
+            list(executor.map(stop, instances))
+
+    def _stop_all(self):
+        instances = OpcUaServer.get_instances()
+        if instances:
+            logger.info(f"Stopping {len(instances)} servers")
+            self._stop_instances(instances)
+
+    def _ping(self, request):
+        return {
+            'pid': os.getpid(),
+            'uptime': round(time.time() - self.started_at, 1),
+            'servers': len(OpcUaServer.get_instances()),
+        }
+
+    def _status(self, request):
+        return {'servers': [
+            {
+                'id': instance.config.id,
+                'name': instance.config.name,
+                'running': instance.running,
+                'nodes': len(instance.nodes),
+            }
+            for instance in OpcUaServer.get_instances()
+        ]}
+
+    def _start(self, request):
+        with self._lock:
+            return {'result': start_servers(request.get('server_ids', []), request.get('max_workers'))}
+
+    def _stop(self, request):
+        with self._lock:
+            return {'result': stop_servers(request.get('server_ids', []), request.get('max_workers'))}
+
+    def _get_instance(self, request):
+        instance = OpcUaServer.get_instance(int(request.get('server_id')))
+        if instance is None:
+            raise ValueError("服务器未运行")
+        return instance
+
+    def _overload(self, request):
+        return {'report': self._get_instance(request).get_overload_report()}
+
+    def _profile(self, request):
+        instance = self._get_instance(request)
+        return {'text': instance.profile(float(request.get('seconds', 10)), request.get('interval'))}
@@ -0,0 +1,265 @@
+import os
+import time
+import pickle
+import hashlib
+import logging
+from pathlib import Path
+from importlib import metadata
+from django.conf import settings
+from opcua import ua
+from opcua.server.address_space import NodeData, AttributeValue
+from .models import Node, NodeTemplate, NODE_CONFIG_FIELDS
+from .node_runtime import SHARED_ATTRIBUTES, shared_value
+from .template_cache import get_template_nodes
+from .file_utils import atomic_write_bytes
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = Path(settings.BASE_DIR) / 'snapshots'
+SNAPSHOT_MAGIC = b'HOPCSNAP'  # 快照文件头
+SNAPSHOT_VERSION = 9  # 快照格式版本，格式或运行时记录结构变化时递增
+CHECKSUM_CHUNK_SIZE = 5000
+OPCUA_VERSION = metadata.version('opcua')  # 地址空间对象的结构随opcua版本变化
+
+# 每个节点各不相同、按节点保存的属性；其余属性在同类节点间共享
+NAME_ATTRIBUTES = (ua.AttributeIds.BrowseName, ua.AttributeIds.DisplayName, ua.AttributeIds.Description)
+NODE_ATTRIBUTES = frozenset(NAME_ATTRIBUTES + (ua.AttributeIds.NodeId, ua.AttributeIds.Value))
+
+# 恢复的属性值共用的状态码，地址空间只替换不修改状态码对象
+STATUS_GOOD = ua.StatusCode(ua.StatusCodes.Good)
+
+
+def snapshot_path(server_id):
+    return SNAPSHOT_DIR / f'server_{server_id}.snapshot'
+
+
+def compute_checksum(server_config):
+    """根据数据库中的服务器和节点配置计算校验和
+
+    包括影响地址空间和更新周期的服务器字段、模板的更新时间，以及服务器全部节点的
+    配置和已保存的值。快照保存后这些数据有任何变化，快照即失效。
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    template_updated_at = None
+    if server_config.template_id:
+        template_updated_at = NodeTemplate.objects.filter(id=server_config.template_id) \
+            .values_list('updated_at', flat=True).first()
+    digest.update(repr((
+        SNAPSHOT_VERSION, OPCUA_VERSION,
+        server_config.name, server_config.uri, server_config.min_sampling_interval, server_config.fault_config,
+        server_config.template_id, template_updated_at,
+    )).encode('utf-8'))
+    rows = Node.objects.filter(server_id=server_config.id).order_by('id').values_list('id', *NODE_CONFIG_FIELDS)
+    for row in rows.iterator(chunk_size=CHECKSUM_CHUNK_SIZE):
+        digest.update(repr(row).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _node_layout(nodedata, parent_ref):
+    """提取节点的结构：(结构键, (共享属性, 节点引用, 父节点引用模板))
+
+    节点按opcua add_variable/add_object 创建时，只有NodeId、名称和值因节点而异，
+    其余属性已由 share_constant_attributes 共享，引用只指向父节点和类型定义。
+    不符合这种结构的节点返回None，按原样保存。
+    """
+    attributes = nodedata.attributes
+    if parent_ref is None or any(attr not in attributes for attr in NAME_ATTRIBUTES):
+        return None
+    name = attributes[ua.AttributeIds.BrowseName].value.Value.Value
+    for attr in NAME_ATTRIBUTES[1:]:
+        text = attributes[attr].value.Value.Value
+        if text.Text != name.Name or text.Locale is not None:
+            return None
+    constants = []
+    for attr, attval in attributes.items():
+        if attr in NODE_ATTRIBUTES:
+            continue
+        if attr not in SHARED_ATTRIBUTES:
+            return None
+        constants.append((attr, attval.value))
+    references = nodedata.references
+    key = (
+        name.NamespaceIndex, ua.AttributeIds.Value in attributes,
+        tuple((attr, id(value)) for attr, value in constants),
+        tuple((ref.ReferenceTypeId, ref.IsForward, ref.NodeId, ref.NodeClass, ref.TypeDefinition) for ref in references),
+        parent_ref.ReferenceTypeId, parent_ref.NodeClass, parent_ref.TypeDefinition,
+    )
+    return key, (constants, list(references), parent_ref)
+
+
+def _build_node(nodeid, namespace_index, name, value, layout):
+    """按结构创建节点数据，返回 (NodeData, 父节点指向该节点的引用)"""
+    constants, references, parent_template = layout
+    qualified_name = ua.QualifiedName(name, namespace_index)
+    text = ua.LocalizedText(name)
+    text_value = ua.DataValue(ua.Variant(text, ua.VariantType.LocalizedText), STATUS_GOOD)
+
+    nodedata = NodeData(nodeid)
+    attributes = {attr: AttributeValue(datavalue) for attr, datavalue in constants}
+    attributes[ua.AttributeIds.NodeId] = AttributeValue(
+        ua.DataValue(ua.Variant(nodeid, ua.VariantType.NodeId), STATUS_GOOD))
+    attributes[ua.AttributeIds.BrowseName] = AttributeValue(
+        ua.DataValue(ua.Variant(qualified_name, ua.VariantType.QualifiedName), STATUS_GOOD))
+    attributes[ua.AttributeIds.DisplayName] = AttributeValue(text_value)
+    attributes[ua.AttributeIds.Description] = AttributeValue(text_value)
+    if value is not None:
+        attributes[ua.AttributeIds.Value] = AttributeValue(
+            ua.DataValue(ua.Variant(value[0], value[1]), value[3], sourceTimestamp=value[2]))
+    nodedata.attributes = attributes
+    nodedata.references = list(references)  # 引用对象只读，可以共享
+
+    ref = ua.ReferenceDescription()
+    ref.ReferenceTypeId = parent_template.ReferenceTypeId
+    ref.IsForward = True
+    ref.NodeId = nodeid
+    ref.BrowseName = qualified_name
+    ref.DisplayName = text
+    ref.NodeClass = parent_template.NodeClass
+    ref.TypeDefinition = parent_template.TypeDefinition
+    return nodedata, ref
+
+
+def save_snapshot(instance):
+    """服务器停止后保存节点的地址空间结构和运行时记录
+
+    同类节点的共享属性和引用只保存一份，每个节点只保存运行时记录、名称和当前值，
+    加载时直接构造地址空间对象，不经过opcua逐个添加节点的流程。
+    """
+    start = time.perf_counter()
+    checksum = compute_checksum(instance.config)
+    aspace = instance.server.iserver.aspace
+    with instance.nodes_lock, aspace._lock:
+        root = aspace._nodes[instance.root.nodeid]
+        parent_refs = {ref.NodeId: ref for ref in root.references if ref.IsForward}
+        layout_index = {}  # 结构键 -> layouts中的位置
+        layouts = []
+        nodes = []  # (记录, 结构位置, 名称, (值, 变体类型, 源时间戳, 状态码))
+        raw_nodes = []  # (记录, 属性值, 引用, 父节点引用)，结构不规则的节点
+        for record in instance.nodes.values():
+            nodedata = aspace._nodes.get(record.nodeid)
+            if nodedata is None:
+                continue
+            parent_ref = parent_refs.get(record.nodeid)
+            layout = _node_layout(nodedata, parent_ref)
+            if layout is None:
+                # 只保存属性值，订阅回调等运行状态不保存
+                attributes = {attr: attval.value for attr, attval in nodedata.attributes.items()}
+                raw_nodes.append((record, attributes, nodedata.references, parent_ref))
+                continue
+            key, layout = layout
+            index = layout_index.get(key)
+            if index is None:
+                index = layout_index[key] = len(layouts)
+                layouts.append(layout)
+            value = nodedata.attributes.get(ua.AttributeIds.Value)
+            if value is not None:
+                datavalue = value.value
+                value = (datavalue.Value.Value, datavalue.Value.VariantType, datavalue.SourceTimestamp,
+                         STATUS_GOOD if datavalue.StatusCode.value == ua.StatusCodes.Good else datavalue.StatusCode)
+            name = nodedata.attributes[ua.AttributeIds.BrowseName].value.Value.Value.Name
+            nodes.append((record, index, name, value))
+        payload = {
+            'checksum': checksum,
+            'idx': instance.idx,
+            'root': instance.root.nodeid,
+            'layouts': layouts,
+            'nodes': nodes,
+            'raw_nodes': raw_nodes,
+            'saved_at': time.time(),
+        }
+        data = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+
+    SNAPSHOT_DIR.mkdir(exist_ok=True)
+    atomic_write_bytes(snapshot_path(instance.config.id),
+                       SNAPSHOT_MAGIC + SNAPSHOT_VERSION.to_bytes(4, 'little') + data)
+    logger.info(f"Saved snapshot of server {instance.config.name} with {len(nodes) + len(raw_nodes)} nodes "
+                f"({len(layouts)} layouts, {len(data) // 1024} KB) in {time.perf_counter() - start:.2f}s")
+
+
+def _read_payload(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    header_size = len(SNAPSHOT_MAGIC) + 4
+    if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError("文件头无效")
+    file_version = int.from_bytes(data[len(SNAPSHOT_MAGIC):header_size], 'little')
+    if file_version != SNAPSHOT_VERSION:
+        raise ValueError(f"快照版本 {file_version} 与当前版本 {SNAPSHOT_VERSION} 不一致")
+    return pickle.loads(memoryview(data)[header_size:])
+
+
+def load_snapshot(instance, shared_attributes):
+    """从快照恢复节点，成功时返回恢复的节点数，快照不存在或已失效时返回None
+
+    必须在加载任何节点之前调用。快照读取后即删除，服务器异常退出后不会再次使用。
+    """
+    path = snapshot_path(instance.config.id)
+    if not path.exists():
+        return None
+    start = time.perf_counter()
+    try:
+        payload = _read_payload(path)
+        if payload['idx'] != instance.idx or payload['root'] != instance.root.nodeid:
+            raise ValueError("地址空间结构不一致")
+        if payload['checksum'] != compute_checksum(instance.config):
+            raise ValueError("数据库中的节点配置已变化")
+    except Exception as e:
+        logger.info(f"Snapshot of server {instance.config.name} discarded: {e}")
+        discard_snapshot(instance.config.id)
+        return None
+
+    # 共享属性与其他服务器的节点共用同一组对象
+    layouts = [
+        ([(attr, shared_value(attr, datavalue, shared_attributes)) for attr, datavalue in constants], references, parent)
+        for constants, references, parent in payload['layouts']
+    ]
+
+    aspace = instance.server.iserver.aspace
+    idx = instance.idx
+    records = {}
+    with aspace._lock:
+        root_references = aspace._nodes[instance.root.nodeid].references
+        for record, index, name, value in payload['nodes']:
+            nodedata, parent_ref = _build_node(record.nodeid, idx, name, value, layouts[index])
+            aspace._nodes[record.nodeid] = nodedata
+            root_references.append(parent_ref)
+            records[record.key] = record
+        for record, attributes, references, parent_ref in payload['raw_nodes']:
+            nodedata = NodeData(record.nodeid)
+            nodedata.attributes = {attr: AttributeValue(value) for attr, value in attributes.items()}
+            nodedata.references = references
+            aspace._nodes[record.nodeid] = nodedata
+            if parent_ref is not None:
+                root_references.append(parent_ref)
+            records[record.key] = record
+        # 之后新建的节点从恢复的最大编号之后分配NodeId
+        max_identifier = max((record.nodeid.Identifier for record in records.values()
+                              if record.nodeid.NamespaceIndex == idx and isinstance(record.nodeid.Identifier, int)),
+                             default=0)
+        if max_identifier > aspace._nodeid_counter.get(idx, 0):
+            aspace._nodeid_counter[idx] = max_identifier
+    _share_template_params(instance, records)
+    with instance.nodes_lock:
+        instance.nodes.update(records)
+
+    discard_snapshot(instance.config.id)
+    logger.info(f"Restored server {instance.config.name} from snapshot with {len(records)} nodes "
+                f"in {time.perf_counter() - start:.2f}s")
+    return len(records)
+
+
+def _share_template_params(instance, records):
+    """恢复的模板节点记录改用与其他服务器共享的参数对象，替换快照中反序列化出的副本"""
+    if not instance.config.template_id:
+        return
+    for template_node in get_template_nodes(instance.config.template_id):
+        record = records.get(template_node.runtime_key)
+        if record is not None:
+            record.params = instance._node_params(template_node)
+
+
+def discard_snapshot(server_id):
+    try:
+        os.unlink(snapshot_path(server_id))
+    except FileNotFoundError:
+        pass
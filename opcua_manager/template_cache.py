@@ -0,0 +1,86 @@
+import threading
+from .models import NodeTemplate, TemplateNode, NODE_CONFIG_FIELDS
+from .node_runtime import NodeParams
+
+_cache = {}  # 模板id -> (模板更新时间, 模板节点元组)
+_params = {}  # (模板节点id, 服务器故障默认配置) -> (模板节点对象, NodeParams)
+_lock = threading.Lock()
+
+
+def get_template_nodes(template_id):
+    """获取模板节点配置
+
+    同一模板只加载一次，引用该模板的服务器实例加载节点时都从这里读取，不再逐个查询数据库；
+    模板更新时间变化后重新加载。
+    """
+    updated_at = NodeTemplate.objects.filter(id=template_id).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return ()
+    with _lock:
+        cached = _cache.get(template_id)
+        if cached is not None and cached[0] == updated_at:
+            return cached[1]
+    nodes = tuple(TemplateNode.objects.filter(template_id=template_id).order_by('id'))
+    if cached is not None:
+        # 在其他进程中修改的模板：配置未变的节点沿用原来的对象，已创建的参数继续共享
+        previous = {node.id: node for node in cached[1]}
+        nodes = tuple(_unchanged(previous.get(node.id), node) or node for node in nodes)
+    with _lock:
+        if cached is not None:
+            kept = {id(node) for node in nodes}
+            _drop_params(node.id for node in cached[1] if id(node) not in kept)
+        _cache[template_id] = (updated_at, nodes)
+    return nodes
+
+
+def _unchanged(previous, node):
+    """previous与node配置相同时返回previous"""
+    if previous is not None and all(getattr(previous, field) == getattr(node, field) for field in NODE_CONFIG_FIELDS):
+        return previous
+    return None
+
+
+def get_template_params(template_node, server_faults):
+    """获取模板节点的运行参数
+
+    使用同一模板、故障注入默认配置相同的服务器共用同一个不可变的NodeParams，
+    各服务器的运行时记录只保存自己的值和状态。
+    """
+    key = (template_node.id, tuple(sorted(server_faults.items())))
+    with _lock:
+        cached = _params.get(key)
+    # 只有由同一个模板节点对象创建的参数才能沿用，避免数据库重用id时取到已删除节点的参数
+    if cached is not None and cached[0] is template_node:
+        return cached[1]
+    params = NodeParams(template_node, server_faults)
+    with _lock:
+        cached = _params.get(key)
+        if cached is not None and cached[0] is template_node:
+            return cached[1]
+        _params[key] = (template_node, params)
+    return params
+
+
+def set_template_nodes(template_id, updated_at, nodes, changed=()):
+    """模板修改后更新缓存，未变化的节点沿用原来的对象和参数
+
+    changed为修改或删除的模板节点id，这些节点的参数在下次获取时按新配置重新创建。
+    """
+    with _lock:
+        _cache[template_id] = (updated_at, tuple(nodes))
+        _drop_params(changed)
+
+
+def invalidate(template_id):
+    with _lock:
+        cached = _cache.pop(template_id, None)
+        if cached is not None:
+            _drop_params(node.id for node in cached[1])
+
+
+def _drop_params(node_ids):
+    """丢弃模板节点的参数，调用时需持有_lock"""
+    node_ids = set(node_ids)
+    if node_ids:
+        for key in [key for key in _params if key[0] in node_ids]:
+            del _params[key]
@@ -1,3 +1,1244 @@
-from django.test import TestCase
+import json
+import tempfile
+from pathlib import Path
+from django.test import TestCase, TransactionTestCase
+from opcua import ua
+from .models import OpcServer, Node
+from .value_store import value_store, ValueStore
 
-# Create your tests here.
+
+def create_server(name='Test Server', port=4840, **fields):
+    return OpcServer.objects.create(name=name, endpoint='127.0.0.1', port=port,
+                                    uri=f'urn:test:{name}', **fields)
+
+
+def register_instance(test, server):
+    """加载服务器的节点并注册为运行中的实例，不启动网络端点，测试结束时注销"""
+    from . import server_registry
+    from .opcua_server import OpcUaServer
+
+    instance = OpcUaServer(server)
+    instance._load_nodes()
+    instance.running = True
+    server_registry.register(server.id, instance)
+    test.addCleanup(server_registry.unregister, server.id)
+    OpcServer.objects.filter(id=server.id).update(is_running=True)
+    return instance
+
+
+class TempValueStoreMixin:
+    """测试期间把运行时值存储换成临时文件，不修改项目目录中的存储"""
+
+    def setUp(self):
+        super().setUp()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        previous = value_store._wrapped
+        value_store._wrapped = ValueStore(Path(tmp_dir.name) / 'runtime_values.sqlite3')
+        self.addCleanup(setattr, value_store, '_wrapped', previous)
+
+
+class TempSnapshotDirMixin:
+    """测试期间把快照目录换成临时目录，不读取或删除项目目录中的快照"""
+
+    def setUp(self):
+        super().setUp()
+        from unittest import mock
+        from . import snapshot
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        patcher = mock.patch.object(snapshot, 'SNAPSHOT_DIR', Path(tmp_dir.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+def free_port():
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class NodeSet2RoundTripTests(TestCase):
+    """导出的NodeSet2再导入同一服务器时节点ID保持不变"""
+
+    def setUp(self):
+        self.server = create_server()
+        Node.objects.create(server=self.server, name='Temperature', node_id='temp1', node_type='variable',
+                            data_type='double', value='21.5')
+        Node.objects.create(server=self.server, name='Counter', node_id='ns=2;i=5', node_type='variable',
+                            data_type='int32', value='3')
+        Node.objects.create(server=self.server, name='Line', node_id='ns=1;s=ns=2;s=Line', node_type='object',
+                            data_type='string')
+
+    def _export(self):
+        response = self.client.get(f'/server/{self.server.id}/nodeset2/export/')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_reimport_into_same_server_creates_no_duplicates(self):
+        exported = self._export()
+        response = self.client.post(f'/server/{self.server.id}/nodeset2/import/', exported,
+                                    content_type='application/xml')
+        result = response.json()
+        self.assertTrue(result['success'], result.get('error'))
+        self.assertEqual(result['result'], {'created': 0, 'skipped': 3})
+        self.assertEqual(sorted(self.server.nodes.values_list('node_id', flat=True)),
+                         ['ns=1;s=ns=2;s=Line', 'ns=2;i=5', 'temp1'])
+
+    def test_reimport_into_new_server_keeps_node_ids(self):
+        exported = self._export()
+        target = create_server('Target', 4841)
+        response = self.client.post(f'/server/{target.id}/nodeset2/import/', exported,
+                                    content_type='application/xml')
+        self.assertEqual(response.json()['result']['created'], 3)
+        imported = {node.node_id: node for node in target.nodes.all()}
+        self.assertEqual(set(imported), {'temp1', 'ns=2;i=5', 'ns=1;s=ns=2;s=Line'})
+        self.assertEqual(imported['temp1'].data_type, 'double')
+        self.assertEqual(imported['temp1'].value, '21.5')
+
+
+class BulkInsertNodesTests(TestCase):
+    """bulk_insert_nodes 与模型保存一样转换字段值"""
+
+    def test_values_are_prepared_like_model_save(self):
+        from .fleet import _node_rows
+        from .node_batch import bulk_insert_nodes
+
+        server = create_server()
+        rows = _node_rows([{
+            'id': 7, 'name': 'Flow', 'node_id': 'flow', 'node_type': 'variable', 'data_type': 'double',
+            'value': 1.5, 'variation_type': 'random', 'variation_min': '2.5', 'variation_max': 10,
+            'fault_config': {'bad': 0.1}, 'deadband_absolute': None, 'deadband_percent': '5',
+            'generator_config': [{'type': 'noise', 'sigma': 0.5}],
+        }])
+        self.assertEqual(bulk_insert_nodes((server.id, row) for row in rows), 1)
+
+        node = Node.objects.get(server=server, node_id='flow')
+        self.assertEqual(node.value, '1.5')
+        self.assertEqual(node.variation_min, 2.5)
+        self.assertEqual(node.deadband_absolute, 0)
+        self.assertEqual(node.deadband_percent, 5.0)
+        self.assertEqual(node.write_policy, 'resume')
+        self.assertEqual(json.loads(node.fault_config), {'bad': 0.1})
+        self.assertEqual(json.loads(node.generator_config), [{'type': 'noise', 'sigma': 0.5}])
+        self.assertIsNotNone(node.created_at)
+
+
+class TemplateOverrideTests(TempValueStoreMixin, TestCase):
+    """服务器自己的节点覆盖node_id相同的模板节点"""
+
+    def setUp(self):
+        super().setUp()
+        from .node_templates import create_template
+
+        self.template = create_template('Line', nodes=[
+            {'name': 'Temperature', 'node_id': 'temp1', 'node_type': 'variable', 'data_type': 'double',
+             'value': '1', 'priority': 1},
+            {'name': 'Pressure', 'node_id': 'pressure', 'node_type': 'variable', 'data_type': 'double',
+             'value': '2'},
+        ])
+        self.server = create_server(template=self.template)
+        self.own = Node.objects.create(server=self.server, name='Temperature', node_id='temp1',
+                                       node_type='variable', data_type='double', value='5', priority=3)
+
+    def test_effective_nodes_prefer_own_rows(self):
+        from .node_templates import iter_effective_nodes
+
+        nodes = {node['node_id']: node for node in iter_effective_nodes(self.server)}
+        self.assertEqual(set(nodes), {'temp1', 'pressure'})
+        self.assertEqual((nodes['temp1']['value'], nodes['temp1']['priority']), ('5', 3))
+        self.assertEqual(nodes['pressure']['value'], '2')
+
+    def test_running_instance_loads_override_instead_of_template_node(self):
+        from .opcua_server import OpcUaServer
+        from .models import TemplateNode
+
+        pressure = TemplateNode.objects.get(template=self.template, node_id='pressure')
+        instance = OpcUaServer(self.server)
+        instance._load_nodes()
+        self.assertEqual(set(instance.nodes), {self.own.id, -pressure.id})
+        self.assertTrue(instance.nodes[self.own.id].params.persist)
+        self.assertFalse(instance.nodes[-pressure.id].params.persist)
+        self.assertEqual(instance.nodes[self.own.id].params.priority, 3)
+        ids, values, _, _, _ = instance.read_values()
+        self.assertEqual(dict(zip(ids, values)), {self.own.id: 5.0, -pressure.id: 2.0})
+
+    def test_template_params_are_shared_between_servers(self):
+        from .models import TemplateNode
+        from .node_templates import update_template_nodes
+
+        pressure = TemplateNode.objects.get(template=self.template, node_id='pressure')
+        temp1 = TemplateNode.objects.get(template=self.template, node_id='temp1')
+        other = register_instance(self, create_server('Other', 4841, template=self.template))
+        own = register_instance(self, self.server)
+        self.assertIsNot(own.nodes[-pressure.id], other.nodes[-pressure.id])
+        self.assertIs(own.nodes[-pressure.id].params, other.nodes[-pressure.id].params)
+        self.assertFalse(other.nodes[-temp1.id].params.persist)
+        with self.assertRaises(AttributeError):
+            own.nodes[-pressure.id].params.priority = 5
+
+        # 修改的模板节点换成新的共享参数，未修改的节点沿用原来的参数
+        previous = other.nodes[-pressure.id].params
+        unchanged = other.nodes[-temp1.id].params
+        result = update_template_nodes(self.template, [
+            {'name': 'Pressure', 'node_id': 'pressure', 'node_type': 'variable', 'data_type': 'double',
+             'value': '2', 'priority': 7},
+        ], mode='merge')
+        self.assertEqual(result['hot_applied'], 2)
+        params = own.nodes[-pressure.id].params
+        self.assertIsNot(params, previous)
+        self.assertEqual(params.priority, 7)
+        self.assertIs(other.nodes[-pressure.id].params, params)
+        self.assertIs(other.nodes[-temp1.id].params, unchanged)
+
+
+class EditNodeValueTests(TempValueStoreMixin, TestCase):
+    """在界面中修改节点值：写入运行时值存储，服务器运行中时同步更新地址空间"""
+
+    def setUp(self):
+        super().setUp()
+        self.server = create_server()
+        self.node = Node.objects.create(server=self.server, name='Counter', node_id='counter', node_type='variable',
+                                        data_type='double', value='0', variation_type='increment',
+                                        variation_step=1, variation_max=1000)
+        value_store.write(self.server.id, [(self.node.id, 13.0, 1000.0, 0)])
+
+    def _edit(self, **fields):
+        response = self.client.post(f'/node/{self.node.id}/edit/', json.dumps(fields), content_type='application/json')
+        result = response.json()
+        self.assertTrue(result['success'], result.get('error'))
+
+    def _listed_value(self):
+        nodes = self.client.get(f'/node/list/?server_id={self.server.id}').json()['nodes']
+        return nodes[0]['value']
+
+    def test_stopped_server_uses_edited_value(self):
+        from .opcua_server import OpcUaServer
+
+        self.assertEqual(self._listed_value(), '13.0')
+        self._edit(value='500')
+        self.assertEqual(self._listed_value(), '500')
+
+        instance = OpcUaServer(self.server)
+        instance._load_nodes()
+        self.assertEqual(instance.read_values([self.node.id])[1], [500.0])
+
+    def test_running_server_applies_edited_value(self):
+        instance = self._running_instance()
+        self._edit(value=500)
+        record = instance.nodes[self.node.id]
+        self.assertEqual(record.value, 500.0)
+        self.assertEqual(instance.read_values([self.node.id])[1], [500.0])
+        self.assertEqual(value_store.read_node(self.server.id, self.node.id)[0], 500.0)
+        self.assertEqual(self._listed_value(), '500.0')
+
+    def test_unchanged_value_is_not_reapplied(self):
+        instance = self._running_instance()
+        instance.nodes[self.node.id].value = 17.0
+        self._edit(value='13.0', description='编辑描述', variation_step=2)
+        record = instance.nodes[self.node.id]
+        self.assertEqual(record.value, 17.0)
+        self.assertEqual(record.params.variation_step, 2)
+
+    def _running_instance(self):
+        return register_instance(self, self.server)
+
+
+class ClientWriteRaceTests(TempValueStoreMixin, TestCase):
+    """客户端写入排队后、下个更新周期前，操作员在界面中修改了节点值"""
+
+    def setUp(self):
+        super().setUp()
+        from opcua import ua
+        from .opcua_server import TrackedSession
+
+        self.server = create_server()
+        self.node = Node.objects.create(server=self.server, name='Setpoint', node_id='sp', node_type='variable',
+                                        data_type='double', value='13', variation_type='increment',
+                                        variation_step=1, variation_max=1000, write_policy='override')
+        self.instance = register_instance(self, self.server)
+
+        iserver = self.instance.server.iserver
+        self.session = TrackedSession(iserver, iserver.aspace, iserver.subscription_service, 'client')
+        self.ua = ua
+
+    def _client_write(self, value):
+        ua = self.ua
+        write = ua.WriteValue()
+        write.NodeId = self.instance.nodes[self.node.id].nodeid
+        write.AttributeId = ua.AttributeIds.Value
+        write.Value = ua.DataValue(ua.Variant(value, ua.VariantType.Double))
+        params = ua.WriteParameters()
+        params.NodesToWrite = [write]
+        self.assertTrue(self.session.write(params)[0].is_good())
+
+    def _operator_edit(self, value):
+        response = self.client.post(f'/node/{self.node.id}/edit/', json.dumps({'value': value}),
+                                    content_type='application/json')
+        self.assertTrue(response.json()['success'])
+
+    def _published(self):
+        return self.instance.read_values([self.node.id])[1][0]
+
+    def test_operator_edit_wins_over_earlier_queued_write(self):
+        import time
+
+        self._client_write(42.0)
+        self._operator_edit('500')
+        self.assertEqual(value_store.read_node(self.server.id, self.node.id)[0], 500.0)
+
+        self.instance._tick(time.time())
+        # 修改解除了override策略的停止，变化从修改的值继续
+        self.assertEqual(self._published(), 501.0)
+        self.assertEqual(self.instance.nodes[self.node.id].value, 501.0)
+
+    def test_write_after_operator_edit_wins(self):
+        import math
+        import time
+
+        self._operator_edit('500')
+        self._client_write(42.0)
+        self.instance._tick(time.time())
+        self.assertEqual(self._published(), 42.0)
+        self.assertEqual(self.instance.nodes[self.node.id].next_due, math.inf)
+
+
+class ScenarioRampTests(TempValueStoreMixin, TestCase):
+    """场景中的线性变化"""
+
+    def setUp(self):
+        super().setUp()
+        from .opcua_server import OpcUaServer
+
+        self.server = create_server()
+        self.pressure = Node.objects.create(server=self.server, name='Pressure', node_id='Line2.Pressure',
+                                            node_type='variable', data_type='double', value='5')
+        self.label = Node.objects.create(server=self.server, name='Label', node_id='Line2.Label',
+                                         node_type='variable', data_type='string', value='pump')
+        self.instance = OpcUaServer(self.server)
+        self.instance._load_nodes()
+
+    def _start(self, definition):
+        from .models import Scenario
+
+        scenario = Scenario.objects.create(server=self.server, name='ramp', definition=json.dumps(definition))
+        self.instance.start_scenario(scenario)
+        return self.instance.scenarios[scenario.id].started_at
+
+    def _published(self, node):
+        return self.instance.read_values([node.id])[1][0]
+
+    def test_ramp_static_node(self):
+        start = self._start([
+            {'at': 0, 'select': {'pattern': 'Line2.*'}, 'action': 'ramp', 'target': 8, 'duration': 1},
+        ])
+        self.instance._tick(start + 0.5)
+        self.assertAlmostEqual(self._published(self.pressure), 6.5)
+        self.instance._tick(start + 1.5)
+        self.assertEqual(self._published(self.pressure), 8.0)
+        self.assertEqual(self.instance.nodes[self.pressure.id].value, 8.0)
+        # 非数值节点不参与线性变化
+        self.assertEqual(self._published(self.label), 'pump')
+        self.assertFalse(self.instance.scenarios)
+
+    def test_set_and_ramp_per_type_group(self):
+        count = Node.objects.create(server=self.server, name='Count', node_id='Line2.Count',
+                                    node_type='variable', data_type='int32', value='2')
+        self.instance.apply_node_changes(added=[count])
+        start = self._start([
+            {'at': 0, 'select': {'pattern': 'Line2.*'}, 'action': 'set', 'value': '7'},
+            {'at': 1, 'select': {'pattern': 'Line2.*'}, 'action': 'ramp', 'target': 11, 'duration': 1},
+        ])
+        self.instance._tick(start)
+        # 同一个值按各组的变体类型分别转换
+        self.assertEqual(self._published(self.pressure), 7.0)
+        self.assertEqual(self._published(count), 7)
+        self.assertEqual(self._published(self.label), '7')
+        self.instance._tick(start + 1.5)
+        self.assertAlmostEqual(self._published(self.pressure), 9.0)
+        self.assertEqual(self._published(count), 9)
+        self.assertIsInstance(self.instance.nodes[count.id].value, int)
+        # 字符串节点的值能转换为数值时也参与线性变化，发布时转换回字符串
+        self.assertEqual(self._published(self.label), '9.0')
+
+
+class MetricsTests(TempValueStoreMixin, TestCase):
+    """/metrics 导出更新线程维护的计数器"""
+
+    def setUp(self):
+        super().setUp()
+        self.server = create_server()
+        for i in range(3):
+            Node.objects.create(server=self.server, name=f'Counter{i}', node_id=f'c{i}', node_type='variable',
+                                data_type='double', value='0', variation_type='increment', variation_step=1)
+        self.instance = register_instance(self, self.server)
+
+    def test_tick_and_flush_counters(self):
+        import time
+
+        now = time.time()
+        updated = self.instance._tick(now)
+        self.instance._flush_values(self.instance._dirty_nodes, now)
+        self.instance.metrics.observe_tick(0.0, 0.3, updated, self.instance.tick_interval)
+
+        text = self.client.get('/metrics').content.decode()
+        labels = f'server_id="{self.server.id}",server="Test Server"'
+        self.assertIn(f'opcua_nodes_updated_total{{{labels}}} 3', text)
+        self.assertIn(f'opcua_last_flush_size{{{labels}}} 3', text)
+        self.assertIn(f'opcua_db_flush_duration_seconds_count{{{labels}}} 1', text)
+        self.assertIn(f'opcua_tick_overruns_total{{{labels}}} 1', text)
+        self.assertIn(f'opcua_tick_duration_seconds_bucket{{{labels},le="0.25"}} 0', text)
+        self.assertIn(f'opcua_tick_duration_seconds_bucket{{{labels},le="0.5"}} 1', text)
+        self.assertIn(f'opcua_sessions{{{labels}}} 0', text)
+
+
+def _busy_update_loop(stop_event):
+    while not stop_event.is_set():
+        sum(range(1000))
+
+
+class ProfilerTests(TestCase):
+    """对运行中线程的调用栈采样"""
+
+    def test_collapsed_stacks_of_running_thread(self):
+        import threading
+        from .profiler import profile_thread
+
+        stop_event = threading.Event()
+        thread = threading.Thread(target=_busy_update_loop, args=(stop_event,))
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(stop_event.set)
+
+        sampler = profile_thread(thread, 0.2, interval=0.002)
+        self.assertGreater(sampler.sample_count, 0)
+        lines = sampler.collapsed().splitlines()
+        self.assertEqual(sum(int(line.rsplit(' ', 1)[1]) for line in lines), sampler.sample_count)
+        # 折叠栈由根到叶，以分号分隔
+        self.assertTrue(all(line.startswith('_bootstrap (threading.py:') for line in lines))
+        self.assertTrue(any(';_busy_update_loop (tests.py:' in line for line in lines))
+
+    def test_stopped_thread_is_rejected(self):
+        import threading
+        from .profiler import profile_thread
+
+        thread = threading.Thread(target=lambda: None)
+        thread.start()
+        thread.join()
+        with self.assertRaises(ValueError):
+            profile_thread(thread, 1)
+
+
+class OverloadPolicyTests(TempValueStoreMixin, TestCase):
+    """更新周期过载时的处理策略"""
+
+    def test_shed_drops_lowest_priority_records(self):
+        from .overload import OverloadController
+
+        controller = OverloadController('shed', 0.1)
+        controller.node_cost = 0.1 * 0.9 / 3  # 每个周期只能更新3个节点
+        due = [('a', 0), ('b', 5), ('c', 1), ('d', 9), ('e', 5)]
+        shed = controller.select(due, lambda item: item[1])
+        self.assertEqual(sorted(due), [('b', 5), ('d', 9), ('e', 5)])
+        self.assertEqual(sorted(shed), [('a', 0), ('c', 1)])
+        self.assertEqual((controller.last_shed, controller.shed_total), (2, 2))
+
+    def test_shed_keeps_all_records_within_capacity(self):
+        from .overload import OverloadController
+
+        controller = OverloadController('shed', 0.1)
+        controller.node_cost = 0.001
+        due = [('a', 0), ('b', 1)]
+        self.assertEqual(controller.select(due, lambda item: item[1]), ())
+        self.assertEqual(len(due), 2)
+        # 其他策略不丢弃节点
+        controller = OverloadController('stretch', 0.1)
+        controller.node_cost = 1.0
+        self.assertEqual(controller.select(due, lambda item: item[1]), ())
+
+    def test_stretch_factor_follows_load(self):
+        from .overload import OverloadController
+
+        controller = OverloadController('stretch', 0.1)
+        self.assertEqual(controller.stretch_factor, 1.0)
+        for _ in range(50):
+            controller.observe_tick(0.2, 10)
+        self.assertAlmostEqual(controller.stretch_factor, 2.0, places=3)
+        self.assertEqual(OverloadController('shed', 0.1).stretch_factor, 1.0)
+
+    def test_skip_stays_on_tick_grid(self):
+        from .overload import OverloadController
+
+        controller = OverloadController('skip', 0.1)
+        self.assertAlmostEqual(controller.next_tick(10.0, 10.05), 10.1)
+        # 落后2.5个周期：跳过3个周期，下一周期仍在原网格上
+        self.assertAlmostEqual(controller.next_tick(10.0, 10.35), 10.4)
+        self.assertEqual((controller.late_ticks, controller.skipped_ticks), (1, 3))
+        self.assertEqual(OverloadController('none', 0.1).next_tick(10.0, 10.35), 10.35)
+
+    def test_shed_report_of_running_server(self):
+        import time
+        from .opcua_server import OpcUaServer
+
+        server = create_server(overload_policy='shed')
+        low = Node.objects.create(server=server, name='Low', node_id='low', node_type='variable', data_type='double',
+                                  value='0', variation_type='increment', priority=0)
+        high = Node.objects.create(server=server, name='High', node_id='high', node_type='variable',
+                                   data_type='double', value='0', variation_type='increment', priority=10)
+        instance = OpcUaServer(server)
+        instance._load_nodes()
+        instance.overload.node_cost = instance.tick_interval  # 每个周期只能更新1个节点
+        self.assertEqual(instance._tick(time.time()), 1)
+        self.assertEqual(instance.read_values([low.id, high.id])[1], [0.0, 1.0])
+
+        report = instance.get_overload_report()
+        self.assertEqual(report['shed_nodes'], [{'id': low.id, 'name': 'Low', 'count': 1}])
+
+
+class AtomicNodeSetWriteTests(TestCase):
+    """节点集合与配置集的原子写入和并发修改"""
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.base_dir = Path(tmp_dir.name)
+
+    def test_failed_write_keeps_previous_file(self):
+        from .file_utils import atomic_write_bytes
+
+        path = self.base_dir / 'nodes.json'
+        atomic_write_bytes(path, b'[1]')
+        with self.assertRaises(TypeError):
+            atomic_write_bytes(path, '不是bytes')
+        self.assertEqual(path.read_bytes(), b'[1]')
+        self.assertEqual([item.name for item in self.base_dir.iterdir()], ['nodes.json'])
+
+    def test_concurrent_modifications_are_not_lost(self):
+        import threading
+        from django.test import override_settings
+        from .database_manager import DatabaseManager
+
+        with override_settings(BASE_DIR=self.base_dir):
+            manager = DatabaseManager()
+
+        def append(worker):
+            for i in range(20):
+                manager.modify_nodes(lambda nodes: nodes.append({'node_id': f'{worker}.{i}'}))
+
+        threads = [threading.Thread(target=append, args=(worker,)) for worker in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({node['node_id'] for node in manager.get_nodes()}), 160)
+
+    def test_corrupted_file_is_reported(self):
+        from django.test import override_settings
+        from .database_manager import DatabaseManager
+
+        with override_settings(BASE_DIR=self.base_dir):
+            manager = DatabaseManager()
+        (self.base_dir / 'databases' / 'default' / 'nodes.json').write_text('[{"node_id": ')
+        with self.assertRaises(ValueError):
+            manager.get_nodes()
+
+    def test_concurrent_node_set_adds(self):
+        import threading
+        from .node_set_store import NodeSetStore
+
+        (self.base_dir / 'set').mkdir()
+
+        def add(worker):
+            store = NodeSetStore(self.base_dir / 'set')
+            for i in range(10):
+                store.add([{'node_id': f'{worker}.{i}'}, {'node_id': 'shared'}])
+
+        threads = [threading.Thread(target=add, args=(worker,)) for worker in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        store = NodeSetStore(self.base_dir / 'set')
+        nodes = store.all()
+        self.assertEqual(store.count(), 61)
+        self.assertEqual(len(nodes), 61)
+        self.assertEqual([node['id'] for node in nodes], list(range(1, 62)))
+
+
+class ApplyNodeSetTests(TempValueStoreMixin, TestCase):
+    """把节点集合应用到服务器：replace、merge、diff三种模式"""
+
+    def setUp(self):
+        super().setUp()
+        self.server = create_server()
+        self.keep = Node.objects.create(server=self.server, name='Keep', node_id='keep', node_type='variable',
+                                        data_type='double', value='1')
+        self.change = Node.objects.create(server=self.server, name='Change', node_id='change', node_type='variable',
+                                          data_type='double', value='2', variation_type='none')
+        self.extra = Node.objects.create(server=self.server, name='Extra', node_id='extra', node_type='variable',
+                                         data_type='double', value='3')
+        self.set_nodes = [
+            {'name': 'Keep', 'node_id': 'keep', 'node_type': 'variable', 'data_type': 'double', 'value': '1'},
+            {'name': 'Change', 'node_id': 'change', 'node_type': 'variable', 'data_type': 'double', 'value': '2',
+             'variation_type': 'increment', 'variation_step': 5},
+            {'name': 'New', 'node_id': 'new', 'node_type': 'variable', 'data_type': 'double', 'value': '4'},
+        ]
+
+    def _apply(self, mode):
+        from .node_set_apply import apply_node_set
+
+        return apply_node_set(self.server, self.set_nodes, mode)
+
+    def test_diff_changes_nothing(self):
+        result = self._apply('diff')
+        self.assertEqual((result['created'], result['updated'], result['deleted'], result['unchanged']), (1, 1, 0, 1))
+        self.assertEqual(result['updated_node_ids'], ['change'])
+        self.assertEqual(set(self.server.nodes.values_list('node_id', flat=True)), {'keep', 'change', 'extra'})
+
+    def test_merge_keeps_other_nodes(self):
+        result = self._apply('merge')
+        self.assertEqual((result['created'], result['updated'], result['deleted']), (1, 1, 0))
+        self.assertEqual(set(self.server.nodes.values_list('node_id', flat=True)), {'keep', 'change', 'extra', 'new'})
+        self.change.refresh_from_db()
+        self.assertEqual((self.change.variation_type, self.change.variation_step), ('increment', 5))
+
+    def test_replace_hot_applies_to_running_server(self):
+        import time
+
+        instance = register_instance(self, self.server)
+        result = self._apply('replace')
+        self.assertEqual((result['created'], result['updated'], result['deleted']), (1, 1, 1))
+        self.assertTrue(result['hot_applied'])
+        self.assertEqual(set(self.server.nodes.values_list('node_id', flat=True)), {'keep', 'change', 'new'})
+
+        new = Node.objects.get(server=self.server, node_id='new')
+        self.assertEqual(set(instance.nodes), {self.keep.id, self.change.id, new.id})
+        instance._tick(time.time())
+        self.assertEqual(instance.read_values([self.change.id, new.id])[1], [7.0, 4.0])
+
+
+class ConfigTransferTests(TempValueStoreMixin, TestCase):
+    """服务器和节点配置的NDJSON/gzip导出与导入"""
+
+    def setUp(self):
+        super().setUp()
+        self.line1 = create_server('Line1', 4841, min_sampling_interval=50)
+        self.line2 = create_server('Line2', 4842, overload_policy='shed')
+        for i in range(3):
+            Node.objects.create(server=self.line1, name=f'Temp{i}', node_id=f'temp{i}', node_type='variable',
+                                data_type='double', value=str(i), variation_type='random', variation_min=0,
+                                variation_max=10, priority=i)
+        Node.objects.create(server=self.line2, name='Running', node_id='running', node_type='variable',
+                            data_type='boolean', value='true', fault_config='{"bad": 0.1}')
+
+    def _snapshot(self):
+        from .models import NODE_CONFIG_FIELDS, SERVER_CONFIG_FIELDS
+
+        return (sorted(OpcServer.objects.values_list(*SERVER_CONFIG_FIELDS)),
+                sorted(Node.objects.values_list('server__name', *NODE_CONFIG_FIELDS)))
+
+    def _export(self, export_format):
+        response = self.client.get(f'/server/export/?format={export_format}')
+        return b''.join(response.streaming_content)
+
+    def _import(self, data, overwrite=True):
+        from .config_transfer import import_config_file
+
+        fd, path = tempfile.mkstemp()
+        with open(fd, 'wb') as f:
+            f.write(data)
+        return import_config_file(path, overwrite=overwrite)
+
+    def test_gzip_round_trip_restores_servers_and_nodes(self):
+        import gzip
+
+        before = self._snapshot()
+        data = self._export('gzip')
+        lines = [json.loads(line) for line in gzip.decompress(data).decode('utf-8').splitlines()]
+        self.assertEqual([line['type'] for line in lines], ['header', 'server', 'node', 'node', 'node', 'server', 'node'])
+
+        OpcServer.objects.all().delete()
+        result = self._import(data)
+        self.assertEqual((result['servers_created'], result['nodes_created']), (2, 4))
+        self.assertEqual(self._snapshot(), before)
+
+    def test_ndjson_import_upserts_by_server_and_node_id(self):
+        data = self._export('ndjson')
+        Node.objects.filter(node_id='temp1').update(priority=9)
+        Node.objects.filter(node_id='temp2').delete()
+
+        result = self._import(data, overwrite=False)
+        self.assertEqual((result['nodes_created'], result['nodes_updated'], result['nodes_unchanged']), (1, 0, 3))
+        self.assertEqual(Node.objects.get(node_id='temp1').priority, 9)
+
+        result = self._import(data)
+        self.assertEqual((result['nodes_created'], result['nodes_updated'], result['nodes_unchanged']), (0, 1, 3))
+        self.assertEqual(Node.objects.get(node_id='temp1').priority, 1)
+        self.assertEqual(Node.objects.count(), 4)
+
+
+class BatchJobCancelTests(TestCase):
+    """批量启停任务的取消：开始执行前检查，已执行的操作照常报告"""
+
+    def setUp(self):
+        self.servers = [create_server(f'Server{i}', 4850 + i) for i in range(3)]
+
+    def test_late_cancel_reports_completed_work(self):
+        from .jobs import Job
+        from .server_lifecycle import stop_servers
+
+        class CancelAfterFirst(Job):
+            def update_progress(self, progress, total=None, message=None):
+                super().update_progress(progress, total, message)
+                self.cancel()
+
+        job = CancelAfterFirst('batch_stop')
+        summary = stop_servers([server.id for server in self.servers], max_workers=1, job=job)
+        self.assertEqual([result['status'] for result in summary['results']],
+                         ['not_running', 'cancelled', 'cancelled'])
+        self.assertIs(job.result, summary)
+
+    def test_cancel_before_any_work_cancels_job(self):
+        from .jobs import Job, JobCancelled
+        from .server_lifecycle import stop_servers
+
+        job = Job('batch_stop')
+        job.cancel()
+        with self.assertRaises(JobCancelled):
+            stop_servers([server.id for server in self.servers], job=job)
+        self.assertEqual({result['status'] for result in job.result['results']}, {'cancelled'})
+
+
+class BatchLifecycleTests(TempSnapshotDirMixin, TempValueStoreMixin, TransactionTestCase):
+    """批量启停经过实例注册表，批量启动的服务器可以被批量停止"""
+
+    def setUp(self):
+        super().setUp()
+        self.servers = [create_server(f'Batch{i}', free_port()) for i in range(3)]
+        for server in self.servers:
+            Node.objects.create(server=server, name='Counter', node_id='counter', node_type='variable',
+                                data_type='double', value='0', variation_type='increment')
+
+    def _post(self, url, data):
+        return self.client.post(url, json.dumps(data), content_type='application/json').json()
+
+    def test_batch_start_then_batch_stop(self):
+        from . import server_registry
+        from .opcua_server import OpcUaServer
+
+        server_ids = [server.id for server in self.servers]
+        for server_id in server_ids:
+            self.addCleanup(OpcUaServer.remove_instance, server_id)
+        result = self._post('/server/batch-start/', {'server_ids': server_ids + [999999], 'max_workers': 3})
+        self.assertTrue(result['success'])
+        statuses = {item['id']: item['status'] for item in result['results']}
+        self.assertEqual(statuses, {**{server_id: 'started' for server_id in server_ids}, 999999: 'failed'})
+        self.assertTrue(all(item['duration_ms'] >= 0 for item in result['results']))
+        self.assertTrue(all(server_registry.get_instance(server_id).running for server_id in server_ids))
+        self.assertEqual(OpcServer.objects.filter(is_running=True).count(), 3)
+
+        result = self._post('/server/batch-start/', {'server_ids': server_ids[:1]})
+        self.assertEqual(result['results'][0]['status'], 'already_running')
+
+        result = self._post('/server/batch-stop/', {'server_ids': server_ids})
+        self.assertEqual({item['status'] for item in result['results']}, {'stopped'})
+        self.assertEqual(server_registry.get_instances(), [])
+        self.assertFalse(OpcServer.objects.filter(is_running=True).exists())
+
+
+class PortAllocatorTests(TestCase):
+    """端口分配跳过已配置、已占用和近期分配出的端口"""
+
+    def setUp(self):
+        import socket
+        from .port_allocator import PortAllocator
+
+        self.allocator = PortAllocator()
+        self.addCleanup(self.allocator._executor.shutdown)
+        self.listener = socket.socket()
+        self.addCleanup(self.listener.close)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen()
+        self.start_port = self.listener.getsockname()[1]
+        create_server('Configured', self.start_port + 1)
+
+    def _allocate(self, count):
+        return self.allocator.allocate('127.0.0.1', count, start_port=self.start_port,
+                                       end_port=self.start_port + 40)
+
+    def test_probe_detects_listening_port(self):
+        from .port_allocator import probe_port
+
+        self.assertFalse(probe_port('127.0.0.1', self.start_port))
+        port = free_port()
+        self.assertTrue(probe_port('127.0.0.1', port))
+
+    def test_allocation_skips_used_and_reserved_ports(self):
+        first = self._allocate(3)
+        self.assertEqual(first, sorted(first))
+        self.assertEqual(len(set(first)), 3)
+        self.assertNotIn(self.start_port, first)  # 正在监听
+        self.assertNotIn(self.start_port + 1, first)  # 已被服务器配置使用
+
+        second = self._allocate(2)
+        self.assertFalse(set(first) & set(second))
+
+        self.allocator.release(first)
+        self.assertEqual(self._allocate(3), first)
+
+    def test_invalid_count_and_exhausted_range(self):
+        with self.assertRaises(ValueError):
+            self._allocate(0)
+        with self.assertRaises(ValueError):
+            self.allocator.allocate('127.0.0.1', 1, start_port=self.start_port, end_port=self.start_port + 1)
+
+
+class SnapshotTests(TempSnapshotDirMixin, TempValueStoreMixin, TestCase):
+    """停止时保存的快照在配置未变化时恢复，失效或损坏时丢弃"""
+
+    def setUp(self):
+        super().setUp()
+        from .node_templates import create_template
+
+        template = create_template('Snapshot', nodes=[
+            {'name': 'Pressure', 'node_id': 'pressure', 'node_type': 'variable', 'data_type': 'double',
+             'value': '2'},
+        ])
+        self.server = create_server(template=template)
+        self.counter = Node.objects.create(server=self.server, name='Counter', node_id='counter',
+                                           node_type='variable', data_type='double', value='0',
+                                           variation_type='increment')
+
+    def _save(self, value=41.0):
+        from .opcua_server import OpcUaServer
+        from .snapshot import save_snapshot
+
+        instance = OpcUaServer(self.server)
+        instance._load_nodes()
+        instance.write_values({self.counter.id: value}, persist=False)
+        save_snapshot(instance)
+        return instance
+
+    def _load(self):
+        from .opcua_server import OpcUaServer, _shared_attribute_values
+        from .snapshot import load_snapshot
+
+        instance = OpcUaServer(self.server)
+        return instance, load_snapshot(instance, _shared_attribute_values)
+
+    def test_restores_values_and_shared_template_params(self):
+        import time
+        from .snapshot import snapshot_path
+
+        saved = self._save()
+        instance, restored = self._load()
+        self.assertEqual(restored, 2)
+        self.assertFalse(snapshot_path(self.server.id).exists())
+        ids, values, _, _, _ = instance.read_values([self.counter.id])
+        self.assertEqual(values, [41.0])
+        template_key = next(key for key in instance.nodes if key < 0)
+        self.assertIs(instance.nodes[template_key].params, saved.nodes[template_key].params)
+        # 恢复的节点继续按配置变化
+        instance._tick(time.time())
+        self.assertEqual(instance.read_values([self.counter.id])[1], [42.0])
+
+    def test_changed_config_discards_snapshot(self):
+        from .snapshot import snapshot_path
+
+        self._save()
+        Node.objects.filter(id=self.counter.id).update(variation_step=5)
+        self.assertIsNone(self._load()[1])
+        self.assertFalse(snapshot_path(self.server.id).exists())
+
+    def test_corrupted_or_other_version_snapshot_is_discarded(self):
+        from .snapshot import snapshot_path, SNAPSHOT_MAGIC, SNAPSHOT_VERSION
+
+        path = snapshot_path(self.server.id)
+        for data in (
+            b'not a snapshot',
+            SNAPSHOT_MAGIC + (SNAPSHOT_VERSION - 1).to_bytes(4, 'little') + b'payload',
+            SNAPSHOT_MAGIC + SNAPSHOT_VERSION.to_bytes(4, 'little') + b'truncated pickle',
+        ):
+            self._save()
+            path.write_bytes(data)
+            instance, restored = self._load()
+            self.assertIsNone(restored)
+            self.assertFalse(path.exists())
+            self.assertEqual(instance.nodes, {})
+
+
+class RunnerNodeChangesTests(TempValueStoreMixin, TestCase):
+    """服务器由模拟器进程运行时，节点的修改通过控制命令同步到地址空间"""
+
+    def setUp(self):
+        super().setUp()
+        from unittest import mock
+        from . import node_changes
+        from .node_templates import create_template
+        from .simulator_runner import SimulatorRunner
+
+        template = create_template('Runner', nodes=[
+            {'name': 'Pressure', 'node_id': 'pressure', 'node_type': 'variable', 'data_type': 'double',
+             'value': '2'},
+        ])
+        self.server = create_server(template=template)
+        self.node = Node.objects.create(server=self.server, name='Counter', node_id='counter', node_type='variable',
+                                        data_type='double', value='0', priority=1)
+        self.instance = register_instance(self, self.server)
+        self.template = template
+
+        # 控制命令按JSON编码后交给模拟器进程的命令分发
+        runner = SimulatorRunner()
+        self.commands = []
+
+        def send_command(command, timeout=None, **params):
+            request = json.loads(json.dumps({'command': command, **params}))
+            self.commands.append(request)
+            return {'success': True, **runner.dispatch(request)}
+
+        for patcher in (mock.patch.object(node_changes, 'servers_are_remote', return_value=True),
+                        mock.patch.object(node_changes, 'send_command', send_command)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _post(self, url, data):
+        result = self.client.post(url, json.dumps(data), content_type='application/json').json()
+        self.assertTrue(result['success'], result.get('error'))
+        return result
+
+    def test_edit_and_delete_node(self):
+        self._post(f'/node/{self.node.id}/edit/', {'priority': 5, 'value': '7'})
+        self.assertEqual(self.commands[-1]['updated'], [[self.node.id, ['priority', 'value']]])
+        self.assertEqual(self.instance.nodes[self.node.id].params.priority, 5)
+        self.assertEqual(self.instance.read_values([self.node.id])[1], [7.0])
+
+        self._post(f'/node/{self.node.id}/delete/', {})
+        self.assertEqual(self.commands[-1]['removed'], [self.node.id])
+        self.assertNotIn(self.node.id, self.instance.nodes)
+
+    def test_node_set_and_template_changes(self):
+        from .node_set_apply import apply_node_set
+        from .node_templates import update_template_nodes
+
+        result = apply_node_set(self.server, [
+            {'name': 'Flow', 'node_id': 'flow', 'node_type': 'variable', 'data_type': 'double', 'value': '3'},
+            # 服务器节点覆盖node_id相同的模板节点
+            {'name': 'Pressure', 'node_id': 'pressure', 'node_type': 'variable', 'data_type': 'double',
+             'value': '9'},
+        ], mode='merge')
+        self.assertTrue(result['hot_applied'])
+        by_node_id = {record.params.node_id: key for key, record in self.instance.nodes.items()}
+        self.assertEqual(set(by_node_id), {'counter', 'flow', 'pressure'})
+        self.assertGreater(by_node_id['pressure'], 0)
+        self.assertEqual(self.instance.read_values([by_node_id['pressure']])[1], [9.0])
+
+        # 被覆盖的模板节点修改后不影响服务器节点，新增的模板节点同步添加
+        result = update_template_nodes(self.template, [
+            {'name': 'Pressure', 'node_id': 'pressure', 'node_type': 'variable', 'data_type': 'double',
+             'value': '2', 'priority': 4},
+            {'name': 'Level', 'node_id': 'level', 'node_type': 'variable', 'data_type': 'double', 'value': '1'},
+        ], mode='merge')
+        self.assertEqual(result['hot_applied'], 1)
+        by_node_id = {record.params.node_id: record for record in self.instance.nodes.values()}
+        self.assertEqual(set(by_node_id), {'counter', 'flow', 'pressure', 'level'})
+        self.assertTrue(by_node_id['pressure'].params.persist)
+        self.assertEqual(by_node_id['pressure'].params.priority, 0)
+        self.assertFalse(by_node_id['level'].params.persist)
+
+    def test_stopped_runner_server_is_not_applied(self):
+        from .node_changes import apply_live_changes
+
+        self.instance.running = False
+        self.assertFalse(apply_live_changes(self.server.id, updated=[(self.node, {'priority'})]))
+
+    def test_template_reload_keeps_unchanged_nodes(self):
+        from django.utils import timezone
+        from .models import NodeTemplate, TemplateNode
+        from .template_cache import get_template_nodes
+
+        # 其他进程修改了模板：新增一个节点
+        before = get_template_nodes(self.template.id)
+        TemplateNode.objects.create(template=self.template, name='Level', node_id='level', node_type='variable',
+                                    data_type='double', value='1')
+        NodeTemplate.objects.filter(id=self.template.id).update(updated_at=timezone.now())
+        after = get_template_nodes(self.template.id)
+        self.assertEqual(len(after), 2)
+        self.assertIs(after[0], before[0])
+
+
+class ValueStoreCleanupTests(TempValueStoreMixin, TestCase):
+    """删除节点时同时删除运行时值存储中保存的值，服务器未运行时也是如此"""
+
+    def setUp(self):
+        super().setUp()
+        from .node_templates import create_template
+
+        self.template = create_template('Cleanup', nodes=[
+            {'name': 'Pressure', 'node_id': 'pressure', 'node_type': 'variable', 'data_type': 'double',
+             'value': '2'},
+        ])
+        self.pressure = self.template.nodes.get()
+        self.server = create_server(template=self.template)
+        self.nodes = [Node.objects.create(server=self.server, name=name, node_id=name.lower(), node_type='variable',
+                                          data_type='double', value='0') for name in ('Flow', 'Level')]
+        value_store.write(self.server.id, [(node.id, 5.0, 1000.0, 0) for node in self.nodes] +
+                          [(self.pressure.runtime_key, 6.0, 1000.0, 0)])
+
+    def _stored_keys(self):
+        return set(value_store.read_server(self.server.id))
+
+    def test_delete_node_of_stopped_server(self):
+        result = self.client.post(f'/node/{self.nodes[0].id}/delete/').json()
+        self.assertTrue(result['success'])
+        self.assertEqual(self._stored_keys(), {self.nodes[1].id, self.pressure.runtime_key})
+
+    def test_replace_node_set_of_stopped_server(self):
+        from .node_set_apply import apply_node_set
+
+        result = apply_node_set(self.server, [
+            {'name': 'Level', 'node_id': 'level', 'node_type': 'variable', 'data_type': 'double', 'value': '0'},
+        ], mode='replace')
+        self.assertEqual((result['deleted'], result['hot_applied']), (1, False))
+        self.assertEqual(self._stored_keys(), {self.nodes[1].id, self.pressure.runtime_key})
+
+    def test_deleted_template_node_of_stopped_server(self):
+        from .node_templates import update_template_nodes
+
+        update_template_nodes(self.template, [], mode='replace')
+        self.assertEqual(self._stored_keys(), {node.id for node in self.nodes})
+
+    def test_delete_node_of_running_server(self):
+        instance = register_instance(self, self.server)
+        result = self.client.post(f'/node/{self.nodes[0].id}/delete/').json()
+        self.assertTrue(result['success'])
+        self.assertNotIn(self.nodes[0].id, instance.nodes)
+        self.assertEqual(self._stored_keys(), {self.nodes[1].id, self.pressure.runtime_key})
+
+
+class LiveValuesReadTests(TempValueStoreMixin, TestCase):
+    """读取运行中服务器的节点值不等待更新周期持有的nodes_lock"""
+
+    def test_read_while_nodes_lock_is_held(self):
+        import time
+        import threading
+
+        server = create_server()
+        node = Node.objects.create(server=server, name='Temperature', node_id='temp1', node_type='variable',
+                                   data_type='double', value='21.5')
+        instance = register_instance(self, server)
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            with instance.nodes_lock:
+                locked.set()
+                release.wait(10)
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(release.set)
+        locked.wait(10)
+        start = time.monotonic()
+        result = self.client.get(f'/node/values/?server_id={server.id}&ids={node.id},999999').json()
+        self.assertEqual((result['ids'], result['values'], result['missing']), ([node.id], [21.5], [999999]))
+        self.assertEqual(instance.read_values()[:2], ([node.id], [21.5]))
+        self.assertLess(time.monotonic() - start, 5)  # 锁一直持有到release，读取未等待
+
+
+class BulkValueWriteTests(TempValueStoreMixin, TestCase):
+    """批量写入运行中服务器的节点值"""
+
+    def setUp(self):
+        super().setUp()
+        self.server = create_server()
+        self.counter = Node.objects.create(server=self.server, name='Counter', node_id='counter',
+                                           node_type='variable', data_type='int32', value='0',
+                                           variation_type='increment', variation_interval=100)
+        self.level = Node.objects.create(server=self.server, name='Level', node_id='level', node_type='variable',
+                                         data_type='double', value='0')
+        self.instance = register_instance(self, self.server)
+
+    def _write(self, **data):
+        response = self.client.post('/node/values/write/', json.dumps({'server_id': self.server.id, **data}),
+                                    content_type='application/json')
+        return response.json()
+
+    def test_batch_uses_one_timestamp_and_persists(self):
+        result = self._write(values={str(self.counter.id): '12', str(self.level.id): 3.5, '999999': 1})
+        self.assertTrue(result['success'], result.get('error'))
+        self.assertEqual(result['written'], 2)
+        self.assertEqual(list(result['errors']), ['999999'])
+        ids, values, timestamps, status, _ = self.instance.read_values([self.counter.id, self.level.id])
+        self.assertEqual(values, [12, 3.5])
+        self.assertEqual(len(set(timestamps)), 1)
+        stored = value_store.read_server(self.server.id)
+        self.assertEqual((stored[self.counter.id][0], stored[self.level.id][0]), (12, 3.5))
+
+    def test_invalid_value_and_by_node_id(self):
+        result = self._write(values={'counter': 1.5, 'level': '7', 'missing': 1}, by_node_id=True, persist=False)
+        self.assertEqual(result['written'], 1)
+        self.assertEqual(set(result['errors']), {'counter', 'missing'})
+        self.assertEqual(self.instance.read_values([self.level.id])[1], [7.0])
+        self.assertEqual(value_store.read_server(self.server.id), {})
+
+    def test_hold_pauses_variation(self):
+        import time
+
+        result = self._write(values={str(self.counter.id): 100}, hold_ms=60000)
+        self.assertEqual(result['written'], 1)
+        now = time.time()
+        self.instance._tick(now + 1)
+        self.assertEqual(self.instance.read_values([self.counter.id])[1], [100])
+        self.instance._tick(now + 61)
+        self.assertEqual(self.instance.read_values([self.counter.id])[1], [101])
+
+
+class PublishedTypeAndFaultTests(TempValueStoreMixin, TestCase):
+    """更新的值按节点数据类型发布，故障按节点配置注入"""
+
+    def _node(self, server, node_id, data_type, **fields):
+        return Node.objects.create(server=server, name=node_id, node_id=node_id, node_type='variable',
+                                   data_type=data_type, value='5', variation_type='increment', **fields)
+
+    def _published(self, instance, node):
+        datavalue = instance.server.iserver.aspace._nodes[instance.nodes[node.id].nodeid] \
+            .attributes[ua.AttributeIds.Value].value
+        return datavalue.Value.Value, datavalue.Value.VariantType, datavalue.StatusCode.value
+
+    def test_updates_keep_variant_type(self):
+        import time
+
+        server = create_server()
+        nodes = {
+            ua.VariantType.Float: self._node(server, 'float', 'float', variation_step=0.5),
+            ua.VariantType.Int32: self._node(server, 'int32', 'int32', variation_step=1.4),
+            ua.VariantType.UInt32: self._node(server, 'uint32', 'uint32', variation_step=-10),
+            ua.VariantType.Double: self._node(server, 'double', 'double', variation_step=0.5,
+                                              fault_config='{"jitter_ms": 10}'),
+        }
+        instance = register_instance(self, server)
+        for varianttype, node in nodes.items():
+            self.assertEqual(self._published(instance, node)[1], varianttype)
+        instance._tick(time.time())
+        published = {varianttype: self._published(instance, node)[:2] for varianttype, node in nodes.items()}
+        self.assertEqual(published, {
+            ua.VariantType.Float: (5.5, ua.VariantType.Float),
+            ua.VariantType.Int32: (6, ua.VariantType.Int32),
+            ua.VariantType.UInt32: (0, ua.VariantType.UInt32),  # 不小于无符号类型的下限
+            ua.VariantType.Double: (5.5, ua.VariantType.Double),
+        })
+
+    def test_bad_and_delayed_values(self):
+        import time
+        from . import faults
+
+        server = create_server(fault_config='{"bad": 1.0}')
+        bad = self._node(server, 'bad', 'int32')
+        delayed = self._node(server, 'delayed', 'int32', fault_config='{"bad": 0, "delay": 1.0, "delay_ms": 500}')
+        instance = register_instance(self, server)
+        now = time.time()
+        instance._tick(now)
+        self.assertEqual(self._published(instance, bad), (6, ua.VariantType.Int32, faults.STATUS_BAD))
+        self.assertEqual(self._published(instance, delayed)[0], 5)
+        self.assertEqual(instance.metrics.faults_injected, 2)
+        # 节点自身的状态不受注入的状态码影响
+        self.assertEqual(instance.nodes[bad.id].status, 0)
+
+        instance._publish_delayed(now + 1)
+        self.assertEqual(self._published(instance, delayed), (6, ua.VariantType.Int32, 0))
+
+
+class DeadbandTests(TempValueStoreMixin, TestCase):
+    """未超过死区的新值不发布，也不计入更新的节点数"""
+
+    def _node(self, server, node_id, **fields):
+        return Node.objects.create(server=server, name=node_id, node_id=node_id, node_type='variable',
+                                   data_type='double', value='0', variation_type='increment', variation_step=1,
+                                   **fields)
+
+    def _published(self, instance, node):
+        return instance.server.iserver.aspace._nodes[instance.nodes[node.id].nodeid] \
+            .attributes[ua.AttributeIds.Value].value.Value.Value
+
+    def test_only_values_outside_deadband_are_written(self):
+        import time
+
+        server = create_server()
+        banded = self._node(server, 'banded', deadband_absolute=2.5)
+        plain = self._node(server, 'plain')
+        instance = register_instance(self, server)
+        now = time.time()
+        counts = []
+        for tick in range(3):
+            counts.append(instance._tick(now + tick * 10))
+            instance.metrics.observe_tick(0.0, 0.01, counts[-1], instance.tick_interval)
+        # 1和2与已发布的0相差不超过2.5，第三个周期的3超过死区
+        self.assertEqual(counts, [1, 1, 2])
+        self.assertEqual(instance.metrics.nodes_updated, 4)
+        self.assertEqual(instance.metrics.deadband_suppressed, 2)
+        self.assertEqual(self._published(instance, banded), 3.0)
+        self.assertEqual(self._published(instance, plain), 3.0)
+        self.assertEqual([record.key for record in instance._dirty_nodes].count(banded.id), 1)
+
+        # 接口写入的值成为新的比较基准
+        instance.write_values({banded.id: 10}, persist=False)
+        self.assertEqual(instance._tick(now + 30), 1)
+        self.assertEqual(self._published(instance, banded), 10.0)
+        self.assertEqual(instance.nodes[banded.id].value, 11.0)
+
+
+class GeneratorBankTests(TestCase):
+    """组合信号按形状分组批量计算的结果与逐个节点计算相同"""
+
+    CONFIGS = [
+        [{'type': 'constant', 'value': 3}, {'type': 'sine', 'amplitude': 2, 'period': 7, 'phase': 0.25}],
+        [{'type': 'constant', 'value': -1}, {'type': 'sine', 'amplitude': 5, 'period': 13, 'offset': 4}],
+        {'components': [{'type': 'sine', 'amplitude': 50, 'period': 11}], 'min': -10, 'max': 10},
+        [{'type': 'lag', 'setpoint': 80, 'tau': 4, 'initial': 20}, {'type': 'constant', 'value': 1}],
+        [{'type': 'lag', 'setpoint': -5, 'tau': 9, 'initial': 5}, {'type': 'constant', 'value': 0}],
+        [{'type': 'constant', 'value': 2}, {'type': 'sine', 'amplitude': 1, 'period': 3}],
+    ]
+
+    def _records(self):
+        from types import SimpleNamespace
+        from .generators import parse_generator_config
+
+        return [SimpleNamespace(key=key, params=SimpleNamespace(generator=parse_generator_config(config)))
+                for key, config in enumerate(self.CONFIGS, 1)]
+
+    def test_grouped_output_matches_per_node(self):
+        import math
+        from .generator_bank import GeneratorBank
+
+        start = 1_700_000_000.0
+        records = self._records()
+        bank = GeneratorBank(records, start)
+        singles = {record.key: GeneratorBank([record], start) for record in self._records()}
+        # 每个周期只有部分节点到期，各组按行号取子集计算
+        schedule = [records, records[::2], records[1:4], records, records[3:]]
+        for tick, due in enumerate(schedule, 1):
+            now = start + tick * 1.5
+            grouped = {record.key: value for record, value in bank.evaluate(due, now)}
+            expected = {record.key: singles[record.key].evaluate([record], now)[0][1] for record in due}
+            self.assertEqual(grouped.keys(), expected.keys())
+            for key, value in grouped.items():
+                self.assertAlmostEqual(value, expected[key], places=9)
+        # 一阶惯性按解析解趋近设定值
+        lag = bank.evaluate([records[3]], start + 10)[0][1]
+        self.assertAlmostEqual(lag, 80 + (20 - 80) * math.exp(-10 / 4) + 1, places=9)
+
+    def test_rebuild_keeps_state(self):
+        from .generator_bank import GeneratorBank
+
+        start = 1_700_000_000.0
+        records = self._records()
+        bank = GeneratorBank(records, start)
+        bank.evaluate(records, start + 4)
+        rebuilt = GeneratorBank(records[2:], start + 4, bank)
+        before = [value for _, value in bank.evaluate(records[3:5], start + 8)]
+        after = [value for _, value in rebuilt.evaluate(records[3:5], start + 8)]
+        for expected, value in zip(before, after):
+            self.assertAlmostEqual(value, expected, places=9)
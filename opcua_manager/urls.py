@@ -7,6 +7,8 @@ urlpatterns = [
     
     # 节点管理API
     path('node/list/', views.node_list, name='node-list-api'),
+    path('node/values/', views.node_values, name='node-values'),
+    path('node/values/write/', views.write_node_values, name='node-values-write'),
     path('node/add/', views.add_node, name='node-add'),
     path('node/<int:node_id>/edit/', views.edit_node, name='node-edit'),
     path('node/<int:node_id>/delete/', views.delete_node, name='node-delete'),
@@ -20,12 +22,47 @@ urlpatterns = [
     path('server/<int:server_id>/start/', views.start_server, name='server-start'),
     path('server/<int:server_id>/stop/', views.stop_server, name='server-stop'),
     path('server/<int:server_id>/status/', views.server_status, name='server-status'),
+    path('server/<int:server_id>/profile/', views.profile_server, name='server-profile'),
+    path('server/<int:server_id>/overload/', views.server_overload, name='server-overload'),
+    path('server/<int:server_id>/nodeset2/import/', views.import_nodeset2_to_server, name='server-nodeset2-import'),
+    path('server/<int:server_id>/nodeset2/export/', views.export_nodeset2_from_server, name='server-nodeset2-export'),
+    path('server/<int:server_id>/template/', views.set_server_template, name='server-template'),
     
     # 新增的服务器管理API
     path('server/test-connection/', views.test_server_connection, name='server-test-connection'),
+    path('server/allocate-ports/', views.allocate_ports, name='server-allocate-ports'),
     path('server/import/', views.import_servers, name='server-import'),
     path('server/export/', views.export_servers, name='server-export'),
     path('server/batch-start/', views.batch_start_servers, name='server-batch-start'),
     path('server/batch-stop/', views.batch_stop_servers, name='server-batch-stop'),
     path('server/batch-delete/', views.batch_delete_servers, name='server-batch-delete'),
+    path('server/provision/', views.provision_servers, name='server-provision'),
+
+    # 节点集合API
+    path('node-set/<str:set_name>/apply/', views.apply_node_set_to_server, name='node-set-apply'),
+    path('node-set/<str:set_name>/nodeset2/import/', views.import_nodeset2_to_set, name='node-set-nodeset2-import'),
+    path('node-set/<str:set_name>/nodeset2/export/', views.export_nodeset2_from_set, name='node-set-nodeset2-export'),
+    
+    # 节点模板API
+    path('template/list/', views.template_list, name='template-list'),
+    path('template/add/', views.add_template, name='template-add'),
+    path('template/<int:template_id>/delete/', views.remove_template, name='template-delete'),
+    path('template/<int:template_id>/nodes/', views.template_nodes, name='template-nodes'),
+    path('template/<int:template_id>/apply/', views.apply_to_template, name='template-apply'),
+    
+    # 场景API
+    path('server/<int:server_id>/scenario/list/', views.scenario_list, name='scenario-list'),
+    path('server/<int:server_id>/scenario/add/', views.add_scenario, name='scenario-add'),
+    path('scenario/<int:scenario_id>/edit/', views.edit_scenario, name='scenario-edit'),
+    path('scenario/<int:scenario_id>/delete/', views.delete_scenario, name='scenario-delete'),
+    path('scenario/<int:scenario_id>/start/', views.start_scenario, name='scenario-start'),
+    path('scenario/<int:scenario_id>/stop/', views.stop_scenario, name='scenario-stop'),
+    
+    # 后台任务API
+    path('job/list/', views.job_list, name='job-list'),
+    path('job/<str:job_id>/', views.job_status, name='job-status'),
+    path('job/<str:job_id>/cancel/', views.cancel_job, name='job-cancel'),
+    
+    # 运行时指标（Prometheus抓取地址）
+    path('metrics', views.metrics, name='metrics'),
 ]
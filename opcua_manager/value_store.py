@@ -0,0 +1,142 @@
+import sqlite3
+import logging
+import threading
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+logger = logging.getLogger(__name__)
+
+STORE_PATH = Path(settings.BASE_DIR) / 'runtime_values.sqlite3'  # 与配置数据库分开的独立文件
+SQL_CHUNK_SIZE = 500  # 单条SQL语句中的最大参数个数
+STATUS_GOOD = 0  # OPC UA状态码Good
+
+# 值类型编码，值本身按SQLite的原生类型存储
+TYPE_TEXT, TYPE_INT, TYPE_FLOAT, TYPE_BOOL, TYPE_DATETIME = range(5)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS node_values (
+    server_id INTEGER NOT NULL,
+    node_key INTEGER NOT NULL,
+    value,
+    value_type INTEGER NOT NULL,
+    source_ts REAL NOT NULL,
+    status INTEGER NOT NULL,
+    PRIMARY KEY (server_id, node_key)
+) WITHOUT ROWID;
+"""
+
+
+def _encode(value):
+    """返回 (存储值, 类型编码)"""
+    if isinstance(value, bool):
+        return int(value), TYPE_BOOL
+    if isinstance(value, int):
+        return value, TYPE_INT
+    if isinstance(value, float):
+        return value, TYPE_FLOAT
+    if isinstance(value, datetime):
+        return value.isoformat(), TYPE_DATETIME
+    return str(value), TYPE_TEXT
+
+
+def _decode(value, value_type):
+    if value_type == TYPE_BOOL:
+        return bool(value)
+    if value_type == TYPE_DATETIME:
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _chunks(items, size=SQL_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class ValueStore:
+    """节点运行时值的存储
+
+    每个节点一行：(服务器id, 节点键) -> 带类型的值、源时间戳(Unix秒)和状态码。
+    节点键与运行时记录相同（Node为id，模板节点为负的TemplateNode id），模板节点的值
+    也按服务器分别保存。使用WAL模式的独立SQLite文件，更新线程批量写入时不与
+    配置数据库的写操作竞争，读取也不会被写入阻塞。每个线程使用自己的连接。
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')  # 持久保存在文件中
+            conn.executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')  # WAL模式下只在检查点时同步
+            self._local.conn = conn
+        return conn
+
+    def write(self, server_id, rows):
+        """批量写入 (节点键, 值, 源时间戳, 状态码)，在一个事务中完成"""
+        params = [
+            (server_id, key, *_encode(value), timestamp, status)
+            for key, value, timestamp, status in rows
+        ]
+        if not params:
+            return
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO node_values (server_id, node_key, value, value_type, source_ts, status) '
+                'VALUES (?, ?, ?, ?, ?, ?)', params
+            )
+
+    def read_server(self, server_id):
+        """读取服务器全部节点的值，返回 {节点键: (值, 源时间戳, 状态码)}"""
+        rows = self._connection().execute(
+            'SELECT node_key, value, value_type, source_ts, status FROM node_values WHERE server_id = ?',
+            (server_id,)
+        )
+        return {key: (_decode(value, value_type), timestamp, status)
+                for key, value, value_type, timestamp, status in rows}
+
+    def read_node(self, server_id, key):
+        """读取单个节点的值，返回 (值, 源时间戳, 状态码)，没有保存的值时返回None"""
+        row = self._connection().execute(
+            'SELECT value, value_type, source_ts, status FROM node_values WHERE server_id = ? AND node_key = ?',
+            (server_id, key)
+        ).fetchone()
+        if row is None:
+            return None
+        value, value_type, timestamp, status = row
+        return _decode(value, value_type), timestamp, status
+
+    def read_all(self):
+        """读取全部节点的值，返回 {(服务器id, 节点键): (值, 源时间戳, 状态码)}"""
+        rows = self._connection().execute(
+            'SELECT server_id, node_key, value, value_type, source_ts, status FROM node_values'
+        )
+        return {(server_id, key): (_decode(value, value_type), timestamp, status)
+                for server_id, key, value, value_type, timestamp, status in rows}
+
+    def delete_nodes(self, server_id, keys):
+        keys = list(keys)
+        conn = self._connection()
+        with conn:
+            for chunk in _chunks(keys):
+                conn.execute(
+                    f"DELETE FROM node_values WHERE server_id = ? AND node_key IN ({','.join('?' * len(chunk))})",
+                    (server_id, *chunk)
+                )
+
+    def delete_server(self, server_id):
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM node_values WHERE server_id = ?', (server_id,))
+
+
+# 全局实例，第一次使用时才创建存储文件
+value_store = SimpleLazyObject(ValueStore)
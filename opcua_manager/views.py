@@ -1,15 +1,36 @@
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.generic import TemplateView
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from django.core.exceptions import ValidationError
 from django.db import transaction
-from .models import OpcServer, Node
-from .opcua_server import OpcUaServer
-import asyncio
-import socket
+from django.db.models import Count
+from .models import OpcServer, Node, NodeTemplate, Scenario, NODE_CONFIG_FIELDS, SERVER_CONFIG_FIELDS, WRITE_POLICIES
+from . import server_registry
+from .metrics import render_metrics
+from .overload import OVERLOAD_POLICIES
+from .faults import fault_config_text
+from .generators import generator_config_text
+from .node_set_manager import node_set_manager
+from .node_set_apply import apply_node_set, APPLY_MODES
+from .nodeset2 import iter_nodeset2, iter_chunks, import_nodes_to_server, export_nodeset2
+from .server_lifecycle import start_servers, stop_servers
+from .jobs import submit_job, get_job, list_jobs
+from .node_batch import add_nodes
+from .fleet import provision_fleet
+from .node_templates import (create_template, delete_template, update_template_nodes,
+                             attach_template, detach_template, iter_effective_nodes)
+from .template_cache import get_template_nodes
+from .port_allocator import port_allocator, probe_port, DEFAULT_START_PORT
+from .config_transfer import ConfigImporter, iter_export_lines, gzip_stream, import_config_file
+from .value_store import value_store
+from .live_values import read_live_values, write_live_values
+from .node_changes import apply_live_changes
+from .scenario import parse_scenario, start_server_scenario, stop_server_scenario, running_scenarios
+from .runner_control import servers_are_remote, send_command, RunnerUnavailable, CONTROL_TIMEOUT
+import os
 import json
+import tempfile
 from datetime import datetime
 import logging
 
@@ -39,6 +60,9 @@ def server_list(request):
             'allow_anonymous': server.allow_anonymous,
             'username': server.username,
             'min_sampling_interval': server.min_sampling_interval,
+            'overload_policy': server.overload_policy,
+            'fault_config': server.fault_config,
+            'template_id': server.template_id,
             'is_running': server.is_running,
             'node_count': server.nodes.count(),
             'created_at': server.created_at.isoformat(),
@@ -47,24 +71,43 @@ def server_list(request):
     return JsonResponse({'success': True, 'servers': server_list})
 
 def check_port_available(endpoint, port):
-    """检查端口是否可用"""
-    try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        # 设置超时时间为1秒
-        sock.settimeout(1)
-        result = sock.connect_ex((endpoint, int(port)))
-        sock.close()
-        return result != 0
+    """检查端口是否可用（本机绑定探测，不等待连接超时）"""
+    try:
+        return probe_port(endpoint, int(port))
     except Exception as e:
         logger.error(f"Error checking port: {e}")
         return False
 
+@require_http_methods(["POST"])
+def allocate_ports(request):
+    """分配多个空闲端口"""
+    try:
+        data = json.loads(request.body)
+        ports = port_allocator.allocate(
+            data.get('endpoint', '0.0.0.0'),
+            count=int(data.get('count', 1)),
+            start_port=int(data.get('start_port', DEFAULT_START_PORT))
+        )
+        return JsonResponse({'success': True, 'ports': ports})
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
 @require_http_methods(["POST"])
 def add_server(request):
     """添加新服务器"""
     try:
         data = json.loads(request.body)
         
+        if data.get('overload_policy', 'none') not in OVERLOAD_POLICIES:
+            return JsonResponse({
+                'success': False,
+                'error': '无效的过载策略'
+            })
+        try:
+            fault_config = fault_config_text(data.get('fault_config'))
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': f'故障注入配置无效: {e}'})
+        
         # 检查服务器名称是否已存在
         if OpcServer.objects.filter(name=data['name']).exists():
             return JsonResponse({
@@ -97,7 +140,9 @@ def add_server(request):
             allow_anonymous=data.get('allow_anonymous', True),
             username=data.get('username', ''),
             password=data.get('password', ''),
-            min_sampling_interval=data.get('min_sampling_interval', 100)
+            min_sampling_interval=data.get('min_sampling_interval', 100),
+            overload_policy=data.get('overload_policy', 'none'),
+            fault_config=fault_config
         )
         return JsonResponse({'success': True})
     except Exception as e:
@@ -110,6 +155,17 @@ def edit_server(request, server_id):
         data = json.loads(request.body)
         server = get_object_or_404(OpcServer, id=server_id)
         
+        if data.get('overload_policy', server.overload_policy) not in OVERLOAD_POLICIES:
+            return JsonResponse({
+                'success': False,
+                'error': '无效的过载策略'
+            })
+        if 'fault_config' in data:
+            try:
+                data['fault_config'] = fault_config_text(data['fault_config'])
+            except ValueError as e:
+                return JsonResponse({'success': False, 'error': f'故障注入配置无效: {e}'})
+        
         # 检查服务器名称是否已存在（排除当前服务器）
         if OpcServer.objects.filter(name=data['name']).exclude(id=server_id).exists():
             return JsonResponse({
@@ -142,6 +198,8 @@ def edit_server(request, server_id):
         server.uri = data['uri']
         server.allow_anonymous = data.get('allow_anonymous', True)
         server.min_sampling_interval = data.get('min_sampling_interval', 100)
+        server.overload_policy = data.get('overload_policy', server.overload_policy)
+        server.fault_config = data.get('fault_config', server.fault_config)  # 重新启动服务器后生效
         
         # 如果不允许匿名访问，更新认证信息
         if not data.get('allow_anonymous', True):
@@ -164,7 +222,12 @@ def delete_server(request, server_id):
                 'success': False,
                 'error': '无法删除行中的服务器，请先停止服务器'
             })
+        from .snapshot import discard_snapshot
+
+        server_id = server.id
         server.delete()
+        discard_snapshot(server_id)
+        value_store.delete_server(server_id)
         return JsonResponse({'success': True})
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
@@ -180,7 +243,11 @@ def start_server(request, server_id):
                 'error': '服务器已经在运行'
             })
         
-        # 创建OPC UA服务器实例并启动
+        if servers_are_remote():
+            return _runner_result(start_servers([server.id]), 'started')
+
+        # 创建OPC UA服务器实例并启动（opcua在第一次启动服务器时才导入）
+        from .opcua_server import OpcUaServer
         opcua_server = OpcUaServer.create_instance(server)
         if opcua_server.start():
             server.is_running = True
@@ -205,8 +272,11 @@ def stop_server(request, server_id):
                 'error': '服务器已经停止'
             })
         
+        if servers_are_remote():
+            return _runner_result(stop_servers([server.id]), 'stopped')
+
         # 停止OPC UA服务器
-        opcua_server = OpcUaServer.get_instance(server.id)
+        opcua_server = server_registry.get_instance(server.id)
         if opcua_server and opcua_server.stop():
             server.is_running = False
             server.save()
@@ -219,6 +289,13 @@ def stop_server(request, server_id):
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
+def _runner_result(summary, done_status):
+    """单个服务器在模拟器进程中的启停结果"""
+    result = summary['results'][0]
+    if result['status'] == done_status:
+        return JsonResponse({'success': True})
+    return JsonResponse({'success': False, 'error': result['error'] or '操作未执行'})
+
 @require_http_methods(["GET"])
 def server_status(request, server_id):
     """获取服务器状态"""
@@ -232,6 +309,60 @@ def server_status(request, server_id):
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
+@require_http_methods(["GET"])
+def metrics(request):
+    """以Prometheus文本格式导出服务器运行时指标"""
+    if servers_are_remote():
+        try:
+            text = send_command('metrics')['text']
+        except RunnerUnavailable as e:
+            return HttpResponse(str(e), status=503, content_type='text/plain; charset=utf-8')
+    else:
+        text = render_metrics(server_registry.get_instances())
+    return HttpResponse(text, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@require_http_methods(["GET"])
+def profile_server(request, server_id):
+    """对运行中服务器的更新线程进行采样分析"""
+    try:
+        server = get_object_or_404(OpcServer, id=server_id)
+        seconds = float(request.GET.get('seconds', 10))
+        interval_ms = request.GET.get('interval_ms')
+        interval = float(interval_ms) / 1000 if interval_ms else None
+        if servers_are_remote():
+            collapsed = send_command('profile', timeout=seconds + CONTROL_TIMEOUT,
+                                     server_id=server.id, seconds=seconds, interval=interval)['text']
+            return HttpResponse(collapsed, content_type='text/plain; charset=utf-8')
+
+        opcua_server = server_registry.get_instance(server.id)
+        if not opcua_server:
+            return JsonResponse({
+                'success': False,
+                'error': '服务器未运行'
+            })
+        collapsed = opcua_server.profile(seconds, interval)
+        return HttpResponse(collapsed, content_type='text/plain; charset=utf-8')
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+@require_http_methods(["GET"])
+def server_overload(request, server_id):
+    """获取服务器过载处理报告"""
+    try:
+        server = get_object_or_404(OpcServer, id=server_id)
+        if servers_are_remote():
+            return JsonResponse({'success': True, 'report': send_command('overload', server_id=server.id)['report']})
+
+        opcua_server = server_registry.get_instance(server.id)
+        if not opcua_server:
+            return JsonResponse({
+                'success': False,
+                'error': '服务器未运行'
+            })
+        return JsonResponse({'success': True, 'report': opcua_server.get_overload_report()})
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
 # 新增的服务器管理API
 @require_http_methods(["POST"])
 def test_server_connection(request):
@@ -284,54 +415,53 @@ def test_server_connection(request):
 
 @require_http_methods(["POST"])
 def import_servers(request):
-    """导入服务器配置"""
+    """导入服务器配置
+
+    JSON请求体为旧版格式（服务器列表），直接导入；其他请求体或上传文件按NDJSON
+    （可gzip压缩）在后台任务中导入服务器及其节点，立即返回任务id。
+    """
     try:
-        data = json.loads(request.body)
-        servers = data['servers']
-        options = data['options']
-        
-        with transaction.atomic():
-            for server_data in servers:
-                if options.get('overwrite') and OpcServer.objects.filter(name=server_data['name']).exists():
-                    # 如果选择覆盖，则更新现有服务器
-                    server = OpcServer.objects.get(name=server_data['name'])
-                    for key, value in server_data.items():
-                        if key not in ['id', 'created_at', 'updated_at', 'is_running']:
-                            setattr(server, key, value)
-                    server.save()
-                else:
-                    # 创建新服务器
-                    server_data.pop('id', None)
-                    server_data.pop('created_at', None)
-                    server_data.pop('updated_at', None)
-                    server_data.pop('is_running', None)
-                    OpcServer.objects.create(**server_data)
+        if request.content_type == 'application/json':
+            data = json.loads(request.body)
+            importer = ConfigImporter(overwrite=data['options'].get('overwrite', False))
+            with transaction.atomic():
+                for server_data in data['servers']:
+                    importer.import_server(server_data)
+            return JsonResponse({'success': True, 'result': importer.stats})
         
-        return JsonResponse({'success': True})
+        # 上传内容先写入临时文件，由后台任务导入
+        path = _spool_upload(_get_upload_source(request))
+        job = submit_job('import_servers', import_config_file, path,
+                         overwrite=request.GET.get('overwrite', '1') != '0')
+        return JsonResponse({'success': True, 'job_id': job.id})
     except Exception as e:
+        logger.error(f"Error importing servers: {e}")
         return JsonResponse({'success': False, 'error': str(e)})
 
 @require_http_methods(["GET"])
 def export_servers(request):
-    """导出服务器配置"""
+    """导出服务器配置
+
+    format=ndjson 或 format=gzip 时流式导出服务器及其全部节点，
+    否则返回旧版JSON格式的服务器列表。
+    """
+    export_format = request.GET.get('format')
+    if export_format in ('ndjson', 'gzip'):
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        if export_format == 'gzip':
+            response = StreamingHttpResponse(gzip_stream(iter_export_lines()), content_type='application/gzip')
+            response['Content-Disposition'] = f'attachment; filename="opcua_servers_{timestamp}.ndjson.gz"'
+        else:
+            response = StreamingHttpResponse(iter_export_lines(), content_type='application/x-ndjson')
+            response['Content-Disposition'] = f'attachment; filename="opcua_servers_{timestamp}.ndjson"'
+        return response
+    
     try:
-        servers = OpcServer.objects.all()
         config = []
-        for server in servers:
-            server_data = {
-                'id': server.id,
-                'name': server.name,
-                'endpoint': server.endpoint,
-                'port': server.port,
-                'uri': server.uri,
-                'allow_anonymous': server.allow_anonymous,
-                'username': server.username,
-                'password': server.password,
-                'min_sampling_interval': server.min_sampling_interval,
-                'created_at': server.created_at.isoformat(),
-                'updated_at': server.updated_at.isoformat()
-            }
-            config.append(server_data)
+        for server in OpcServer.objects.values('id', *SERVER_CONFIG_FIELDS, 'created_at', 'updated_at'):
+            server['created_at'] = server['created_at'].isoformat()
+            server['updated_at'] = server['updated_at'].isoformat()
+            config.append(server)
         
         return JsonResponse({
             'success': True,
@@ -342,62 +472,46 @@ def export_servers(request):
 
 @require_http_methods(["POST"])
 def batch_start_servers(request):
-    """批启动服务器"""
+    """批量启动服务器（并行执行），async为true时在后台任务中执行并立即返回任务id"""
     try:
         data = json.loads(request.body)
         server_ids = data.get('server_ids', [])
         
-        success_count = 0
-        errors = []
+        if data.get('async'):
+            job = submit_job('batch_start', start_servers, server_ids, data.get('max_workers'))
+            return JsonResponse({'success': True, 'job_id': job.id})
         
-        for server_id in server_ids:
-            try:
-                server = OpcServer.objects.get(id=server_id)
-                if not server.is_running:
-                    opcua_server = OpcUaServer(server)
-                    asyncio.run(opcua_server.start())
-                    server.is_running = True
-                    server.save()
-                    success_count += 1
-            except Exception as e:
-                errors.append(f'服务器 {server_id} 启动失败: {str(e)}')
-        
-        return JsonResponse({
-            'success': True,
-            'message': f'成功启动 {success_count} 个服务器',
-            'errors': errors
-        })
+        return JsonResponse({'success': True, **start_servers(server_ids, data.get('max_workers'))})
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
 @require_http_methods(["POST"])
 def batch_stop_servers(request):
-    """批量停止服务器"""
+    """批量停止服务器（并行执行），async为true时在后台任务中执行并立即返回任务id"""
     try:
         data = json.loads(request.body)
         server_ids = data.get('server_ids', [])
         
-        success_count = 0
-        errors = []
-        
-        for server_id in server_ids:
-            try:
-                server = OpcServer.objects.get(id=server_id)
-                if server.is_running:
-                    opcua_server = OpcUaServer(server)
-                    asyncio.run(opcua_server.stop())
-                    server.is_running = False
-                    server.save()
-                    success_count += 1
-            except Exception as e:
-                errors.append(f'服务器 {server_id} 停止失败: {str(e)}')
+        if data.get('async'):
+            job = submit_job('batch_stop', stop_servers, server_ids, data.get('max_workers'))
+            return JsonResponse({'success': True, 'job_id': job.id})
         
-        return JsonResponse({
-            'success': True,
-            'message': f'成功停止 {success_count} 个服务器',
-            'errors': errors
-        })
+        return JsonResponse({'success': True, **stop_servers(server_ids, data.get('max_workers'))})
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+@require_http_methods(["POST"])
+def provision_servers(request):
+    """按模板批量创建服务器，start为true时在后台任务中并行启动"""
+    try:
+        data = json.loads(request.body)
+        result = provision_fleet(data.get('template', {}), int(data.get('count', 0)))
+        if data.get('start'):
+            server_ids = [server['id'] for server in result['servers']]
+            result['job_id'] = submit_job('batch_start', start_servers, server_ids, data.get('max_workers')).id
+        return JsonResponse({'success': True, 'result': result})
     except Exception as e:
+        logger.error(f"Error provisioning servers: {e}")
         return JsonResponse({'success': False, 'error': str(e)})
 
 @require_http_methods(["POST"])
@@ -407,6 +521,8 @@ def batch_delete_servers(request):
         data = json.loads(request.body)
         server_ids = data.get('server_ids', [])
         
+        from .snapshot import discard_snapshot
+
         success_count = 0
         errors = []
         
@@ -414,8 +530,11 @@ def batch_delete_servers(request):
             for server_id in server_ids:
                 try:
                     server = OpcServer.objects.get(id=server_id)
+                    server_id = server.id
                     if not server.is_running:
                         server.delete()
+                        discard_snapshot(server_id)
+                        value_store.delete_server(server_id)
                         success_count += 1
                     else:
                         errors.append(f'服务器 {server.name} 正在运行，无法删除')
@@ -430,29 +549,70 @@ def batch_delete_servers(request):
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
+def _live_value(stored, node):
+    """节点的当前值：运行时值存储中有则取保存的值和源时间戳，否则为配置的初始值"""
+    if stored is None:
+        return {'value': node.value, 'value_timestamp': None}
+    return {'value': str(stored[0]), 'value_timestamp': stored[1]}
+
 @csrf_exempt
 def node_list(request):
     """获取节点列表"""
     if request.method == 'GET':
         server_id = request.GET.get('server_id')
         try:
+            inherited = []
             if server_id:
                 server = OpcServer.objects.get(id=server_id)
                 nodes = server.nodes.all()
+                stored = value_store.read_server(server.id)
+                live = {(server.id, key): value for key, value in stored.items()}
+                # include_template=1 时同时返回从模板继承的节点（未被覆盖的模板节点）
+                if request.GET.get('include_template') == '1' and server.template_id:
+                    own_node_ids = {node.node_id for node in nodes}
+                    inherited = [{
+                        'id': None,
+                        'template_node_id': node.id,
+                        'inherited': True,
+                        'name': node.name,
+                        'node_id': node.node_id,
+                        'node_type': node.node_type,
+                        'data_type': node.data_type,
+                        **_live_value(live.get((server.id, node.runtime_key)), node),
+                        'description': node.description,
+                        'variation_type': node.variation_type,
+                        'priority': node.priority,
+                        'write_policy': node.write_policy,
+                        'write_hold_time': node.write_hold_time,
+                        'fault_config': node.fault_config,
+                        'deadband_absolute': node.deadband_absolute,
+                        'deadband_percent': node.deadband_percent,
+                        'generator_config': node.generator_config,
+                        'server_id': server.id,
+                        'server_name': server.name
+                    } for node in get_template_nodes(server.template_id) if node.node_id not in own_node_ids]
             else:
                 nodes = Node.objects.all()
+                live = value_store.read_all()
             
             return JsonResponse({
                 'success': True,
-                'nodes': [{
+                'nodes': inherited + [{
                     'id': node.id,
                     'name': node.name,
                     'node_id': node.node_id,
                     'node_type': node.node_type,
                     'data_type': node.data_type,
-                    'value': node.value,
+                    **_live_value(live.get((node.server_id, node.id)), node),
                     'description': node.description,
                     'variation_type': node.variation_type,
+                    'priority': node.priority,
+                    'write_policy': node.write_policy,
+                    'write_hold_time': node.write_hold_time,
+                    'fault_config': node.fault_config,
+                    'deadband_absolute': node.deadband_absolute,
+                    'deadband_percent': node.deadband_percent,
+                    'generator_config': node.generator_config,
                     'server_id': node.server_id,
                     'server_name': node.server.name
                 } for node in nodes]
@@ -462,6 +622,67 @@ def node_list(request):
             return JsonResponse({'success': False, 'error': str(e)})
     return JsonResponse({'success': False, 'error': '不支持的请求方法'})
 
+def _msgpack_response(data):
+    try:
+        import msgpack
+    except ImportError:
+        return JsonResponse({'success': False, 'error': '未安装msgpack，无法使用MessagePack格式'})
+    return HttpResponse(msgpack.packb(data, default=str), content_type='application/msgpack')
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def node_values(request):
+    """从运行中服务器的内存读取节点当前值，不访问数据库
+
+    GET参数为server_id和ids（逗号分隔的节点id），POST为JSON {"server_id": ..., "ids": [...]}。
+    结果按列返回：ids、values、timestamps（Unix秒）、status（OPC UA状态码），未运行的节点列在missing中。
+    format=msgpack或Accept为application/msgpack时以MessagePack格式返回（需要安装msgpack）。
+    """
+    try:
+        if request.method == 'POST':
+            data = json.loads(request.body or b'{}')
+            server_id, ids = data.get('server_id'), data.get('ids')
+        else:
+            server_id, ids = request.GET.get('server_id'), request.GET.get('ids')
+            ids = ids.split(',') if ids else None
+        server_id = int(server_id) if server_id not in (None, '') else None
+        keys = [int(key) for key in ids] if ids is not None else None
+
+        if servers_are_remote():
+            result = send_command('values', server_id=server_id, ids=keys)
+        else:
+            result = {'success': True, **read_live_values(server_id, keys)}
+        if request.GET.get('format') == 'msgpack' or 'msgpack' in request.headers.get('Accept', ''):
+            return _msgpack_response(result)
+        return JsonResponse(result)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+@require_http_methods(["POST"])
+def write_node_values(request):
+    """把一批值写入运行中服务器的地址空间，所有节点使用同一个源时间戳
+
+    请求为JSON {"server_id": ..., "values": {节点id: 值}, "by_node_id": false, "hold_ms": 0, "persist": true}。
+    by_node_id为true时values的键为节点的node_id；hold_ms大于0时写入的节点在这段时间内暂停自动变化。
+    """
+    try:
+        data = json.loads(request.body)
+        server_id = int(data['server_id'])
+        values = data.get('values')
+        if not isinstance(values, dict) or not values:
+            return JsonResponse({'success': False, 'error': 'values必须是非空的 {节点id: 值} 对象'})
+        hold = float(data['hold_ms']) / 1000 if data.get('hold_ms') else None
+        by_node_id = bool(data.get('by_node_id'))
+        persist = bool(data.get('persist', True))
+
+        if servers_are_remote():
+            return JsonResponse(send_command('write_values', server_id=server_id, values=values,
+                                             by_node_id=by_node_id, hold=hold, persist=persist))
+        return JsonResponse({'success': True, **write_live_values(server_id, values, by_node_id, hold, persist)})
+    except Exception as e:
+        logger.error(f"Error writing node values: {e}")
+        return JsonResponse({'success': False, 'error': str(e)})
+
 @csrf_exempt
 def add_node(request):
     """添加新节点"""
@@ -469,6 +690,16 @@ def add_node(request):
         try:
             data = json.loads(request.body)
             server = OpcServer.objects.get(id=data['server_id'])
+            if data.get('write_policy', 'resume') not in WRITE_POLICIES:
+                return JsonResponse({'success': False, 'error': '无效的写入策略'})
+            try:
+                fault_config = fault_config_text(data.get('fault_config'))
+            except ValueError as e:
+                return JsonResponse({'success': False, 'error': f'故障注入配置无效: {e}'})
+            try:
+                generator_config = generator_config_text(data.get('generator_config'))
+            except ValueError as e:
+                return JsonResponse({'success': False, 'error': f'组合信号配置无效: {e}'})
             
             node = Node.objects.create(
                 server=server,
@@ -484,7 +715,14 @@ def add_node(request):
                 variation_max=data.get('variation_max'),
                 variation_step=data.get('variation_step'),
                 variation_values=data.get('variation_values'),
-                decimal_places=data.get('decimal_places', 2)
+                decimal_places=data.get('decimal_places', 2),
+                priority=data.get('priority', 0),
+                write_policy=data.get('write_policy', 'resume'),
+                write_hold_time=data.get('write_hold_time', 10000),
+                fault_config=fault_config,
+                deadband_absolute=data.get('deadband_absolute') or 0,
+                deadband_percent=data.get('deadband_percent') or 0,
+                generator_config=generator_config
             )
             
             return JsonResponse({
@@ -497,7 +735,14 @@ def add_node(request):
                     'data_type': node.data_type,
                     'value': node.value,
                     'description': node.description,
-                    'variation_type': node.variation_type
+                    'variation_type': node.variation_type,
+                    'priority': node.priority,
+                    'write_policy': node.write_policy,
+                    'write_hold_time': node.write_hold_time,
+                    'fault_config': node.fault_config,
+                    'deadband_absolute': node.deadband_absolute,
+                    'deadband_percent': node.deadband_percent,
+                    'generator_config': node.generator_config
                 }
             })
         except OpcServer.DoesNotExist:
@@ -514,16 +759,43 @@ def edit_node(request, node_id):
         try:
             node = Node.objects.get(id=node_id)
             data = json.loads(request.body)
+            if data.get('write_policy', node.write_policy) not in WRITE_POLICIES:
+                return JsonResponse({'success': False, 'error': '无效的写入策略'})
+            if 'fault_config' in data:
+                try:
+                    data['fault_config'] = fault_config_text(data['fault_config'])
+                except ValueError as e:
+                    return JsonResponse({'success': False, 'error': f'故障注入配置无效: {e}'})
+            if 'generator_config' in data:
+                try:
+                    data['generator_config'] = generator_config_text(data['generator_config'])
+                except ValueError as e:
+                    return JsonResponse({'success': False, 'error': f'组合信号配置无效: {e}'})
             
+            # 表单中的值是列表中显示的当前值（运行时值存储中有则为保存的值），与之不同才视为修改了值
+            value_edited = False
+            if data.get('value') is not None:
+                data['value'] = str(data['value'])
+                stored = value_store.read_node(node.server_id, node.id)
+                value_edited = data['value'] != _live_value(stored, node)['value']
+
             # 更新节点配置
-            for field in ['name', 'node_id', 'node_type', 'data_type', 'value', 
-                         'description', 'variation_type', 'variation_interval',
-                         'variation_min', 'variation_max', 'variation_step',
-                         'variation_values', 'decimal_places']:
-                if field in data:
+            changed = set()
+            for field in NODE_CONFIG_FIELDS:
+                if field in data and getattr(node, field) != data[field]:
                     setattr(node, field, data[field])
+                    changed.add(field)
+            if value_edited:
+                changed.add('value')
+            else:
+                changed.discard('value')
             
             node.save()
+
+            # 运行中的服务器同步更新；未运行时删除保存的值，下次启动时使用修改后的值
+            applied = bool(changed) and apply_live_changes(node.server_id, updated=[(node, changed)])
+            if value_edited and not applied and not node.server.is_running:
+                value_store.delete_nodes(node.server_id, [node.id])
             
             return JsonResponse({
                 'success': True,
@@ -535,7 +807,14 @@ def edit_node(request, node_id):
                     'data_type': node.data_type,
                     'value': node.value,
                     'description': node.description,
-                    'variation_type': node.variation_type
+                    'variation_type': node.variation_type,
+                    'priority': node.priority,
+                    'write_policy': node.write_policy,
+                    'write_hold_time': node.write_hold_time,
+                    'fault_config': node.fault_config,
+                    'deadband_absolute': node.deadband_absolute,
+                    'deadband_percent': node.deadband_percent,
+                    'generator_config': node.generator_config
                 }
             })
         except Node.DoesNotExist:
@@ -552,11 +831,8 @@ def delete_node(request, node_id):
         try:
             node = Node.objects.get(id=node_id)
             
-            # 如果服务器正在运行，先从服务器实例中移除节点
-            if node.server.is_running:
-                server_instance = OpcUaServer.get_instance(node.server.id)
-                if server_instance:
-                    server_instance.remove_node(node.id)
+            # 从运行中的服务器实例中移除节点，并删除运行时值存储中保存的值
+            apply_live_changes(node.server_id, removed=[node.id])
             
             node.delete()
             return JsonResponse({'success': True})
@@ -569,7 +845,7 @@ def delete_node(request, node_id):
 
 @require_http_methods(["POST"])
 def batch_add_nodes(request):
-    """批量添加节点"""
+    """批量添加节点（后台任务），立即返回任务id"""
     try:
         data = json.loads(request.body)
         nodes = data.get('nodes', [])
@@ -580,42 +856,338 @@ def batch_add_nodes(request):
                 'error': '节点列表为空'
             })
         
-        created_nodes = []
-        with transaction.atomic():
-            for node_data in nodes:
-                server = OpcServer.objects.get(id=node_data['server_id'])
-                
-                # 检查节点ID是否已存在
-                if Node.objects.filter(server=server, node_id=node_data['node_id']).exists():
-                    raise ValidationError(f'节点ID {node_data["node_id"]} 已存在')
-                
-                node = Node.objects.create(
-                    server=server,
-                    name=node_data['name'],
-                    node_id=node_data['node_id'],
-                    node_type=node_data['node_type'],
-                    data_type=node_data['data_type'],
-                    variation_type=node_data['variation_type'],
-                    variation_interval=node_data['variation_interval'],
-                    variation_min=node_data['variation_min'],
-                    variation_max=node_data['variation_max'],
-                    variation_step=node_data['variation_step'],
-                    decimal_places=node_data['decimal_places']
-                )
-                created_nodes.append(node)
-        
-        return JsonResponse({
-            'success': True,
-            'message': f'成功创建 {len(created_nodes)} 个节点'
-        })
-    except ValidationError as e:
-        return JsonResponse({
-            'success': False,
-            'error': str(e)
-        })
+        job = submit_job('batch_add_nodes', add_nodes, nodes)
+        return JsonResponse({'success': True, 'job_id': job.id})
     except Exception as e:
         logger.error(f"Error batch adding nodes: {e}")
         return JsonResponse({
             'success': False,
             'error': str(e)
         })
+
+# 节点集合API
+@require_http_methods(["POST"])
+def apply_node_set_to_server(request, set_name):
+    """将节点集合批量应用到服务器"""
+    try:
+        data = json.loads(request.body)
+        mode = data.get('mode', 'merge')
+        if mode not in APPLY_MODES:
+            return JsonResponse({
+                'success': False,
+                'error': f'不支持的应用模式: {mode}'
+            })
+        
+        server = OpcServer.objects.get(id=data['server_id'])
+        nodes = node_set_manager.get_nodes(set_name)
+        result = apply_node_set(server, nodes, mode)
+        return JsonResponse({'success': True, 'result': result})
+    except OpcServer.DoesNotExist:
+        return JsonResponse({'success': False, 'error': '服务器不存在'})
+    except Exception as e:
+        logger.error(f"Error applying node set: {e}")
+        return JsonResponse({'success': False, 'error': str(e)})
+
+def _get_upload_source(request):
+    """获取上传的文件：multipart表单中的file字段，或直接使用请求体"""
+    if request.FILES.get('file'):
+        return request.FILES['file']
+    return request
+
+def _spool_upload(source, chunk_size=64 * 1024):
+    """将上传内容分块写入临时文件，返回文件路径（由使用方负责删除）"""
+    with tempfile.NamedTemporaryFile(prefix='upload_', delete=False) as f:
+        try:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                f.write(chunk)
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+        return f.name
+
+@require_http_methods(["POST"])
+def import_nodeset2_to_server(request, server_id):
+    """从NodeSet2 XML导入节点到服务器"""
+    try:
+        server = get_object_or_404(OpcServer, id=server_id)
+        
+        # 服务器运行中时，新节点同步添加到地址空间
+        on_chunk = None
+        if server.is_running:
+            on_chunk = lambda nodes: apply_live_changes(server.id, added=nodes)
+        
+        result = import_nodes_to_server(server, iter_nodeset2(_get_upload_source(request)), on_chunk)
+        return JsonResponse({'success': True, 'result': result})
+    except Exception as e:
+        logger.error(f"Error importing NodeSet2: {e}")
+        return JsonResponse({'success': False, 'error': str(e)})
+
+@require_http_methods(["GET"])
+def export_nodeset2_from_server(request, server_id):
+    """将服务器节点导出为NodeSet2 XML"""
+    server = get_object_or_404(OpcServer, id=server_id)
+    response = StreamingHttpResponse(export_nodeset2(iter_effective_nodes(server), server.uri), content_type='application/xml')
+    response['Content-Disposition'] = f'attachment; filename="server_{server.id}.NodeSet2.xml"'
+    return response
+
+@require_http_methods(["POST"])
+def import_nodeset2_to_set(request, set_name):
+    """从NodeSet2 XML导入节点到节点集合"""
+    try:
+        created = 0
+        for chunk in iter_chunks(iter_nodeset2(_get_upload_source(request))):
+            created += node_set_manager.add_nodes_to_set(set_name, chunk)
+        return JsonResponse({'success': True, 'result': {'created': created}})
+    except Exception as e:
+        logger.error(f"Error importing NodeSet2: {e}")
+        return JsonResponse({'success': False, 'error': str(e)})
+
+@require_http_methods(["GET"])
+def export_nodeset2_from_set(request, set_name):
+    """将节点集合导出为NodeSet2 XML"""
+    try:
+        nodes = node_set_manager.iter_nodes(set_name)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+    response = StreamingHttpResponse(export_nodeset2(nodes, f'urn:hotopcserver:{set_name}'), content_type='application/xml')
+    response['Content-Disposition'] = f'attachment; filename="{set_name}.NodeSet2.xml"'
+    return response
+
+# 节点模板API
+@require_http_methods(["GET"])
+def template_list(request):
+    """获取节点模板列表"""
+    templates = NodeTemplate.objects.annotate(
+        node_count=Count('nodes', distinct=True),
+        server_count=Count('servers', distinct=True)
+    )
+    return JsonResponse({
+        'success': True,
+        'templates': [{
+            'id': template.id,
+            'name': template.name,
+            'description': template.description,
+            'node_count': template.node_count,
+            'server_count': template.server_count,
+            'updated_at': template.updated_at.isoformat()
+        } for template in templates]
+    })
+
+@require_http_methods(["POST"])
+def add_template(request):
+    """创建节点模板，节点来自请求中的节点列表、节点集合或现有服务器"""
+    try:
+        data = json.loads(request.body)
+        if data.get('node_set'):
+            nodes = node_set_manager.get_nodes(data['node_set'])
+        elif data.get('server_id'):
+            server = OpcServer.objects.get(id=data['server_id'])
+            nodes = iter_effective_nodes(server)
+        else:
+            nodes = data.get('nodes', [])
+        template = create_template(data['name'], data.get('description'), nodes)
+        return JsonResponse({'success': True, 'id': template.id})
+    except OpcServer.DoesNotExist:
+        return JsonResponse({'success': False, 'error': '服务器不存在'})
+    except Exception as e:
+        logger.error(f"Error creating template: {e}")
+        return JsonResponse({'success': False, 'error': str(e)})
+
+@require_http_methods(["POST"])
+def remove_template(request, template_id):
+    """删除节点模板（没有服务器使用时）"""
+    try:
+        delete_template(get_object_or_404(NodeTemplate, id=template_id))
+        return JsonResponse({'success': True})
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+@require_http_methods(["GET"])
+def template_nodes(request, template_id):
+    """获取模板节点列表"""
+    template = get_object_or_404(NodeTemplate, id=template_id)
+    nodes = [
+        {'id': node.id, **{field: getattr(node, field) for field in NODE_CONFIG_FIELDS}}
+        for node in get_template_nodes(template.id)
+    ]
+    return JsonResponse({'success': True, 'nodes': nodes})
+
+@require_http_methods(["POST"])
+def apply_to_template(request, template_id):
+    """更新模板节点，运行中的相关服务器同步更新"""
+    try:
+        data = json.loads(request.body)
+        template = get_object_or_404(NodeTemplate, id=template_id)
+        nodes = node_set_manager.get_nodes(data['node_set']) if data.get('node_set') else data.get('nodes', [])
+        result = update_template_nodes(template, nodes, data.get('mode', 'merge'))
+        return JsonResponse({'success': True, 'result': result})
+    except Exception as e:
+        logger.error(f"Error updating template: {e}")
+        return JsonResponse({'success': False, 'error': str(e)})
+
+@require_http_methods(["POST"])
+def set_server_template(request, server_id):
+    """设置或取消服务器的节点模板"""
+    try:
+        data = json.loads(request.body)
+        server = get_object_or_404(OpcServer, id=server_id)
+        if data.get('template_id'):
+            template = get_object_or_404(NodeTemplate, id=data['template_id'])
+            result = attach_template(server, template, prune=data.get('prune', True))
+        else:
+            result = detach_template(server, materialize=data.get('materialize', True))
+        return JsonResponse({'success': True, 'result': result})
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+# 场景API
+def _scenario_data(scenario, running):
+    return {
+        'id': scenario.id,
+        'name': scenario.name,
+        'description': scenario.description,
+        'definition': scenario.definition,
+        'loop': scenario.loop,
+        'updated_at': scenario.updated_at.isoformat(),
+        'running': running.get(scenario.id),
+    }
+
+def _scenario_fields(data, scenario=None):
+    """校验请求中的场景字段，返回要保存的字段"""
+    fields = {}
+    if 'name' in data or scenario is None:
+        fields['name'] = data['name']
+    if 'description' in data:
+        fields['description'] = data['description']
+    if 'loop' in data:
+        fields['loop'] = bool(data['loop'])
+    if 'definition' in data or scenario is None:
+        definition = data['definition']
+        if not isinstance(definition, str):
+            definition = json.dumps(definition, ensure_ascii=False)
+        parse_scenario(definition)
+        fields['definition'] = definition
+    return fields
+
+@require_http_methods(["GET"])
+def scenario_list(request, server_id):
+    """获取服务器的场景列表，运行中的场景附带运行信息"""
+    server = get_object_or_404(OpcServer, id=server_id)
+    try:
+        if servers_are_remote():
+            running = send_command('scenarios', server_id=server.id)['scenarios']
+        else:
+            running = running_scenarios(server.id)
+    except RunnerUnavailable:
+        running = []
+    running = {info['scenario_id']: info for info in running}
+    return JsonResponse({
+        'success': True,
+        'scenarios': [_scenario_data(scenario, running) for scenario in server.scenarios.all()]
+    })
+
+@require_http_methods(["POST"])
+def add_scenario(request, server_id):
+    """添加场景"""
+    try:
+        server = get_object_or_404(OpcServer, id=server_id)
+        data = json.loads(request.body)
+        if server.scenarios.filter(name=data.get('name')).exists():
+            return JsonResponse({'success': False, 'error': '场景名称已存在'})
+        scenario = Scenario.objects.create(server=server, **_scenario_fields(data))
+        return JsonResponse({'success': True, 'scenario': _scenario_data(scenario, {})})
+    except (KeyError, ValueError) as e:
+        return JsonResponse({'success': False, 'error': f'场景定义无效: {e}'})
+    except Exception as e:
+        logger.error(f"Error adding scenario: {e}")
+        return JsonResponse({'success': False, 'error': str(e)})
+
+@require_http_methods(["POST"])
+def edit_scenario(request, scenario_id):
+    """修改场景，运行中的场景需要重新启动才会使用新定义"""
+    try:
+        scenario = get_object_or_404(Scenario, id=scenario_id)
+        data = json.loads(request.body)
+        for field, value in _scenario_fields(data, scenario).items():
+            setattr(scenario, field, value)
+        scenario.save()
+        return JsonResponse({'success': True, 'scenario': _scenario_data(scenario, {})})
+    except (KeyError, ValueError) as e:
+        return JsonResponse({'success': False, 'error': f'场景定义无效: {e}'})
+    except Exception as e:
+        logger.error(f"Error editing scenario: {e}")
+        return JsonResponse({'success': False, 'error': str(e)})
+
+@require_http_methods(["POST"])
+def delete_scenario(request, scenario_id):
+    """删除场景，运行中的先停止"""
+    try:
+        scenario = get_object_or_404(Scenario, id=scenario_id)
+        if servers_are_remote():
+            send_command('stop_scenario', server_id=scenario.server_id, scenario_id=scenario.id)
+        else:
+            stop_server_scenario(scenario.server_id, scenario.id)
+        scenario.delete()
+        return JsonResponse({'success': True})
+    except Exception as e:
+        logger.error(f"Error deleting scenario: {e}")
+        return JsonResponse({'success': False, 'error': str(e)})
+
+@require_http_methods(["POST"])
+def start_scenario(request, scenario_id):
+    """在运行中的服务器上启动场景，已在运行的场景从头开始"""
+    try:
+        scenario = get_object_or_404(Scenario, id=scenario_id)
+        if servers_are_remote():
+            info = send_command('start_scenario', scenario_id=scenario.id)['scenario']
+        else:
+            info = start_server_scenario(scenario.id)
+        return JsonResponse({'success': True, 'scenario': info})
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+@require_http_methods(["POST"])
+def stop_scenario(request, scenario_id):
+    """停止场景，已生效的值和状态保持不变"""
+    try:
+        scenario = get_object_or_404(Scenario, id=scenario_id)
+        if servers_are_remote():
+            stopped = send_command('stop_scenario', server_id=scenario.server_id, scenario_id=scenario.id)['stopped']
+        else:
+            stopped = stop_server_scenario(scenario.server_id, scenario.id)
+        return JsonResponse({'success': True, 'stopped': stopped})
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+# 后台任务API
+@require_http_methods(["GET"])
+def job_list(request):
+    """获取后台任务列表（不含结果）"""
+    jobs = []
+    for job in list_jobs():
+        job_data = job.to_dict()
+        job_data.pop('result')
+        jobs.append(job_data)
+    return JsonResponse({'success': True, 'jobs': jobs})
+
+@require_http_methods(["GET"])
+def job_status(request, job_id):
+    """获取后台任务状态和进度"""
+    job = get_job(job_id)
+    if job is None:
+        return JsonResponse({'success': False, 'error': '任务不存在'})
+    return JsonResponse({'success': True, 'job': job.to_dict()})
+
+@require_http_methods(["POST"])
+def cancel_job(request, job_id):
+    """取消后台任务"""
+    job = get_job(job_id)
+    if job is None:
+        return JsonResponse({'success': False, 'error': '任务不存在'})
+    if not job.cancel():
+        return JsonResponse({'success': False, 'error': '任务已结束'})
+    return JsonResponse({'success': True, 'job': job.to_dict()})